@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+"""
+cleanup_macos_files.py 性能基准测试
+==================================
+
+生成可配置深度、宽度、文件数和 .DS_Store/._* 密度的合成目录树，
+在同一棵树上比较工具提供的各种扫描方式（串行、并行线程数、增量索引冷/热、
+目录剪枝），并在目录树的副本上端到端测量 get_macos_files、get_file_sizes
+和 delete_files（以及自动模式的边扫描边删除）。
+
+每种方式报告耗时、条目/s、系统调用次数（通过计数包装 os.scandir、os.stat、
+os.unlink 和目录项的 stat 统计）以及Python内存峰值（tracemalloc）。计数和
+内存在单独的一轮中测量，不影响计时结果。
+
+网络挂载上每次列目录都是一次往返，可用 --latency-ms 为每次 os.scandir
+注入固定延迟来模拟NFS/SMB，在本地磁盘上复现并行扫描的收益。
+
+使用方法：
+    python3 cleanup_macos_benchmark.py                           # 默认树，jobs 1,4,16
+    python3 cleanup_macos_benchmark.py --depth 5 --fanout 6      # 更深更宽的树
+    python3 cleanup_macos_benchmark.py --latency-ms 2 --jobs 1,8,32
+    python3 cleanup_macos_benchmark.py --root /dev/shm/cleanup_bench --ds-density 1.0  # tmpfs上测试
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import threading
+import tracemalloc
+
+import cleanup_macos_files as cleanup
+
+# ==================== 默认配置 ====================
+BENCH_ROOT = 'cleanup_bench_data'   # 合成目录树的存放目录（按参数分子目录，可重复使用）
+DEFAULT_DEPTH = 4                   # 目录树深度
+DEFAULT_FANOUT = 5                  # 每个目录的子目录数
+DEFAULT_FILES = 20                  # 每个目录的普通文件数
+DEFAULT_DENSITY = 0.2               # 普通文件带有 ._* 伴随文件的比例
+DEFAULT_DS_DENSITY = 0.5            # 含有 .DS_Store 的目录比例
+DEFAULT_JOBS = '1,4,16'             # 测试的线程数，逗号分隔
+DEFAULT_REPEAT = 3                  # 每种方式重复次数，取最短耗时
+DEFAULT_EXCLUDE = 'dir_000'         # 剪枝方式使用的 --exclude 模式，逗号分隔
+DEFAULT_DELETE_JOBS = 4             # 边扫描边删除方式的删除线程数
+DEFAULT_SEED = 0
+
+_TREE_MARKER = '.complete'
+
+def build_synthetic_tree(root, depth, fanout, files_per_dir, density, seed=DEFAULT_SEED,
+                         ds_density=DEFAULT_DS_DENSITY):
+    """
+    生成合成目录树，已存在且完整时直接复用
+
+    每个目录包含 files_per_dir 个普通文件、按 density 抽样的 ._* 文件，
+    以及按 ds_density 抽样的 .DS_Store
+
+    Returns:
+        tuple: (目录数, 文件总数, 生成耗时秒数)
+    """
+    marker_path = os.path.join(root, _TREE_MARKER)
+    if os.path.exists(marker_path):
+        with open(marker_path, 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        return info['dirs'], info['files'], 0.0
+
+    start_time = time.perf_counter()
+    rng = random.Random(seed)
+    dir_count = 0
+    file_count = 0
+    pending = [(root, 0)]
+    while pending:
+        current_dir, level = pending.pop()
+        os.makedirs(current_dir, exist_ok=True)
+        dir_count += 1
+        for i in range(files_per_dir):
+            name = f'file_{i:04d}.dat'
+            with open(os.path.join(current_dir, name), 'wb') as f:
+                f.write(b'x' * rng.randint(0, 256))
+            file_count += 1
+            if rng.random() < density:
+                with open(os.path.join(current_dir, f'._{name}'), 'wb') as f:
+                    f.write(b'\0' * 4096)
+                file_count += 1
+        if rng.random() < ds_density:
+            with open(os.path.join(current_dir, '.DS_Store'), 'wb') as f:
+                f.write(b'\0' * 6148)
+            file_count += 1
+        if level < depth:
+            pending.extend((os.path.join(current_dir, f'dir_{j:03d}'), level + 1) for j in range(fanout))
+
+    with open(marker_path, 'w', encoding='utf-8') as f:
+        json.dump({'dirs': dir_count, 'files': file_count}, f)
+    return dir_count, file_count, time.perf_counter() - start_time
+
+def _with_scandir_latency(latency_s):
+    """返回为每次 os.scandir 注入固定延迟的替换函数（模拟网络挂载）"""
+    original_scandir = os.scandir
+
+    def slow_scandir(path='.'):
+        time.sleep(latency_s)
+        return original_scandir(path)
+
+    return original_scandir, slow_scandir
+
+# ==================== 系统调用计数 ====================
+
+class _CountingEntry:
+    """包装 os.DirEntry，统计会触发系统调用的 stat"""
+    __slots__ = ('_entry', '_counter', '_stat_counted')
+
+    def __init__(self, entry, counter):
+        self._entry = entry
+        self._counter = counter
+        self._stat_counted = False
+
+    @property
+    def name(self):
+        return self._entry.name
+
+    @property
+    def path(self):
+        return self._entry.path
+
+    def is_dir(self, follow_symlinks=True):
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, follow_symlinks=True):
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self):
+        return self._entry.is_symlink()
+
+    def inode(self):
+        return self._entry.inode()
+
+    def stat(self, follow_symlinks=True):
+        # DirEntry 会缓存 stat 结果，只有第一次调用产生系统调用
+        if not self._stat_counted:
+            self._stat_counted = True
+            self._counter.add('stat')
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+class _CountingScandir:
+    """包装 os.scandir 的迭代器，统计返回的目录项数"""
+
+    def __init__(self, iterator, counter):
+        self._iterator = iterator
+        self._counter = counter
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._iterator.close()
+
+    def __iter__(self):
+        for entry in self._iterator:
+            self._counter.add('entries')
+            yield _CountingEntry(entry, self._counter)
+
+    def close(self):
+        self._iterator.close()
+
+class SyscallCounter:
+    """
+    在 with 块内替换 os.scandir/os.stat/os.lstat/os.unlink 为计数包装
+
+    计数器在多个扫描线程间共享（加锁累加）；包装本身有开销，
+    因此只在单独的计数轮次中使用，不参与计时
+    """
+
+    _PATCHED = ('scandir', 'stat', 'lstat', 'unlink')
+
+    def __init__(self):
+        self.counts = {'scandir': 0, 'entries': 0, 'stat': 0, 'unlink': 0}
+        self._lock = threading.Lock()
+        self._originals = {}
+
+    def add(self, name, count=1):
+        with self._lock:
+            self.counts[name] += count
+
+    def __enter__(self):
+        self._originals = {name: getattr(os, name) for name in self._PATCHED}
+        original = self._originals
+
+        def counting_scandir(path='.'):
+            self.add('scandir')
+            return _CountingScandir(original['scandir'](path), self)
+
+        def counting_stat(path, *args, **kwargs):
+            self.add('stat')
+            return original['stat'](path, *args, **kwargs)
+
+        def counting_lstat(path, *args, **kwargs):
+            self.add('stat')
+            return original['lstat'](path, *args, **kwargs)
+
+        def counting_unlink(path, *args, **kwargs):
+            self.add('unlink')
+            return original['unlink'](path, *args, **kwargs)
+
+        os.scandir = counting_scandir
+        os.stat = counting_stat
+        os.lstat = counting_lstat
+        os.unlink = counting_unlink
+        return self
+
+    def __exit__(self, *exc_info):
+        for name, func in self._originals.items():
+            setattr(os, name, func)
+
+    @property
+    def total(self):
+        """系统调用总数（目录项本身不算）"""
+        return self.counts['scandir'] + self.counts['stat'] + self.counts['unlink']
+
+def measure_peak_memory(func):
+    """执行一次 func，返回 (结果, Python内存峰值字节数)"""
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+# ==================== 扫描方式 ====================
+
+def make_scan_strategies(root, jobs_list, exclude_patterns):
+    """
+    构造要比较的扫描方式
+
+    Returns:
+        list: [(名称, 准备函数, 需要与串行结果一致)]，准备函数返回一个无参扫描函数，
+              扫描函数返回 (get_macos_files 结果, 附加信息dict)
+    """
+    strategies = []
+    for jobs in jobs_list:
+        def prepare(jobs=jobs):
+            return lambda: (cleanup.get_macos_files(root, jobs), {})
+        strategies.append(('串行' if jobs == 1 else f'并行 jobs={jobs}', prepare, True))
+
+    def prepare_index_cold():
+        def scan():
+            scan_index = cleanup.ScanIndex(None, root)
+            result = cleanup.get_macos_files(root, 1, scan_func=scan_index.scan)
+            return result, {'reused_dirs': scan_index.reused_dirs, 'listed_dirs': scan_index.listed_dirs}
+        return scan
+    strategies.append(('索引(冷)', prepare_index_cold, True))
+
+    def prepare_index_warm():
+        scan_index = cleanup.ScanIndex(None, root)
+        cleanup.get_macos_files(root, 1, scan_func=scan_index.scan)
+
+        def scan():
+            scan_index.reused_dirs = scan_index.listed_dirs = 0
+            result = cleanup.get_macos_files(root, 1, scan_func=scan_index.scan)
+            return result, {'reused_dirs': scan_index.reused_dirs, 'listed_dirs': scan_index.listed_dirs}
+        return scan
+    strategies.append(('索引(热)', prepare_index_warm, True))
+
+    if exclude_patterns:
+        def prepare_prune():
+            def scan():
+                dir_filter = cleanup.DirectoryFilter(root, exclude_patterns)
+                result = cleanup.get_macos_files(root, 1, dir_filter)
+                return result, {'pruned_dirs': dir_filter.pruned_dirs}
+            return scan
+        strategies.append((f'剪枝 {",".join(exclude_patterns)}', prepare_prune, False))
+    return strategies
+
+def time_scan(scan, repeat):
+    """执行多次扫描，返回 (最短耗时秒数, 扫描结果, 附加信息)"""
+    best_time = None
+    result = None
+    extra = {}
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result, extra = scan()
+        elapsed = time.perf_counter() - start_time
+        best_time = elapsed if best_time is None else min(best_time, elapsed)
+    return best_time, result, extra
+
+def run_benchmark(root, jobs_list, repeat, latency_ms, exclude_patterns=(DEFAULT_EXCLUDE,)):
+    """在同一棵树上依次测试各扫描方式，返回结果列表"""
+    original_scandir = None
+    if latency_ms > 0:
+        original_scandir, slow_scandir = _with_scandir_latency(latency_ms / 1000)
+        os.scandir = slow_scandir
+
+    results = []
+    reference = None
+    try:
+        for name, prepare, comparable in make_scan_strategies(root, jobs_list, list(exclude_patterns)):
+            scan = prepare()
+            elapsed, scan_result, extra = time_scan(scan, repeat)
+
+            # 计算大小单独计时（使用扫描记录中的大小，不再stat）
+            start_time = time.perf_counter()
+            total_size = sum(cleanup.get_file_sizes(files) for files in scan_result)
+            size_seconds = time.perf_counter() - start_time
+
+            with SyscallCounter() as counter:
+                scan()
+            _, peak_memory = measure_peak_memory(scan)
+
+            if reference is None:
+                reference = scan_result
+            results.append({
+                'strategy': name,
+                'seconds': elapsed,
+                'size_seconds': size_seconds,
+                'entries': counter.counts['entries'],
+                'entries_per_s': counter.counts['entries'] / elapsed if counter.counts['entries'] and elapsed > 0 else None,
+                'syscalls': dict(counter.counts, total=counter.total),
+                'peak_memory': peak_memory,
+                'matches': sum(len(files) for files in scan_result),
+                'bytes': total_size,
+                'identical': scan_result == reference if comparable else None,
+                **extra,
+            })
+    finally:
+        if original_scandir is not None:
+            os.scandir = original_scandir
+    return results
+
+# ==================== 端到端删除 ====================
+
+def _scan_and_delete(root, reporter):
+    """交互模式的流程（不含确认）：扫描、计算大小、逐类删除，返回各阶段耗时"""
+    start_time = time.perf_counter()
+    ds_store_files, resource_fork_files = cleanup.get_macos_files(root)
+    scan_done = time.perf_counter()
+    cleanup.get_file_sizes(ds_store_files)
+    cleanup.get_file_sizes(resource_fork_files)
+    size_done = time.perf_counter()
+    deleted = 0
+    for files, file_type in ((ds_store_files, '.DS_Store'), (resource_fork_files, '._* 资源文件')):
+        success, _ = cleanup.delete_files(files, file_type, root, reporter)
+        deleted += success
+    end_time = time.perf_counter()
+    return {'scan_s': scan_done - start_time, 'size_s': size_done - scan_done,
+            'delete_s': end_time - size_done, 'deleted': deleted}
+
+def _stream_delete(root, reporter, jobs, delete_jobs):
+    """自动模式的流程：边扫描边删除"""
+    start_time = time.perf_counter()
+    records = cleanup.scan_macos_files(root, jobs)
+    totals = cleanup.stream_delete(records, root, cleanup.STREAM_BATCH_SIZE, delete_jobs, reporter)
+    return {'scan_s': None, 'size_s': None, 'delete_s': time.perf_counter() - start_time,
+            'deleted': sum(counts['deleted'] for counts in totals.values())}
+
+def run_delete_benchmark(tree_root, work_root, jobs, delete_jobs):
+    """
+    在目录树副本上端到端测试删除（复制耗时不计入），每种方式用新副本，
+    计时一轮、计数与内存一轮，最后校验副本中已没有匹配文件
+
+    Returns:
+        list: 结果列表
+    """
+    methods = [
+        ('delete_files', lambda root, reporter: _scan_and_delete(root, reporter)),
+        (f'边扫描边删除 jobs={jobs} delete_jobs={delete_jobs}',
+         lambda root, reporter: _stream_delete(root, reporter, jobs, delete_jobs)),
+    ]
+    results = []
+    for name, method in methods:
+        copy_root = os.path.join(work_root, 'delete_copy')
+
+        def fresh_copy():
+            shutil.rmtree(copy_root, ignore_errors=True)
+            shutil.copytree(tree_root, copy_root, symlinks=True)
+
+        fresh_copy()
+        reporter = cleanup.CleanupReporter('quiet', copy_root)
+        timings = method(copy_root, reporter)
+        reporter.finish()
+        total = sum(value for key, value in timings.items() if key.endswith('_s') and value)
+
+        fresh_copy()
+        reporter = cleanup.CleanupReporter('quiet', copy_root)
+        with SyscallCounter() as counter:
+            _, peak_memory = measure_peak_memory(lambda: method(copy_root, reporter))
+        reporter.finish()
+
+        remaining = sum(len(files) for files in cleanup.get_macos_files(copy_root))
+        shutil.rmtree(copy_root, ignore_errors=True)
+        results.append({
+            'method': name,
+            **timings,
+            'total_s': total,
+            'files_per_s': timings['deleted'] / total if total > 0 else None,
+            'syscalls': dict(counter.counts, total=counter.total),
+            'peak_memory': peak_memory,
+            'remaining': remaining,
+        })
+    return results
+
+# ==================== 报告 ====================
+
+def _format_seconds(value):
+    return f"{value:.3f}" if value is not None else '-'
+
+def _format_rate(value):
+    return f"{value:.0f}" if value is not None else '-'
+
+def print_scan_report(results, dir_count):
+    """打印扫描方式对比表"""
+    baseline = results[0]['seconds'] if results else None
+    print(f"{'扫描方式':<22}{'耗时(s)':>9}{'目录/s':>10}{'条目/s':>11}{'加速比':>8}"
+          f"{'scandir':>9}{'stat':>8}{'内存峰值':>11}{'匹配数':>8}  结果一致")
+    for item in results:
+        identical = '—' if item['identical'] is None else '✅' if item['identical'] else '❌'
+        note = ''
+        if 'reused_dirs' in item:
+            note = f"  （复用 {item['reused_dirs']} / 列出 {item['listed_dirs']} 个目录）"
+        elif 'pruned_dirs' in item:
+            note = f"  （剪枝 {item['pruned_dirs']} 个目录）"
+        print(f"{item['strategy']:<22}{item['seconds']:>9.3f}{dir_count / item['seconds']:>10.0f}"
+              f"{_format_rate(item['entries_per_s']):>11}{baseline / item['seconds']:>8.2f}"
+              f"{item['syscalls']['scandir']:>9}{item['syscalls']['stat']:>8}"
+              f"{cleanup.format_size(item['peak_memory']):>11}{item['matches']:>8}  {identical}{note}")
+
+def print_delete_report(results):
+    """打印端到端删除结果表"""
+    print(f"{'删除方式':<36}{'扫描(s)':>9}{'大小(s)':>9}{'删除(s)':>9}{'总计(s)':>9}"
+          f"{'文件/s':>10}{'unlink':>8}{'stat':>7}{'内存峰值':>11}  剩余")
+    for item in results:
+        print(f"{item['method']:<36}{_format_seconds(item['scan_s']):>9}{_format_seconds(item['size_s']):>9}"
+              f"{item['delete_s']:>9.3f}{item['total_s']:>9.3f}{item['files_per_s'] or 0:>10.0f}"
+              f"{item['syscalls']['unlink']:>8}{item['syscalls']['stat']:>7}"
+              f"{cleanup.format_size(item['peak_memory']):>11}  {item['remaining']}")
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='cleanup_macos_files.py 扫描与删除性能基准测试')
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH,
+                        help=f'目录树深度（默认 {DEFAULT_DEPTH}）')
+    parser.add_argument('--fanout', type=int, default=DEFAULT_FANOUT,
+                        help=f'每个目录的子目录数（默认 {DEFAULT_FANOUT}）')
+    parser.add_argument('--files', type=int, default=DEFAULT_FILES,
+                        help=f'每个目录的普通文件数（默认 {DEFAULT_FILES}）')
+    parser.add_argument('--density', type=float, default=DEFAULT_DENSITY,
+                        help=f'带有 ._* 伴随文件的比例（默认 {DEFAULT_DENSITY}）')
+    parser.add_argument('--ds-density', type=float, default=DEFAULT_DS_DENSITY,
+                        help=f'含有 .DS_Store 的目录比例（默认 {DEFAULT_DS_DENSITY}）')
+    parser.add_argument('--jobs', type=str, default=DEFAULT_JOBS,
+                        help=f'测试的线程数，逗号分隔（默认 {DEFAULT_JOBS}）')
+    parser.add_argument('--exclude', type=str, default=DEFAULT_EXCLUDE,
+                        help=f'剪枝方式使用的排除模式，逗号分隔，空字符串表示不测试剪枝（默认 {DEFAULT_EXCLUDE}）')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help=f'每种方式重复次数，取最短耗时（默认 {DEFAULT_REPEAT}）')
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                        help='为每次列目录注入的延迟毫秒数，用于模拟网络挂载（默认0，不用于删除测试）')
+    parser.add_argument('--delete-jobs', type=int, default=DEFAULT_DELETE_JOBS,
+                        help=f'边扫描边删除方式的删除线程数（默认 {DEFAULT_DELETE_JOBS}）')
+    parser.add_argument('--no-delete', action='store_true',
+                        help='跳过端到端删除测试（需要复制目录树）')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED,
+                        help=f'随机种子（默认 {DEFAULT_SEED}）')
+    parser.add_argument('--root', type=str, default=BENCH_ROOT,
+                        help=f'合成目录树的存放目录，可指向tmpfs（默认 {BENCH_ROOT}）')
+    parser.add_argument('--json', type=str, metavar='PATH',
+                        help='将结果写入JSON文件')
+    args = parser.parse_args()
+
+    jobs_list = [int(value) for value in args.jobs.split(',') if value.strip()]
+    exclude_patterns = [value.strip() for value in args.exclude.split(',') if value.strip()]
+    tree_root = os.path.join(args.root, f'd{args.depth}_f{args.fanout}_n{args.files}'
+                                        f'_p{args.density}_ds{args.ds_density}_s{args.seed}')
+
+    print("⏱️  macOS系统文件扫描与删除基准测试")
+    print("=" * 50)
+    dir_count, file_count, build_time = build_synthetic_tree(
+        tree_root, args.depth, args.fanout, args.files, args.density, args.seed, args.ds_density)
+    print(f"🌲 目录树: {tree_root}（{dir_count} 个目录，{file_count} 个文件）")
+    if build_time:
+        print(f"🔨 生成耗时: {build_time:.2f}s")
+        # 刚修改过的目录不会写入增量索引，等待超过宽限期后再测试热索引
+        time.sleep(cleanup.INDEX_MTIME_GRACE_NS / 1e9)
+    if args.latency_ms > 0:
+        print(f"🐢 模拟列目录延迟: {args.latency_ms} ms")
+    print()
+
+    results = run_benchmark(tree_root, jobs_list, args.repeat, args.latency_ms, exclude_patterns)
+    print_scan_report(results, dir_count)
+
+    delete_results = []
+    if not args.no_delete:
+        print()
+        delete_results = run_delete_benchmark(tree_root, args.root, max(jobs_list, default=1), args.delete_jobs)
+        print_delete_report(delete_results)
+
+    if args.json:
+        report = {
+            'tree': {'root': tree_root, 'dirs': dir_count, 'files': file_count,
+                     'depth': args.depth, 'fanout': args.fanout, 'files_per_dir': args.files,
+                     'density': args.density, 'ds_density': args.ds_density},
+            'latency_ms': args.latency_ms,
+            'results': results,
+            'delete': delete_results,
+        }
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 结果已写入: {args.json}")
+
+    ok = all(item['identical'] is not False for item in results)
+    ok = ok and all(item['remaining'] == 0 for item in delete_results)
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,57 +18,439 @@ macOS系统文件清理工具
 """
 
 import os
+import re
 import sys
+import json
+import stat
+import time
+import errno
+import queue
+import select
+import signal
+import struct
+import ctypes
+import ctypes.util
+import fnmatch
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
 from datetime import datetime
 import argparse
 
-def get_macos_files(root_dir):
+# 文件类型标识
+KIND_DS_STORE = 'ds_store'            # .DS_Store 文件
+KIND_RESOURCE_FORK = 'resource_fork'  # ._* 资源分支文件
+
+# 扫描记录：路径（字符串）、大小（字节，扫描时记录）、文件类型
+ScanRecord = namedtuple('ScanRecord', ['path', 'size', 'kind'])
+
+# 并行扫描时，等待主线程取走的结果批次上限（每批为一个目录中的匹配文件）
+PARALLEL_QUEUE_SIZE = 256
+
+# 增量扫描索引（--index）
+INDEX_VERSION = 1
+INDEX_MTIME_GRACE_NS = 2 * 10 ** 9  # 修改时间距列出时不足该值的目录不写入索引（纳秒）
+
+# 流式删除（--auto）时每批删除的文件数，内存中最多保留约 (删除线程数×2+1) 批
+STREAM_BATCH_SIZE = 1000
+
+# 多目录（--target-dir 多次指定或 --roots-file）
+DEFAULT_ROOT_JOBS = 4           # 同时处理的目录数上限
+ROOT_ERROR_SAMPLES = 5          # 每个目录在报告中保留的错误信息条数
+
+# 监视模式（--watch）
+WATCH_DELETE_DELAY = 2.0        # 文件出现（或最后一次写入完成）后等待多少秒再删除，避免与客户端写入冲突
+WATCH_STATS_INTERVAL = 600.0    # 每隔多少秒输出一次统计
+WATCH_POLL_INTERVAL = 60.0      # 无法使用inotify时，轮询扫描的间隔（秒）
+
+# 删除进度输出
+OUTPUT_MODES = ('verbose', 'progress', 'quiet')  # 逐文件输出 / 单行进度 / 只输出最终结果
+PROGRESS_INTERVAL = 0.2         # 终端中进度行的刷新间隔（秒）
+PROGRESS_PLAIN_INTERVAL = 10.0  # 输出被重定向时，每隔多少秒输出一行进度
+LOG_BUFFER_SIZE = 1 << 20       # 逐文件日志的写缓冲大小（字节）
+
+def classify_name(filename):
+    """
+    根据文件名判断macOS系统文件类型
+    
+    Args:
+        filename (str): 文件名
+        
+    Returns:
+        str or None: KIND_DS_STORE / KIND_RESOURCE_FORK，不是系统文件时返回None
+    """
+    if filename == '.DS_Store':
+        return KIND_DS_STORE
+    if filename.startswith('._'):
+        return KIND_RESOURCE_FORK
+    return None
+
+class DirectoryFilter:
+    """
+    目录剪枝规则：命中排除模式或位于其他文件系统的目录不再进入
+    
+    所有 --exclude 模式在构造时合并编译为一个正则（不含 / 的模式匹配目录名，
+    含 / 的模式匹配相对根目录的路径），每个目录只做一次匹配而不是逐个模式测试。
+    同时统计扫描和剪枝的目录数（并行扫描时由多个线程更新）。
+    """
+    
+    def __init__(self, root_dir, exclude_patterns=(), one_file_system=False):
+        self.root_dir = os.fspath(root_dir)
+        self.exclude_patterns = list(exclude_patterns)
+        name_patterns = [p.rstrip('/') for p in self.exclude_patterns if '/' not in p.rstrip('/')]
+        path_patterns = [p.strip('/') for p in self.exclude_patterns if '/' in p.rstrip('/')]
+        self._name_regex = self._compile(name_patterns)
+        self._path_regex = self._compile(path_patterns)
+        self.root_device = os.stat(self.root_dir).st_dev if one_file_system else None
+        self.scanned_dirs = 0
+        self.pruned_dirs = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _compile(patterns):
+        """将多个glob模式编译为单个正则，没有模式时返回None"""
+        if not patterns:
+            return None
+        return re.compile('|'.join(f'(?:{fnmatch.translate(p)})' for p in patterns))
+    
+    @property
+    def active(self):
+        """是否设置了任何剪枝规则"""
+        return bool(self._name_regex or self._path_regex or self.root_device is not None)
+    
+    def _relative_path(self, path):
+        return os.path.relpath(path, self.root_dir).replace(os.sep, '/')
+    
+    def should_prune(self, entry):
+        """判断子目录是否应跳过"""
+        if self._name_regex is not None and self._name_regex.match(entry.name):
+            return True
+        if self._path_regex is not None and self._path_regex.match(self._relative_path(entry.path)):
+            return True
+        if self.root_device is not None:
+            # 仅在开启 --one-file-system 时才需要对目录stat
+            return entry.stat(follow_symlinks=False).st_dev != self.root_device
+        return False
+    
+    def count(self, scanned, pruned):
+        """累加一个目录的扫描结果"""
+        with self._lock:
+            self.scanned_dirs += scanned
+            self.pruned_dirs += pruned
+
+def list_directory(dir_path, on_error=None, dir_filter=None):
+    """
+    使用 os.scandir 列出单个目录
+    
+    目录类型直接取自目录项（多数文件系统无需额外的stat），
+    只对匹配的文件stat一次以记录大小；不跟随符号链接：指向目录的链接不进入（避免循环），
+    名称匹配的符号链接不视为系统文件
+    
+    Args:
+        dir_path (str): 目录路径
+        on_error (callable, optional): 目录无法读取时的回调，参数为 OSError
+        dir_filter (DirectoryFilter, optional): 目录剪枝规则（不在此累加统计）
+        
+    Returns:
+        tuple: (子目录路径列表, ScanRecord 列表, 剪枝的子目录数, 是否成功列出)
+    """
+    subdirs = []
+    records = []
+    pruned = 0
+    try:
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if dir_filter is not None and dir_filter.should_prune(entry):
+                            pruned += 1
+                        else:
+                            subdirs.append(entry.path)
+                        continue
+                    kind = classify_name(entry.name)
+                    if kind is None or not entry.is_file(follow_symlinks=False):
+                        continue
+                    size = entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    # 文件在扫描期间被删除或无法访问
+                    continue
+                records.append(ScanRecord(entry.path, size, kind))
+    except OSError as e:
+        if on_error is not None:
+            on_error(e)
+        return subdirs, records, pruned, False
+    return subdirs, records, pruned, True
+
+def scan_directory(dir_path, on_error=None, dir_filter=None):
+    """
+    列出单个目录并累加剪枝统计（参数见 list_directory）
+    
+    Returns:
+        tuple: (子目录路径列表, ScanRecord 列表)
+    """
+    subdirs, records, pruned, _ = list_directory(dir_path, on_error, dir_filter)
+    if dir_filter is not None:
+        dir_filter.count(1, pruned)
+    return subdirs, records
+
+class ScanIndex:
+    """
+    持久化的增量扫描索引
+    
+    为每个目录保存修改时间、子目录名和其中的匹配文件。再次扫描时只stat目录：
+    修改时间未变的目录直接复用索引内容，只有变化的目录才重新列出。
+    目录的修改时间只随其中条目的增删改名变化，文件内容变化不会反映出来，
+    因此索引中的文件大小可能过时（不影响删除哪些文件）。
+    
+    刚修改过的目录（距列出时不足 INDEX_MTIME_GRACE_NS）不写入索引，
+    避免同一时间戳内的后续修改被漏掉。scan 方法与 scan_directory 签名相同，
+    可直接用于串行和并行遍历。
+    """
+    
+    def __init__(self, path, root_dir, params=None):
+        self.path = path
+        self.root_dir = os.fspath(root_dir)
+        self.params = params or {}
+        self.dirs = {}
+        self.refresh = False      # True时忽略已有内容，全部重新列出并重建索引
+        self.complete = False     # 本次遍历完整结束后，未访问到的目录视为已删除
+        self.reused_dirs = 0
+        self.listed_dirs = 0
+        self._visited = set()
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def load(cls, path, root_dir, params=None):
+        """
+        读取索引文件，不存在或根目录/参数/版本不一致时返回空索引
+        
+        Returns:
+            tuple: (ScanIndex, 是否复用了已有索引)
+        """
+        index = cls(path, root_dir, params)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return index, False
+        if (data.get('version') != INDEX_VERSION or data.get('root') != index.root_dir
+                or data.get('params') != index.params):
+            return index, False
+        index.dirs = data.get('dirs', {})
+        return index, True
+    
+    def save(self):
+        """原子地写出索引文件"""
+        dirs = self.dirs
+        if self.complete:
+            dirs = {key: entry for key, entry in dirs.items() if key in self._visited}
+        data = {'version': INDEX_VERSION, 'root': self.root_dir, 'params': self.params, 'dirs': dirs}
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_path, self.path)
+    
+    def invalidate_matched_dirs(self):
+        """删除操作之后调用：含有匹配文件的目录已被修改，下次重新列出"""
+        for key in [key for key, entry in self.dirs.items() if entry['matches']]:
+            self.dirs.pop(key, None)
+    
+    def scan(self, dir_path, on_error=None, dir_filter=None):
+        """
+        列出单个目录，修改时间未变时直接使用索引内容
+        
+        Returns:
+            tuple: (子目录路径列表, ScanRecord 列表)
+        """
+        key = os.path.relpath(dir_path, self.root_dir)
+        with self._lock:
+            self._visited.add(key)
+        try:
+            mtime_ns = os.stat(dir_path).st_mtime_ns
+        except OSError as e:
+            if on_error is not None:
+                on_error(e)
+            self.dirs.pop(key, None)
+            return [], []
+        
+        entry = self.dirs.get(key)
+        if not self.refresh and entry is not None and entry['mtime_ns'] == mtime_ns:
+            with self._lock:
+                self.reused_dirs += 1
+            if dir_filter is not None:
+                dir_filter.count(1, entry['pruned'])
+            subdirs = [os.path.join(dir_path, name) for name in entry['subdirs']]
+            records = [ScanRecord(os.path.join(dir_path, name), size, kind)
+                       for name, size, kind in entry['matches']]
+            return subdirs, records
+        
+        subdirs, records, pruned, ok = list_directory(dir_path, on_error, dir_filter)
+        with self._lock:
+            self.listed_dirs += 1
+        if dir_filter is not None:
+            dir_filter.count(1, pruned)
+        if ok and time.time_ns() - mtime_ns > INDEX_MTIME_GRACE_NS:
+            self.dirs[key] = {
+                'mtime_ns': mtime_ns,
+                'subdirs': [os.path.basename(path) for path in subdirs],
+                'matches': [[os.path.basename(record.path), record.size, record.kind] for record in records],
+                'pruned': pruned,
+            }
+        else:
+            self.dirs.pop(key, None)
+        return subdirs, records
+
+def iter_macos_files(root_dir, on_error=None, dir_filter=None, scan_func=scan_directory):
+    """
+    遍历目录树，逐个产出macOS系统文件的扫描记录
+    
+    Args:
+        root_dir (Path or str): 根目录路径
+        on_error (callable, optional): 目录无法读取时的回调，参数为 OSError
+        dir_filter (DirectoryFilter, optional): 目录剪枝规则
+        scan_func (callable): 列出单个目录的函数，如 scan_directory 或 ScanIndex.scan
+        
+    Yields:
+        ScanRecord: 扫描记录
+    """
+    pending_dirs = [os.fspath(root_dir)]
+    while pending_dirs:
+        subdirs, records = scan_func(pending_dirs.pop(), on_error, dir_filter)
+        pending_dirs.extend(subdirs)
+        yield from records
+
+def iter_macos_files_parallel(root_dir, jobs, on_error=None, dir_filter=None, scan_func=scan_directory):
+    """
+    多线程并行遍历目录树，适合每次列目录都是一次网络往返的NFS/SMB挂载
+    
+    所有线程共享一个待扫描目录栈：空闲线程随时取走任意线程发现的子目录，
+    新发现的目录后进先出，待扫描目录数随树深度而不是宽度增长。
+    匹配结果按目录成批经有界队列交给调用方，产出顺序不确定。
+    工作线程中的意外异常会停止其余线程，并在调用方重新抛出。
+    
+    Args:
+        root_dir (Path or str): 根目录路径
+        jobs (int): 线程数
+        on_error (callable, optional): 目录无法读取时的回调（在工作线程中调用）
+        dir_filter (DirectoryFilter, optional): 目录剪枝规则
+        scan_func (callable): 列出单个目录的函数（需线程安全）
+        
+    Yields:
+        ScanRecord: 扫描记录
+    """
+    pending_dirs = [os.fspath(root_dir)]
+    condition = threading.Condition()
+    batches = queue.Queue(maxsize=PARALLEL_QUEUE_SIZE)
+    state = {'active': 0, 'stopped': False, 'error': None}
+    
+    def put_batch(batch):
+        # 调用方提前结束时不再等待队列空位
+        while not state['stopped']:
+            try:
+                batches.put(batch, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+    
+    def worker():
+        try:
+            while True:
+                with condition:
+                    while (not pending_dirs and state['active'] and not state['stopped']
+                           and state['error'] is None):
+                        condition.wait()
+                    if state['stopped'] or state['error'] is not None or not pending_dirs:
+                        # 没有待扫描目录且没有线程在扫描，遍历结束
+                        condition.notify_all()
+                        return
+                    current_dir = pending_dirs.pop()
+                    state['active'] += 1
+                subdirs, records = [], []
+                try:
+                    subdirs, records = scan_func(current_dir, on_error, dir_filter)
+                finally:
+                    with condition:
+                        pending_dirs.extend(subdirs)
+                        state['active'] -= 1
+                        condition.notify_all()
+                if records:
+                    put_batch(records)
+        except Exception as e:
+            # 目录读取错误已由 scan_func 处理，这里是意外错误，交给调用方抛出
+            with condition:
+                if state['error'] is None:
+                    state['error'] = e
+                condition.notify_all()
+        finally:
+            put_batch(None)
+    
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, jobs))]
+    for thread in threads:
+        thread.start()
+    
+    try:
+        finished = 0
+        while finished < len(threads):
+            batch = batches.get()
+            if batch is None:
+                finished += 1
+                if state['error'] is not None:
+                    raise state['error']
+            else:
+                yield from batch
+    finally:
+        with condition:
+            state['stopped'] = True
+            condition.notify_all()
+        for thread in threads:
+            thread.join()
+
+def scan_macos_files(root_dir, jobs=1, on_error=None, dir_filter=None, scan_func=scan_directory):
+    """按线程数选择串行或并行遍历，逐个产出扫描记录"""
+    if jobs > 1:
+        return iter_macos_files_parallel(root_dir, jobs, on_error, dir_filter, scan_func)
+    return iter_macos_files(root_dir, on_error, dir_filter, scan_func)
+
+def get_macos_files(root_dir, jobs=1, dir_filter=None, scan_func=scan_directory):
     """
     扫描指定目录下的所有macOS系统文件
     
     Args:
         root_dir (Path): 根目录路径
+        jobs (int): 扫描线程数，大于1时并行遍历
+        dir_filter (DirectoryFilter, optional): 目录剪枝规则
+        scan_func (callable): 列出单个目录的函数，如 scan_directory 或 ScanIndex.scan
         
     Returns:
-        tuple: (ds_store_files, resource_fork_files)
+        tuple: (ds_store_files, resource_fork_files)，元素为 ScanRecord，
+               按路径排序，结果与线程数无关
     """
     ds_store_files = []
     resource_fork_files = []
     
-    # 递归扫描所有文件
-    for file_path in root_dir.rglob('*'):
-        if file_path.is_file():
-            filename = file_path.name
-            
-            # 检查.DS_Store文件
-            if filename == '.DS_Store':
-                ds_store_files.append(file_path)
-            
-            # 检查._开头的资源分支文件
-            elif filename.startswith('._'):
-                resource_fork_files.append(file_path)
+    for record in scan_macos_files(root_dir, jobs, dir_filter=dir_filter, scan_func=scan_func):
+        if record.kind == KIND_DS_STORE:
+            ds_store_files.append(record)
+        else:
+            resource_fork_files.append(record)
     
+    ds_store_files.sort()
+    resource_fork_files.sort()
     return ds_store_files, resource_fork_files
 
 def get_file_sizes(file_list):
     """
-    计算文件列表的总大小
+    计算文件列表的总大小（使用扫描时记录的大小，不再重复stat）
     
     Args:
-        file_list (list): 文件路径列表
+        file_list (list): ScanRecord 列表
         
     Returns:
         int: 总大小（字节）
     """
-    total_size = 0
-    for file_path in file_list:
-        try:
-            total_size += file_path.stat().st_size
-        except (OSError, FileNotFoundError):
-            # 文件可能已被删除或无法访问
-            pass
-    return total_size
+    return sum(record.size for record in file_list)
 
 def format_size(size_bytes):
     """
@@ -114,15 +496,43 @@ def print_statistics(ds_store_files, resource_fork_files):
         ds_store_files (list): .DS_Store文件列表
         resource_fork_files (list): 资源分支文件列表
     """
+    print_counts(len(ds_store_files), len(resource_fork_files),
+                 get_file_sizes(ds_store_files), get_file_sizes(resource_fork_files))
+
+def print_prune_statistics(dir_filter, scan_seconds):
+    """
+    打印目录剪枝统计
+    
+    节省的时间按本次扫描的平均每目录耗时估算，且只计入被剪枝的目录本身，
+    不含其下的子目录，因此是保守的下限
+    
+    Args:
+        dir_filter (DirectoryFilter): 目录剪枝规则
+        scan_seconds (float): 扫描耗时（秒）
+    """
+    if dir_filter is None or not dir_filter.active:
+        return
+    per_dir = scan_seconds / dir_filter.scanned_dirs if dir_filter.scanned_dirs else 0.0
+    print(f"📁 已扫描目录: {dir_filter.scanned_dirs} 个，耗时 {scan_seconds:.2f}s")
+    print(f"✂️  已剪枝目录: {dir_filter.pruned_dirs} 个，估计至少节省 {dir_filter.pruned_dirs * per_dir:.2f}s")
+    print()
+
+def print_counts(ds_count, fork_count, ds_size, fork_size):
+    """
+    按数量和大小打印扫描统计信息
+    
+    Args:
+        ds_count (int): .DS_Store文件数量
+        fork_count (int): 资源分支文件数量
+        ds_size (int): .DS_Store文件总大小（字节）
+        fork_size (int): 资源分支文件总大小（字节）
+    """
     print("📊 扫描结果统计")
     print("-" * 30)
-    print(f"🗂️  .DS_Store 文件: {len(ds_store_files)} 个")
-    print(f"📦 ._* 资源文件: {len(resource_fork_files)} 个")
-    print(f"📈 总计文件数: {len(ds_store_files) + len(resource_fork_files)} 个")
+    print(f"🗂️  .DS_Store 文件: {ds_count} 个")
+    print(f"📦 ._* 资源文件: {fork_count} 个")
+    print(f"📈 总计文件数: {ds_count + fork_count} 个")
     
-    # 计算总大小
-    ds_size = get_file_sizes(ds_store_files)
-    fork_size = get_file_sizes(resource_fork_files)
     total_size = ds_size + fork_size
     
     print(f"💾 .DS_Store 大小: {format_size(ds_size)}")
@@ -130,55 +540,940 @@ def print_statistics(ds_store_files, resource_fork_files):
     print(f"💾 总占用空间: {format_size(total_size)}")
     print()
 
-def delete_files(file_list, file_type, base_dir=None):
+def format_duration(seconds):
+    """
+    格式化时长显示
+    
+    Args:
+        seconds (float): 秒数
+        
+    Returns:
+        str: 如 "42s"、"3m05s"、"1h02m"
+    """
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+class CleanupReporter:
+    """
+    删除结果输出
+    
+    - verbose：每个文件输出一行（原有行为）
+    - progress：只刷新一行进度（数量、释放空间、速率，已知总数时显示剩余时间），
+      按时间限频，终端输出不再成为大批量删除的瓶颈
+    - quiet：不输出进度，只将删除失败的文件输出到stderr，供定时任务使用
+    
+    逐文件明细可同时写入带缓冲的日志文件（文本或JSON Lines格式）
+    """
+    
+    def __init__(self, mode='verbose', base_dir=None, log_path=None, log_format='text', total=None):
+        self.mode = mode
+        self.base_dir = os.fspath(base_dir) if base_dir is not None else os.getcwd()
+        self.log_format = log_format
+        self.total = total
+        self.deleted = 0
+        self.failed = 0
+        self.freed = 0
+        self.start_time = time.perf_counter()
+        self._last_progress = self.start_time
+        self._progress_dirty = False
+        self._progress_shown = False
+        self._is_tty = sys.stdout.isatty()
+        self._log = open(log_path, 'a', encoding='utf-8', buffering=LOG_BUFFER_SIZE) if log_path else None
+    
+    @property
+    def quiet(self):
+        """是否为安静模式"""
+        return self.mode == 'quiet'
+    
+    def message(self, text):
+        """输出一条非必要信息（安静模式下省略），进度行先刷新到最新再换行"""
+        if not self.quiet:
+            if self._progress_dirty:
+                self._show_progress()
+            self._clear_progress()
+            print(text)
+    
+    def _display_path(self, path):
+        """相对于基准目录的显示路径，无法计算相对路径时使用原路径"""
+        try:
+            return os.path.relpath(path, self.base_dir)
+        except ValueError:
+            return path
+    
+    def add(self, record, error=None):
+        """
+        记录一个文件的删除结果
+        
+        Args:
+            record (ScanRecord): 扫描记录
+            error (str, optional): 错误信息，None表示删除成功
+        """
+        if error is None:
+            self.deleted += 1
+            self.freed += record.size
+        else:
+            self.failed += 1
+        
+        if self.mode == 'verbose':
+            display_path = self._display_path(record.path)
+            if error is None:
+                print(f"   ✅ {display_path}")
+            else:
+                print(f"   ❌ {display_path} - 错误: {error}")
+        elif self.mode == 'progress':
+            self._progress_dirty = True
+            self._maybe_show_progress()
+        elif error is not None:
+            # 安静模式下仍需让定时任务的调用方看到失败的文件
+            print(f"❌ {record.path} - 错误: {error}", file=sys.stderr)
+        
+        if self._log is not None:
+            if self.log_format == 'jsonl':
+                self._log.write(json.dumps({
+                    'path': record.path, 'kind': record.kind, 'size': record.size,
+                    'status': 'deleted' if error is None else 'failed', 'error': error,
+                }, ensure_ascii=False))
+                self._log.write('\n')
+            elif error is None:
+                self._log.write(f"deleted\t{record.size}\t{record.path}\n")
+            else:
+                self._log.write(f"failed\t{record.size}\t{record.path}\t{error}\n")
+    
+    def progress_text(self):
+        """生成进度行文本"""
+        elapsed = time.perf_counter() - self.start_time
+        done = self.deleted + self.failed
+        rate = done / elapsed if elapsed > 0 else 0.0
+        text = f"🧹 已处理 {done}" + (f"/{self.total}" if self.total else "") + " 个"
+        text += f" | 释放 {format_size(self.freed)} | {rate:.0f} 个/s"
+        if self.failed:
+            text += f" | 失败 {self.failed}"
+        if self.total and rate > 0:
+            text += f" | 剩余约 {format_duration((self.total - done) / rate)}"
+        return text
+    
+    def _maybe_show_progress(self):
+        now = time.perf_counter()
+        interval = PROGRESS_INTERVAL if self._is_tty else PROGRESS_PLAIN_INTERVAL
+        if now - self._last_progress < interval:
+            return
+        self._last_progress = now
+        self._show_progress()
+    
+    def _show_progress(self):
+        self._progress_dirty = False
+        if self._is_tty:
+            sys.stdout.write(f"\r\033[K{self.progress_text()}")
+            sys.stdout.flush()
+            self._progress_shown = True
+        else:
+            print(self.progress_text())
+    
+    def _clear_progress(self):
+        """结束当前进度行，使后续输出另起一行"""
+        if self._progress_shown:
+            sys.stdout.write('\n')
+            self._progress_shown = False
+    
+    def flush(self):
+        """将已输出的内容和日志写出（常驻运行时定期调用）"""
+        sys.stdout.flush()
+        if self._log is not None:
+            self._log.flush()
+    
+    def finish(self):
+        """输出最终进度并关闭日志文件"""
+        if self._progress_dirty:
+            self._show_progress()
+        self._clear_progress()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+class SharedCleanupReporter(CleanupReporter):
+    """可由多个线程共用的 CleanupReporter（多目录并发处理时汇总为一条进度和一个日志）"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+    
+    def message(self, text):
+        with self._lock:
+            super().message(text)
+    
+    def add(self, record, error=None):
+        with self._lock:
+            super().add(record, error)
+
+def delete_files(file_list, file_type, base_dir=None, reporter=None):
     """
     删除文件列表中的所有文件
     
     Args:
-        file_list (list): 要删除的文件路径列表
+        file_list (list): 要删除的 ScanRecord 列表
         file_type (str): 文件类型描述
         base_dir (Path, optional): 基准目录，用于显示相对路径
+        reporter (CleanupReporter, optional): 结果输出，默认逐文件输出
         
     Returns:
-        tuple: (成功删除数量, 删除失败数量)
+        tuple: (成功删除数量, 删除失败数量)；释放的字节数累计在 reporter.freed 中
     """
     success_count = 0
     error_count = 0
     
-    if not file_list:
-        print(f"ℹ️  没有找到 {file_type} 文件，跳过删除")
-        return 0, 0
-    
     # 确定用于显示的基准目录
     if base_dir is None:
         base_dir = Path.cwd()
+    own_reporter = reporter is None
+    if own_reporter:
+        reporter = CleanupReporter('verbose', base_dir)
+    
+    if not file_list:
+        reporter.message(f"ℹ️  没有找到 {file_type} 文件，跳过删除")
+        return 0, 0
     
-    print(f"🗑️  正在删除 {len(file_list)} 个 {file_type} 文件...")
+    reporter.message(f"🗑️  正在删除 {len(file_list)} 个 {file_type} 文件...")
     
-    for file_path in file_list:
-        try:
-            file_path.unlink()  # 删除文件
+    for record, error in delete_batch(file_list):
+        if error is None:
             success_count += 1
-            # 尝试显示相对于基准目录的路径
-            try:
-                display_path = file_path.relative_to(base_dir)
-            except ValueError:
-                # 如果无法计算相对路径，使用绝对路径
-                display_path = file_path
-            print(f"   ✅ {display_path}")
-        except (OSError, FileNotFoundError) as e:
+        else:
             error_count += 1
-            try:
-                display_path = file_path.relative_to(base_dir)
-            except ValueError:
-                display_path = file_path
-            print(f"   ❌ {display_path} - 错误: {e}")
+        reporter.add(record, error)
     
-    print(f"📊 {file_type} 删除结果: 成功 {success_count} 个, 失败 {error_count} 个")
-    print()
+    if own_reporter:
+        reporter.finish()
+    reporter.message(f"📊 {file_type} 删除结果: 成功 {success_count} 个, 失败 {error_count} 个\n")
     
     return success_count, error_count
 
+def delete_batch(records):
+    """
+    删除一批文件，可在删除线程中执行
+    
+    Args:
+        records (list): ScanRecord 列表
+        
+    Returns:
+        list: [(ScanRecord, 错误信息或None), ...]
+    """
+    results = []
+    for record in records:
+        try:
+            os.unlink(record.path)
+            results.append((record, None))
+        except OSError as e:
+            results.append((record, str(e)))
+    return results
+
+def new_cleanup_totals():
+    """创建按文件类型分组的流式清理计数"""
+    return {kind: {'deleted': 0, 'failed': 0, 'bytes': 0, 'freed': 0}
+            for kind in (KIND_DS_STORE, KIND_RESOURCE_FORK)}
+
+def stream_delete(records, base_dir, batch_size=STREAM_BATCH_SIZE, delete_jobs=1, reporter=None):
+    """
+    边扫描边删除：扫描器每产出一批匹配文件就立即删除
+    
+    不保存完整的文件列表，内存占用与匹配文件总数无关；delete_jobs > 1 时由
+    删除线程池并行删除，在途批次数有上限，结果仍按提交顺序输出
+    
+    Args:
+        records (iterable): ScanRecord 迭代器（通常来自 iter_macos_files）
+        base_dir (Path): 基准目录，用于显示相对路径
+        batch_size (int): 每批删除的文件数
+        delete_jobs (int): 删除线程数
+        reporter (CleanupReporter, optional): 结果输出，默认逐文件输出
+        
+    Returns:
+        dict: new_cleanup_totals() 格式的计数
+    """
+    totals = new_cleanup_totals()
+    if reporter is None:
+        reporter = CleanupReporter('verbose', base_dir)
+    
+    def report(results):
+        for record, error in results:
+            counts = totals[record.kind]
+            counts['bytes'] += record.size
+            if error is None:
+                counts['deleted'] += 1
+                counts['freed'] += record.size
+            else:
+                counts['failed'] += 1
+            reporter.add(record, error)
+    
+    records = iter(records)
+    batches = iter(lambda: list(islice(records, batch_size)), [])
+    if delete_jobs <= 1:
+        for batch in batches:
+            report(delete_batch(batch))
+        return totals
+    
+    with ThreadPoolExecutor(max_workers=delete_jobs) as executor:
+        in_flight = deque()
+        for batch in batches:
+            # 在途批次达到上限时先等待最早的一批完成
+            if len(in_flight) >= delete_jobs * 2:
+                report(in_flight.popleft().result())
+            in_flight.append(executor.submit(delete_batch, batch))
+        while in_flight:
+            report(in_flight.popleft().result())
+    return totals
+
+def print_cleanup_summary(total_success, total_error, freed_bytes, quiet=False):
+    """打印清理总结报告（安静模式下只输出一行）"""
+    if quiet:
+        print(f"清理完成: 删除 {total_success} 个文件，失败 {total_error} 个，释放 {format_size(freed_bytes)}")
+        return
+    print("🎉 清理操作完成")
+    print("=" * 30)
+    print(f"✅ 成功删除: {total_success} 个文件")
+    if total_error > 0:
+        print(f"❌ 删除失败: {total_error} 个文件")
+        print("💡 建议检查文件权限或是否被其他程序占用")
+    else:
+        print("🎊 所有文件删除成功！")
+    
+    # 释放空间取自扫描记录中成功删除的文件，删除后不再stat
+    print(f"💾 释放空间: ~{format_size(freed_bytes)}")
+    print("🚀 目录现在完全干净，没有macOS系统文件！")
+
+def print_index_statistics(scan_index):
+    """打印增量扫描索引的复用情况"""
+    if scan_index is None:
+        return
+    print(f"🗃️  扫描索引: 复用 {scan_index.reused_dirs} 个目录，重新列出 {scan_index.listed_dirs} 个目录")
+    print()
+
+def verify_scan_index(scan_index, target_dir, jobs=1, dir_filter=None):
+    """
+    校验增量扫描索引：先按索引扫描，再完整重新扫描，比较两次结果并重建索引
+    
+    Args:
+        scan_index (ScanIndex): 扫描索引
+        target_dir (Path): 目标目录
+        jobs (int): 扫描线程数
+        dir_filter (DirectoryFilter, optional): 目录剪枝规则
+        
+    Returns:
+        bool: 两次扫描结果是否一致
+    """
+    print("🔎 正在按索引扫描...")
+    indexed = get_macos_files(target_dir, jobs, dir_filter, scan_index.scan)
+    print_index_statistics(scan_index)
+    
+    print("🔎 正在完整重新扫描...")
+    scan_index.refresh = True
+    rescanned = get_macos_files(target_dir, jobs, dir_filter, scan_index.scan)
+    scan_index.complete = True
+    
+    indexed_sizes = {record.path: record.size for files in indexed for record in files}
+    rescanned_sizes = {record.path: record.size for files in rescanned for record in files}
+    stale = sorted(indexed_sizes.keys() - rescanned_sizes.keys())
+    missed = sorted(rescanned_sizes.keys() - indexed_sizes.keys())
+    resized = sorted(path for path in indexed_sizes.keys() & rescanned_sizes.keys()
+                     if indexed_sizes[path] != rescanned_sizes[path])
+    
+    print("📋 索引校验结果")
+    print("-" * 30)
+    print(f"📈 完整扫描匹配文件: {len(rescanned_sizes)} 个")
+    print(f"👻 索引中多出（实际已不存在）: {len(stale)} 个")
+    print(f"🙈 索引中遗漏: {len(missed)} 个")
+    print(f"📏 大小不一致: {len(resized)} 个")
+    for label, paths in (('多出', stale), ('遗漏', missed), ('大小不一致', resized)):
+        for path in paths[:10]:
+            print(f"   {label}: {os.path.relpath(path, target_dir)}")
+    consistent = not (stale or missed)
+    if consistent:
+        print("✅ 索引与完整扫描一致（索引已按完整扫描结果刷新）")
+    else:
+        print("❌ 索引与完整扫描不一致（索引已按完整扫描结果重建）")
+    return consistent
+
+def run_streaming_cleanup(target_dir, jobs=1, delete_jobs=1, dir_filter=None, reporter=None,
+                          scan_index=None):
+    """
+    自动模式：边扫描边删除，扫描结束时清理也已完成
+    
+    Args:
+        target_dir (Path): 目标目录
+        jobs (int): 扫描线程数
+        delete_jobs (int): 删除线程数
+        dir_filter (DirectoryFilter, optional): 目录剪枝规则
+        reporter (CleanupReporter, optional): 结果输出
+        scan_index (ScanIndex, optional): 增量扫描索引
+    """
+    if reporter is None:
+        reporter = CleanupReporter('verbose', target_dir)
+    reporter.message("🧹 开始清理操作（边扫描边删除）...")
+    reporter.message("-" * 30)
+    
+    start_time = time.perf_counter()
+    scan_func = scan_index.scan if scan_index is not None else scan_directory
+    records = scan_macos_files(target_dir, jobs, dir_filter=dir_filter, scan_func=scan_func)
+    try:
+        totals = stream_delete(records, target_dir, STREAM_BATCH_SIZE, delete_jobs, reporter)
+    finally:
+        reporter.finish()
+    if scan_index is not None:
+        scan_index.complete = True
+        scan_index.invalidate_matched_dirs()
+    
+    ds_totals = totals[KIND_DS_STORE]
+    fork_totals = totals[KIND_RESOURCE_FORK]
+    total_success = ds_totals['deleted'] + fork_totals['deleted']
+    total_error = ds_totals['failed'] + fork_totals['failed']
+    freed_bytes = ds_totals['freed'] + fork_totals['freed']
+    if reporter.quiet:
+        print_cleanup_summary(total_success, total_error, freed_bytes, quiet=True)
+        return
+    
+    print()
+    print_prune_statistics(dir_filter, time.perf_counter() - start_time)
+    print_index_statistics(scan_index)
+    
+    ds_count = ds_totals['deleted'] + ds_totals['failed']
+    fork_count = fork_totals['deleted'] + fork_totals['failed']
+    print_counts(ds_count, fork_count, ds_totals['bytes'], fork_totals['bytes'])
+    
+    if ds_count + fork_count == 0:
+        print("✨ 恭喜！没有找到任何macOS系统文件，目录已经很干净了！")
+        return
+    
+    print_cleanup_summary(total_success, total_error, freed_bytes)
+
+# ==================== 多目录处理 ====================
+
+def load_root_list(path):
+    """
+    读取目录列表文件：每行一个目录，忽略空行和 # 开头的注释
+    
+    Returns:
+        list: 目录路径字符串列表
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+def find_nested_root(roots):
+    """
+    查找位于列表中另一个目录之下的目录（会被上级目录的扫描重复处理）
+    
+    Args:
+        roots (list): 已规范化（realpath）且去重的目录路径列表
+        
+    Returns:
+        tuple: (嵌套的目录, 其上级目录)，没有嵌套时返回 None
+    """
+    root_set = set(roots)
+    for root in roots:
+        current = root
+        parent = os.path.dirname(current)
+        while parent != current:
+            if parent in root_set:
+                return root, parent
+            current, parent = parent, os.path.dirname(parent)
+    return None
+
+def new_root_result(root_dir):
+    """创建单个目录的报告结构"""
+    return {
+        'root': os.fspath(root_dir),
+        'status': 'ok',
+        'error': None,
+        'dirs': 0,
+        'pruned_dirs': 0,
+        'unreadable_dirs': 0,
+        'errors': [],
+        'kinds': {kind: {'count': 0, 'bytes': 0, 'deleted': 0, 'failed': 0, 'freed': 0}
+                  for kind in (KIND_DS_STORE, KIND_RESOURCE_FORK)},
+        'seconds': 0.0,
+    }
+
+def process_root(root_dir, args, delete, reporter):
+    """
+    扫描（并在 delete 为True时边扫描边删除）单个目录，返回 new_root_result 格式的报告
+    
+    目录不存在、不可读或处理中出现其他异常时不抛出，而是记录在报告的 status/error 中，
+    以免一个目录的问题中断其他目录的处理
+    """
+    result = new_root_result(root_dir)
+    start_time = time.perf_counter()
+    if not os.path.isdir(root_dir):
+        result['status'] = 'error'
+        result['error'] = '目录不存在或不是目录'
+        return result
+    
+    errors_lock = threading.Lock()
+    
+    def on_error(error):
+        with errors_lock:
+            result['unreadable_dirs'] += 1
+            if len(result['errors']) < ROOT_ERROR_SAMPLES:
+                result['errors'].append(str(error))
+    
+    try:
+        dir_filter = DirectoryFilter(root_dir, args.exclude, args.one_file_system)
+        records = scan_macos_files(root_dir, args.jobs, on_error=on_error, dir_filter=dir_filter)
+        kinds = result['kinds']
+        if delete:
+            for kind, counts in stream_delete(records, root_dir, STREAM_BATCH_SIZE,
+                                              args.delete_jobs, reporter).items():
+                kinds[kind].update(counts)
+                kinds[kind]['count'] = counts['deleted'] + counts['failed']
+        else:
+            for record in records:
+                kinds[record.kind]['count'] += 1
+                kinds[record.kind]['bytes'] += record.size
+        result['dirs'] = dir_filter.scanned_dirs
+        result['pruned_dirs'] = dir_filter.pruned_dirs
+    except OSError as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+    except Exception as e:
+        # 意外错误同样只记录在该目录的报告中，不中断其他目录
+        result['status'] = 'error'
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = time.perf_counter() - start_time
+    
+    if result['status'] == 'ok' and result['unreadable_dirs'] and result['dirs'] <= result['unreadable_dirs']:
+        # 根目录本身无法读取
+        result['status'] = 'error'
+        result['error'] = result['errors'][0]
+    return result
+
+def summarize_root_results(results):
+    """汇总所有目录的报告"""
+    totals = {kind: {'count': 0, 'bytes': 0, 'deleted': 0, 'failed': 0, 'freed': 0}
+              for kind in (KIND_DS_STORE, KIND_RESOURCE_FORK)}
+    for result in results:
+        for kind, counts in result['kinds'].items():
+            for key, value in counts.items():
+                totals[kind][key] += value
+    return {
+        'roots': len(results),
+        'failed_roots': sum(1 for result in results if result['status'] != 'ok'),
+        'dirs': sum(result['dirs'] for result in results),
+        'unreadable_dirs': sum(result['unreadable_dirs'] for result in results),
+        'kinds': totals,
+    }
+
+def print_root_report(results, summary, delete, elapsed):
+    """打印多目录汇总报告：每个目录一行，最后一行为合计"""
+    print()
+    print("📋 多目录" + ("清理" if delete else "扫描") + "报告")
+    print("-" * 30)
+    header = f"{'状态':<4}{'.DS_Store':>10}{'._*':>10}{'大小':>12}"
+    if delete:
+        header += f"{'失败':>8}"
+    header += f"{'不可读':>8}{'耗时(s)':>8}  目录"
+    print(header)
+    for result in results + [None]:
+        item = result if result is not None else dict(summary, status='ok', seconds=elapsed, root='合计')
+        kinds = item['kinds']
+        line = (f"{'✅' if item['status'] == 'ok' else '❌':<4}"
+                f"{kinds[KIND_DS_STORE]['count']:>10}{kinds[KIND_RESOURCE_FORK]['count']:>10}"
+                f"{format_size(kinds[KIND_DS_STORE]['bytes'] + kinds[KIND_RESOURCE_FORK]['bytes']):>12}")
+        if delete:
+            line += f"{kinds[KIND_DS_STORE]['failed'] + kinds[KIND_RESOURCE_FORK]['failed']:>8}"
+        line += f"{item['unreadable_dirs']:>8}{item['seconds']:>7.2f}s  {item['root']}"
+        if result is not None and result['error']:
+            line += f"  - 错误: {result['error']}"
+        print(line)
+    if delete:
+        freed = sum(counts['freed'] for counts in summary['kinds'].values())
+        print(f"💾 释放空间: ~{format_size(freed)}")
+
+def run_multi_root(roots, args, output_mode):
+    """
+    并发处理多个目录，输出汇总报告（及 --json 报告）
+    
+    同时处理的目录数不超过 args.root_jobs；每个目录内部仍按 args.jobs
+    并行扫描。所有目录共用一个输出（进度模式下为一个进度行）和日志文件。
+    
+    Returns:
+        int: 退出码，有目录处理失败时为1
+    """
+    delete = not args.scan_only
+    json_to_stdout = args.json == '-'
+    if json_to_stdout:
+        output_mode = 'quiet'
+    base_dir = os.path.commonpath(roots) if len(roots) > 1 else roots[0]
+    reporter = SharedCleanupReporter(output_mode, base_dir, args.log if delete else None, args.log_format)
+    reporter.message(f"{'🧹 开始清理' if delete else '🔍 开始扫描'} {len(roots)} 个目录"
+                     f"（同时处理 {min(args.root_jobs, len(roots))} 个）...")
+    
+    started_at = datetime.now()
+    start_time = time.perf_counter()
+    results = [None] * len(roots)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.root_jobs)) as executor:
+            futures = {executor.submit(process_root, root, args, delete, reporter): i
+                       for i, root in enumerate(roots)}
+            for future in futures:
+                # 按输入顺序收集，报告顺序稳定
+                index = futures[future]
+                results[index] = future.result()
+                result = results[index]
+                if result['status'] != 'ok':
+                    print(f"❌ {result['root']} - 错误: {result['error']}", file=sys.stderr)
+    finally:
+        reporter.finish()
+    elapsed = time.perf_counter() - start_time
+    summary = summarize_root_results(results)
+    
+    if not json_to_stdout:
+        if args.quiet:
+            kinds = summary['kinds']
+            total_count = sum(counts['count'] for counts in kinds.values())
+            total_bytes = sum(counts['bytes'] for counts in kinds.values())
+            print(f"{len(roots)} 个目录{'清理' if delete else '扫描'}完成: {total_count} 个macOS系统文件，"
+                  f"{format_size(total_bytes)}，{summary['failed_roots']} 个目录失败")
+        else:
+            print_root_report(results, summary, delete, elapsed)
+    
+    if args.json:
+        report = {
+            'mode': 'cleanup' if delete else 'scan-only',
+            'started_at': started_at.isoformat(timespec='seconds'),
+            'seconds': elapsed,
+            'params': {'exclude': args.exclude, 'one_file_system': args.one_file_system,
+                       'jobs': args.jobs, 'root_jobs': args.root_jobs},
+            'summary': summary,
+            'roots': results,
+        }
+        if json_to_stdout:
+            json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+            print()
+        else:
+            temp_path = f"{args.json}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, args.json)
+            if not args.quiet:
+                print(f"📄 JSON报告已写入: {args.json}")
+    return 1 if summary['failed_roots'] else 0
+
+# ==================== 监视模式 ====================
+
+# inotify 常量（见 <sys/inotify.h>）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE | IN_ONLYDIR
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+class WatchLimitError(OSError):
+    """inotify 监视数量达到系统上限（fs.inotify.max_user_watches）"""
+
+def _load_libc_inotify():
+    """加载libc中的inotify函数，非Linux或不可用时返回None"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+class _PathEntry:
+    """为 DirectoryFilter.should_prune 提供与 os.DirEntry 相同的最小接口"""
+    __slots__ = ('name', 'path')
+    
+    def __init__(self, dir_path, name):
+        self.name = name
+        self.path = os.path.join(dir_path, name)
+    
+    def stat(self, follow_symlinks=True):
+        return os.stat(self.path, follow_symlinks=follow_symlinks)
+
+class MacosFileWatcher:
+    """
+    基于inotify的常驻监视：macOS系统文件出现后短暂延迟即删除
+    
+    启动时递归为所有目录（剪枝规则之外）注册监视，并清理已有的系统文件；
+    新建或移入的目录会自动注册监视并扫描其中已有的文件。空闲时阻塞在
+    poll 上，不占用CPU。事件队列溢出时完整重扫一次；监视数量达到系统上限时
+    抛出 WatchLimitError，由调用方改用轮询模式。
+    """
+    
+    def __init__(self, target_dir, dir_filter=None, reporter=None, delete_delay=WATCH_DELETE_DELAY,
+                 stats_interval=WATCH_STATS_INTERVAL):
+        self.libc = _load_libc_inotify()
+        if self.libc is None:
+            raise OSError(errno.ENOSYS, "当前系统不支持inotify")
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.target_dir = os.fspath(target_dir)
+        self.dir_filter = dir_filter
+        self.reporter = reporter or CleanupReporter('verbose', target_dir)
+        self.delete_delay = delete_delay
+        self.stats_interval = stats_interval
+        self.watch_paths = {}    # 监视描述符 -> 目录路径
+        self.pending = {}        # 待删除文件路径 -> (到期时间, 文件类型)
+        self.rescans = 0
+        self.start_time = time.monotonic()
+    
+    def close(self):
+        """关闭inotify文件描述符（同时移除所有监视）"""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+    
+    def add_watch(self, dir_path):
+        """为单个目录注册监视（同一目录重复注册时更新其路径，用于目录改名）"""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir_path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                raise WatchLimitError(error, "inotify 监视数量达到上限（可调大 fs.inotify.max_user_watches）")
+            if error in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                # 目录已被删除、已不是目录或无权访问
+                return
+            raise OSError(error, os.strerror(error), dir_path)
+        self.watch_paths[wd] = dir_path
+    
+    def add_tree(self, root_dir):
+        """递归注册监视，并安排删除其中已有的系统文件"""
+        pending_dirs = [root_dir]
+        while pending_dirs:
+            dir_path = pending_dirs.pop()
+            # 先注册监视再列目录，列出之后才出现的文件也不会漏掉
+            self.add_watch(dir_path)
+            subdirs, records = scan_directory(dir_path, dir_filter=self.dir_filter)
+            pending_dirs.extend(subdirs)
+            for record in records:
+                self.schedule(record.path, record.kind)
+    
+    def rescan(self):
+        """事件队列溢出后完整重扫：补注册监视并清理遗漏的文件"""
+        self.rescans += 1
+        self.reporter.message(f"⚠️  [{datetime.now():%H:%M:%S}] inotify 事件队列溢出，重新扫描整个目录树")
+        self.add_tree(self.target_dir)
+    
+    def schedule(self, path, kind):
+        """安排延迟删除，文件再次被写入时推迟"""
+        self.pending[path] = (time.monotonic() + self.delete_delay, kind)
+    
+    def _is_pruned(self, dir_path, name):
+        """新出现的子目录是否命中剪枝规则"""
+        if self.dir_filter is None or not self.dir_filter.active:
+            return False
+        try:
+            return self.dir_filter.should_prune(_PathEntry(dir_path, name))
+        except OSError:
+            # 目录已消失
+            return True
+    
+    def handle_events(self):
+        """读取并处理所有已到达的inotify事件"""
+        overflow = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_length = _INOTIFY_EVENT.unpack_from(data, offset)
+                offset += _INOTIFY_EVENT.size
+                name = os.fsdecode(data[offset:offset + name_length].split(b'\0', 1)[0])
+                offset += name_length
+                
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                if mask & IN_IGNORED:
+                    # 目录已被删除或移出
+                    self.watch_paths.pop(wd, None)
+                    continue
+                dir_path = self.watch_paths.get(wd)
+                if dir_path is None or not name:
+                    continue
+                path = os.path.join(dir_path, name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and not self._is_pruned(dir_path, name):
+                        self.add_tree(path)
+                    continue
+                kind = classify_name(name)
+                if kind is not None:
+                    self.schedule(path, kind)
+        if overflow:
+            self.rescan()
+    
+    def delete_due(self):
+        """删除已到期的文件"""
+        now = time.monotonic()
+        due = [(path, kind) for path, (due_time, kind) in self.pending.items() if due_time <= now]
+        if not due:
+            return
+        for path, kind in due:
+            del self.pending[path]
+            try:
+                stat_result = os.lstat(path)
+                if not stat.S_ISREG(stat_result.st_mode):
+                    # 与扫描时一致，只删除普通文件
+                    continue
+                size = stat_result.st_size
+                os.unlink(path)
+            except FileNotFoundError:
+                # 客户端已自行删除或改名
+                continue
+            except OSError as e:
+                self.reporter.add(ScanRecord(path, 0, kind), str(e))
+                continue
+            self.reporter.add(ScanRecord(path, size, kind))
+        self.reporter.flush()
+    
+    def next_timeout(self, next_stats):
+        """计算 poll 的等待时间（毫秒）：到下一个文件到期或下一次统计输出"""
+        deadline = next_stats
+        if self.pending:
+            deadline = min(deadline, min(due_time for due_time, _ in self.pending.values()))
+        return max(0, int((deadline - time.monotonic()) * 1000) + 1)
+    
+    def print_stats(self):
+        """输出运行统计"""
+        uptime = format_duration(time.monotonic() - self.start_time)
+        print(f"📊 [{datetime.now():%Y-%m-%d %H:%M:%S}] 运行 {uptime}，监视 {len(self.watch_paths)} 个目录，"
+              f"已删除 {self.reporter.deleted} 个文件（{format_size(self.reporter.freed)}），"
+              f"失败 {self.reporter.failed} 个，待删除 {len(self.pending)} 个，重扫 {self.rescans} 次",
+              flush=True)
+    
+    def run(self):
+        """注册监视并持续处理事件，直到被中断"""
+        self.add_tree(self.target_dir)
+        self.reporter.message(f"👀 正在监视 {len(self.watch_paths)} 个目录（按 Ctrl+C 或发送 SIGTERM 结束）")
+        poller = select.poll()
+        poller.register(self.fd, select.POLLIN)
+        next_stats = time.monotonic() + self.stats_interval
+        while True:
+            if poller.poll(self.next_timeout(next_stats)):
+                self.handle_events()
+            self.delete_due()
+            if time.monotonic() >= next_stats:
+                self.print_stats()
+                next_stats = time.monotonic() + self.stats_interval
+
+def select_settled_files(records, pending, delete_delay, now):
+    """
+    轮询模式下挑选可删除的文件：修改时间保持不变至少 delete_delay 秒
+    
+    Args:
+        records (iterable): 本轮扫描到的 ScanRecord
+        pending (dict): 上一轮的等待记录 {路径: (修改时间ns, 首次看到该修改时间的时刻)}
+        delete_delay (float): 删除前的等待秒数
+        now (float): 当前 time.monotonic()
+        
+    Returns:
+        tuple: (可删除的 ScanRecord 列表, 本轮的等待记录)
+    """
+    settled = []
+    still_pending = {}
+    for record in records:
+        try:
+            stat_result = os.lstat(record.path)
+        except OSError:
+            # 客户端已自行删除或改名
+            continue
+        previous = pending.get(record.path)
+        first_seen = previous[1] if previous and previous[0] == stat_result.st_mtime_ns else now
+        if now - first_seen >= delete_delay:
+            settled.append(record._replace(size=stat_result.st_size))
+        else:
+            still_pending[record.path] = (stat_result.st_mtime_ns, first_seen)
+    return settled, still_pending
+
+def run_polling_watch(target_dir, jobs=1, dir_filter=None, reporter=None, delete_delay=WATCH_DELETE_DELAY,
+                      poll_interval=WATCH_POLL_INTERVAL, stats_interval=WATCH_STATS_INTERVAL):
+    """
+    轮询模式的常驻清理（无法使用inotify时的后备方案）
+    
+    每轮使用内存中的增量扫描索引，只重新列出修改时间变化的目录。
+    文件在连续的扫描中修改时间保持不变至少 delete_delay 秒后才删除，
+    有文件等待删除时提前进行下一轮扫描
+    """
+    reporter = reporter or CleanupReporter('verbose', target_dir)
+    scan_index = ScanIndex(None, target_dir)
+    start_time = time.monotonic()
+    next_stats = start_time + stats_interval
+    rounds = 0
+    pending = {}
+    reporter.message(f"🔁 轮询模式：每 {poll_interval:g}s 扫描一次（按 Ctrl+C 或发送 SIGTERM 结束）")
+    while True:
+        records = scan_macos_files(target_dir, jobs, dir_filter=dir_filter, scan_func=scan_index.scan)
+        settled, pending = select_settled_files(records, pending, delete_delay, time.monotonic())
+        for record, error in delete_batch(settled):
+            reporter.add(record, error)
+        reporter.flush()
+        scan_index.invalidate_matched_dirs()
+        rounds += 1
+        if time.monotonic() >= next_stats:
+            print(f"📊 [{datetime.now():%Y-%m-%d %H:%M:%S}] 运行 {format_duration(time.monotonic() - start_time)}，"
+                  f"已轮询 {rounds} 次，已删除 {reporter.deleted} 个文件（{format_size(reporter.freed)}），"
+                  f"失败 {reporter.failed} 个，待删除 {len(pending)} 个", flush=True)
+            next_stats = time.monotonic() + stats_interval
+        sleep_seconds = poll_interval
+        if pending:
+            next_due = min(first_seen for _, first_seen in pending.values()) + delete_delay
+            sleep_seconds = min(poll_interval, max(0.0, next_due - time.monotonic()))
+        time.sleep(sleep_seconds)
+
+def _raise_keyboard_interrupt(signum, frame):
+    """SIGTERM 与 Ctrl+C 一样正常结束监视"""
+    raise KeyboardInterrupt
+
+def run_watch(target_dir, jobs=1, dir_filter=None, reporter=None, force_polling=False,
+              delete_delay=WATCH_DELETE_DELAY):
+    """
+    监视模式入口：优先使用inotify，不可用或监视数量达到上限时改用轮询
+    
+    Args:
+        target_dir (Path): 目标目录
+        jobs (int): 轮询模式的扫描线程数
+        dir_filter (DirectoryFilter, optional): 目录剪枝规则
+        reporter (CleanupReporter, optional): 结果输出
+        force_polling (bool): 不使用inotify，直接轮询
+        delete_delay (float): 文件出现后等待多少秒再删除
+    """
+    reporter = reporter or CleanupReporter('verbose', target_dir)
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    watcher = None
+    try:
+        if not force_polling:
+            try:
+                watcher = MacosFileWatcher(target_dir, dir_filter, reporter, delete_delay)
+                watcher.run()
+            except WatchLimitError as e:
+                reporter.message(f"⚠️  {e.strerror}，改用轮询模式")
+            except OSError as e:
+                reporter.message(f"⚠️  无法使用inotify（{e.strerror or e}），改用轮询模式")
+            finally:
+                if watcher is not None:
+                    watcher.close()
+            # 尚未删除的文件由轮询重新扫描到
+            watcher = None
+        run_polling_watch(target_dir, jobs, dir_filter, reporter, delete_delay)
+    except KeyboardInterrupt:
+        if watcher is not None:
+            watcher.print_stats()
+        print(f"⏹️  监视结束：共删除 {reporter.deleted} 个文件（{format_size(reporter.freed)}），"
+              f"失败 {reporter.failed} 个")
+    finally:
+        reporter.finish()
+
 def main():
     """主函数"""
     # 解析命令行参数
@@ -188,37 +1483,162 @@ def main():
         epilog="""
 示例用法:
     python3 cleanup_macos_files.py              # 交互式清理
-    python3 cleanup_macos_files.py --auto       # 自动清理，不询问
+    python3 cleanup_macos_files.py --auto       # 自动清理，不询问（边扫描边删除）
     python3 cleanup_macos_files.py --scan-only  # 仅扫描，不删除
+    python3 cleanup_macos_files.py --jobs 16    # 16个线程并行扫描（适合NFS/SMB挂载）
+    python3 cleanup_macos_files.py --exclude .git --exclude node_modules --one-file-system
+    python3 cleanup_macos_files.py --auto --progress --log cleanup.log  # 大批量删除，只显示单行进度
+    python3 cleanup_macos_files.py --auto --quiet --log cleanup.jsonl --log-format jsonl  # 定时任务
+    python3 cleanup_macos_files.py --auto --index share.idx  # 增量扫描，只重新列出有变化的目录
+    python3 cleanup_macos_files.py --watch --target-dir /srv/samba/share  # 常驻监视，文件出现即删除
+    python3 cleanup_macos_files.py --scan-only --roots-file shares.txt --json audit.json  # 多目录审计
         """
     )
     parser.add_argument('--auto', action='store_true', 
                       help='自动删除，不询问确认')
     parser.add_argument('--scan-only', action='store_true',
                       help='仅扫描文件，不执行删除操作')
-    parser.add_argument('--target-dir', type=str, default='.',
-                      help='指定要清理的目录路径（默认为当前目录）')
+    parser.add_argument('--target-dir', type=str, action='append', metavar='DIR',
+                      help='指定要清理的目录路径（默认为当前目录；可多次指定以并发处理多个目录）')
+    parser.add_argument('--roots-file', type=str, metavar='PATH',
+                      help='从文件读取要处理的目录列表（每行一个，# 开头为注释）')
+    parser.add_argument('--root-jobs', type=int, default=DEFAULT_ROOT_JOBS,
+                      help=f'多目录时同时处理的目录数（默认 {DEFAULT_ROOT_JOBS}）')
+    parser.add_argument('--json', type=str, metavar='PATH',
+                      help='多目录模式下将汇总报告写入JSON文件（- 表示输出到标准输出）')
+    parser.add_argument('--jobs', type=int, default=1,
+                      help='并行扫描的线程数（默认为1，串行扫描）')
+    parser.add_argument('--delete-jobs', type=int, default=1,
+                      help='自动模式下并行删除的线程数（默认为1）')
+    parser.add_argument('--exclude', action='append', default=[], metavar='PATTERN',
+                      help='跳过匹配的目录（glob模式，可多次指定；不含/时匹配目录名，含/时匹配相对路径）')
+    parser.add_argument('--one-file-system', action='store_true',
+                      help='不进入位于其他文件系统（挂载点）上的目录')
+    output_group = parser.add_mutually_exclusive_group()
+    output_group.add_argument('--verbose', action='store_true',
+                      help='每删除一个文件输出一行（默认）')
+    output_group.add_argument('--progress', action='store_true',
+                      help='只显示一行实时进度（数量、释放空间、速率、剩余时间），适合大批量删除')
+    output_group.add_argument('--quiet', action='store_true',
+                      help='只输出错误和一行最终结果，适合定时任务')
+    parser.add_argument('--log', type=str, metavar='PATH',
+                      help='将逐文件删除明细追加写入日志文件')
+    parser.add_argument('--log-format', choices=('text', 'jsonl'), default='text',
+                      help='日志格式：text（制表符分隔）或 jsonl（每行一个JSON对象），默认 text')
+    parser.add_argument('--index', type=str, metavar='PATH',
+                      help='增量扫描索引文件：记录各目录修改时间，下次只重新列出有变化的目录')
+    parser.add_argument('--verify-index', action='store_true',
+                      help='校验索引：按索引扫描后再完整扫描并比较，同时重建索引（不删除文件）')
+    parser.add_argument('--watch', action='store_true',
+                      help='常驻监视模式：使用inotify（不可用时轮询）在系统文件出现后立即删除')
+    parser.add_argument('--poll', action='store_true',
+                      help='监视模式下不使用inotify，直接轮询扫描')
+    parser.add_argument('--watch-delay', type=float, default=WATCH_DELETE_DELAY,
+                      help=f'监视模式下文件出现后等待多少秒再删除（默认 {WATCH_DELETE_DELAY:g}）')
     
     args = parser.parse_args()
+    output_mode = 'progress' if args.progress else 'quiet' if args.quiet else 'verbose'
+    if args.verify_index and not args.index:
+        parser.error('--verify-index 需要同时指定 --index')
+    
+    roots = list(args.target_dir or [])
+    if args.roots_file:
+        try:
+            roots.extend(load_root_list(args.roots_file))
+        except OSError as e:
+            parser.error(f'无法读取目录列表文件: {e}')
+        if not roots:
+            parser.error(f'目录列表文件 {args.roots_file} 中没有目录')
+    roots = list(dict.fromkeys(os.path.realpath(root) for root in roots or ['.']))
+    nested = find_nested_root(roots)
+    if nested:
+        parser.error(f'目录 {nested[0]} 位于 {nested[1]} 之下，会被重复处理，请只保留上级目录')
+    
+    if len(roots) > 1 or args.roots_file or args.json:
+        if args.watch or args.index:
+            parser.error('--watch 和 --index 只支持单个目录')
+        if not (args.auto or args.scan_only):
+            parser.error('多目录模式不支持交互确认，请指定 --auto 或 --scan-only')
+        if not (args.quiet or args.json == '-'):
+            print_banner(Path(roots[0]) if len(roots) == 1 else Path(os.path.commonpath(roots)))
+        sys.exit(run_multi_root(roots, args, output_mode))
     
     # 设置目标目录
-    target_dir = Path(args.target_dir).resolve()
+    target_dir = Path(roots[0])
     if not target_dir.exists():
         print(f"❌ 错误: 目录 {target_dir} 不存在")
         sys.exit(1)
     
     # 打印横幅（包含目标目录信息）
-    print_banner(target_dir)
+    if not args.quiet:
+        print_banner(target_dir)
+    
+    dir_filter = DirectoryFilter(target_dir, args.exclude, args.one_file_system)
+    
+    scan_index = None
+    if args.index:
+        scan_index, reused = ScanIndex.load(
+            args.index, target_dir, {'exclude': args.exclude, 'one_file_system': args.one_file_system})
+        if not args.quiet:
+            print(f"🗃️  扫描索引: {args.index}（{'已加载' if reused else '新建'}，{len(scan_index.dirs)} 个目录）")
+            print()
+    
+    if args.watch:
+        # 监视模式不询问确认；逐文件输出默认保留，便于在系统日志中追溯
+        reporter = CleanupReporter('quiet' if args.quiet else 'verbose', target_dir, args.log, args.log_format)
+        run_watch(target_dir, args.jobs, dir_filter, reporter, force_polling=args.poll,
+                  delete_delay=args.watch_delay)
+        return
+    
+    try:
+        if args.verify_index:
+            if not verify_scan_index(scan_index, target_dir, args.jobs, dir_filter):
+                sys.exit(2)
+            return
+        run_cleanup(args, target_dir, dir_filter, output_mode, scan_index)
+    finally:
+        if scan_index is not None:
+            scan_index.save()
+
+def run_cleanup(args, target_dir, dir_filter, output_mode, scan_index=None):
+    """
+    按命令行参数执行扫描和清理
+    
+    Args:
+        args (Namespace): 命令行参数
+        target_dir (Path): 目标目录
+        dir_filter (DirectoryFilter): 目录剪枝规则
+        output_mode (str): 输出模式，见 OUTPUT_MODES
+        scan_index (ScanIndex, optional): 增量扫描索引
+    """
+    # 自动模式无需先展示统计再确认，直接边扫描边删除，内存占用恒定
+    if args.auto and not args.scan_only:
+        reporter = CleanupReporter(output_mode, target_dir, args.log, args.log_format)
+        run_streaming_cleanup(target_dir, args.jobs, args.delete_jobs, dir_filter, reporter, scan_index)
+        return
     
     # 扫描macOS系统文件
-    print("🔍 正在扫描macOS系统文件...")
-    ds_store_files, resource_fork_files = get_macos_files(target_dir)
+    if not args.quiet:
+        print("🔍 正在扫描macOS系统文件...")
+    start_time = time.perf_counter()
+    scan_func = scan_index.scan if scan_index is not None else scan_directory
+    ds_store_files, resource_fork_files = get_macos_files(target_dir, args.jobs, dir_filter, scan_func)
+    total_files = len(ds_store_files) + len(resource_fork_files)
+    if scan_index is not None:
+        scan_index.complete = True
     
     # 显示统计信息
-    print_statistics(ds_store_files, resource_fork_files)
+    if args.quiet:
+        if args.scan_only or total_files == 0:
+            print(f"扫描完成: {total_files} 个macOS系统文件，"
+                  f"{format_size(get_file_sizes(ds_store_files) + get_file_sizes(resource_fork_files))}")
+            return
+    else:
+        print_prune_statistics(dir_filter, time.perf_counter() - start_time)
+        print_index_statistics(scan_index)
+        print_statistics(ds_store_files, resource_fork_files)
     
     # 检查是否有文件需要清理
-    total_files = len(ds_store_files) + len(resource_fork_files)
     if total_files == 0:
         print("✨ 恭喜！没有找到任何macOS系统文件，目录已经很干净了！")
         return
@@ -228,37 +1648,30 @@ def main():
         print("📋 扫描完成（仅扫描模式，未执行删除操作）")
         return
     
-    # 询问用户确认（除非是自动模式）
-    if not args.auto:
-        print("⚠️  即将删除上述所有macOS系统文件")
-        confirm = input("是否继续? (y/N): ").strip().lower()
-        if confirm not in ['y', 'yes', '是']:
-            print("❌ 操作已取消")
-            return
-        print()
+    # 询问用户确认
+    print("⚠️  即将删除上述所有macOS系统文件")
+    confirm = input("是否继续? (y/N): ").strip().lower()
+    if confirm not in ['y', 'yes', '是']:
+        print("❌ 操作已取消")
+        return
+    print()
     
     # 执行删除操作
-    print("🧹 开始清理操作...")
-    print("-" * 30)
+    reporter = CleanupReporter(output_mode, target_dir, args.log, args.log_format, total=total_files)
+    reporter.message("🧹 开始清理操作...")
+    reporter.message("-" * 30)
     
-    ds_success, ds_error = delete_files(ds_store_files, '.DS_Store', target_dir)
-    fork_success, fork_error = delete_files(resource_fork_files, '._* 资源文件', target_dir)
+    try:
+        ds_success, ds_error = delete_files(ds_store_files, '.DS_Store', target_dir, reporter)
+        fork_success, fork_error = delete_files(resource_fork_files, '._* 资源文件', target_dir, reporter)
+    finally:
+        reporter.finish()
+        if scan_index is not None:
+            scan_index.invalidate_matched_dirs()
     
     # 总结报告
-    total_success = ds_success + fork_success
-    total_error = ds_error + fork_error
-    
-    print("🎉 清理操作完成")
-    print("=" * 30)
-    print(f"✅ 成功删除: {total_success} 个文件")
-    if total_error > 0:
-        print(f"❌ 删除失败: {total_error} 个文件")
-        print("💡 建议检查文件权限或是否被其他程序占用")
-    else:
-        print("🎊 所有文件删除成功！")
-    
-    print(f"💾 释放空间: ~{format_size(get_file_sizes(ds_store_files + resource_fork_files))}")
-    print("🚀 目录现在完全干净，没有macOS系统文件！")
+    print_cleanup_summary(ds_success + fork_success, ds_error + fork_error, reporter.freed,
+                          quiet=args.quiet)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,121 @@
+"""cleanup_macos_files 的回归测试（python3 -m unittest test_cleanup_macos_files）"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import cleanup_macos_files
+
+
+class QuietModeFailureTest(unittest.TestCase):
+    """--quiet 模式下删除失败的文件仍需报告"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        (self.root / 'sub').mkdir()
+        self.locked = self.root / 'sub' / '._photo.jpg'
+        self.locked.write_bytes(b'x' * 4096)
+        (self.root / '.DS_Store').write_bytes(b'x' * 6148)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_failed_delete_reported_on_stderr(self):
+        real_unlink = os.unlink
+
+        def failing_unlink(path, *args, **kwargs):
+            if os.fspath(path) == os.fspath(self.locked):
+                raise PermissionError(13, 'Permission denied', os.fspath(path))
+            return real_unlink(path, *args, **kwargs)
+
+        argv = ['cleanup_macos_files.py', '--auto', '--quiet', '--target-dir', str(self.root)]
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with mock.patch.object(sys, 'argv', argv), \
+                mock.patch.object(cleanup_macos_files.os, 'unlink', failing_unlink), \
+                contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            cleanup_macos_files.main()
+
+        self.assertTrue(self.locked.exists())
+        self.assertFalse((self.root / '.DS_Store').exists())
+        self.assertIn(os.fspath(self.locked), stderr.getvalue())
+        self.assertIn('Permission denied', stderr.getvalue())
+        self.assertIn('失败 1 个', stdout.getvalue())
+
+
+
+class ScanSymlinkTest(unittest.TestCase):
+    """名称匹配的符号链接不视为系统文件"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        (self.root / 'target.bin').write_bytes(b'x' * 10000)
+        (self.root / '._real').write_bytes(b'x' * 4096)
+        os.symlink(self.root / 'target.bin', self.root / '._link')
+        os.symlink(self.root / 'missing', self.root / '._dangling')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_symlinks_not_matched(self):
+        for jobs in (1, 4):
+            records = list(cleanup_macos_files.scan_macos_files(self.root, jobs))
+            self.assertEqual([(os.path.basename(record.path), record.size) for record in records],
+                             [('._real', 4096)])
+
+
+class MultiRootTest(unittest.TestCase):
+    """多目录模式：嵌套目录与单个目录的意外错误"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self._tmp.name)
+        for name in ('a', 'b'):
+            (self.base / name / 'sub').mkdir(parents=True)
+            (self.base / name / 'sub' / '.DS_Store').write_bytes(b'x' * 6148)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def run_main(self, *args):
+        argv = ['cleanup_macos_files.py', '--scan-only', '--json', '-', *args]
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with mock.patch.object(sys, 'argv', argv), \
+                contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr), \
+                self.assertRaises(SystemExit) as exit_info:
+            cleanup_macos_files.main()
+        return exit_info.exception.code, stdout.getvalue(), stderr.getvalue()
+
+    def test_nested_root_rejected(self):
+        code, _, stderr = self.run_main('--target-dir', str(self.base / 'a'),
+                                        '--target-dir', str(self.base / 'a' / 'sub'))
+        self.assertEqual(code, 2)
+        self.assertIn(os.path.realpath(self.base / 'a' / 'sub'), stderr)
+
+    def test_unexpected_error_recorded_per_root(self):
+        real_scan = cleanup_macos_files.scan_macos_files
+
+        def scan(root_dir, *args, **kwargs):
+            if os.path.basename(root_dir) == 'b':
+                raise ValueError('boom')
+            return real_scan(root_dir, *args, **kwargs)
+
+        with mock.patch.object(cleanup_macos_files, 'scan_macos_files', scan):
+            code, stdout, _ = self.run_main('--target-dir', str(self.base / 'a'),
+                                            '--target-dir', str(self.base / 'b'))
+        report = json.loads(stdout)
+        self.assertEqual(code, 1)
+        self.assertEqual([root['status'] for root in report['roots']], ['ok', 'error'])
+        self.assertIn('boom', report['roots'][1]['error'])
+        self.assertEqual(report['roots'][0]['kinds']['ds_store']['count'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,11 +2,26 @@
 脚本功能：这个脚本用于按可配置项将数据集从源目录整理到目标目录：
 先根据配置检查/创建图片与标签子目录，支持按列表复制额外“特殊文件”（如 `classes.txt`），
 然后在标签目录收集所有`.xml`文件的基名，并遍历图片目录中`.png`文件，按同名基名一一匹配，
-匹配成功则将图片与对应标签成对复制到目标结构（用 `shutil.copy2` 保留元数据），
-过程中输出进度与异常提示（含缺失文件/文件夹的错误与警告），最后汇总成功复制的对数及目标路径。
+匹配成功则将图片与对应标签成对复制到目标结构（与 `shutil.copy2` 一样保留元数据），
+复制由线程池并发执行，Linux上优先使用内核内复制（`os.copy_file_range`/`os.sendfile`），
+也可以用硬链接、符号链接或reflink（FICLONE）代替复制，无法建立链接时自动回退为复制，
+默认增量同步：目标文件大小与修改时间（可选内容校验）一致时跳过，可选删除源中已不存在的目标文件对，
+过程中定期输出进度、吞吐量与失败信息，最后汇总复制、跳过、删除、失败的对数及目标路径。
  """
 import os
+import sys
+import stat
+import time
+import errno
 import shutil
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 # ==============================================================================
 # --- 用户可修改配置区 ---
@@ -28,15 +43,373 @@ LABEL_SUBDIR = '7_Road_label'
 #    根据您的要求，这里设置为空列表，表示不复制任何额外文件。
 SPECIAL_FILES_TO_COPY = []
 
+# 4. 并行复制设置
+#    同时复制的线程数。复制以I/O为主，线程池即可获得并发；本地SSD建议 8~16，
+#    网络盘可适当调高；设为 1 时逐对串行复制。
+COPY_WORKERS = 8
+#    每隔多少秒输出一次进度
+PROGRESS_INTERVAL = 2.0
+
+# 5. 目标文件的建立方式
+#    'copy'     复制文件内容（默认）
+#    'hardlink' 硬链接：不占额外空间，与源文件共享内容和元数据，需在同一文件系统
+#    'symlink'  符号链接（指向源文件的绝对路径）：源文件移动或删除后失效
+#    'reflink'  写时复制克隆（Btrfs/XFS等，FICLONE）：不占额外空间，之后修改互不影响
+#    无法建立链接时（如跨设备、文件系统不支持）自动回退为复制。
+LINK_MODE = 'copy'
+
+# 6. 增量同步设置（类似 rsync）
+#    INCREMENTAL: 目标文件已是最新（大小和修改时间一致，或已是指向源文件的链接）时跳过
+#    VERIFY_CHECKSUM: 大小一致时比较内容哈希而不是修改时间（更可靠，但需读取两边的全部内容）
+#    DELETE_EXTRANEOUS: 删除目标中源已不存在的图片/标签对（只删除 .png 和 .xml，不影响其他文件）
+INCREMENTAL = True
+VERIFY_CHECKSUM = False
+DELETE_EXTRANEOUS = False
+
 # --- 配置区结束 ---
 # ==============================================================================
 
+# 单次内核内复制的最大字节数（copy_file_range/sendfile 每次最多复制这么多，循环直到完成）
+_KERNEL_COPY_CHUNK = 1024 * 1024 * 1024
+# 内核内复制不可用时的错误码（跨文件系统、内核或文件系统不支持）
+_KERNEL_COPY_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP}
+LINK_MODES = ('copy', 'hardlink', 'symlink', 'reflink')
+# ioctl FICLONE（见 <linux/fs.h>）
+FICLONE = 0x40049409
+# 无法建立链接/克隆、应回退为复制的错误码
+_LINK_FALLBACK_ERRORS = {errno.EXDEV, errno.EPERM, errno.EACCES, errno.EMLINK, errno.ENOSYS,
+                         errno.EINVAL, errno.ENOTTY, errno.EOPNOTSUPP, errno.ENOTSUP}
+# 当前系统可用的内核内复制方式，首次遇到不支持的错误后降级
+_use_copy_file_range = hasattr(os, 'copy_file_range')
+_use_sendfile = hasattr(os, 'sendfile') and sys.platform.startswith('linux')
+
+
+def _kernel_copy(copy_func, src_fd, dst_fd, size):
+    """
+    循环调用 copy_file_range/sendfile 直到复制完 size 字节
+
+    Returns:
+        int or None: 实际复制的字节数，可能小于 size；None 表示第一次调用就不被支持
+        （尚未写入任何数据），调用方应换用其他方式
+    """
+    copied = 0
+    while copied < size:
+        try:
+            sent = copy_func(src_fd, dst_fd, min(size - copied, _KERNEL_COPY_CHUNK))
+        except OSError as e:
+            if copied == 0 and e.errno in _KERNEL_COPY_UNSUPPORTED:
+                return None
+            raise
+        if sent == 0:
+            # procfs/sysfs、部分FUSE和网络文件系统不支持内核内复制却返回0，或源文件在复制过程中被截断
+            break
+        copied += sent
+    return copied
+
+
+def copy_file_data(source_path, dest_path):
+    """
+    复制文件内容，优先使用内核内复制，数据不经过用户态
+
+    copy_file_range 在 XFS/Btrfs 等文件系统上可共享数据块，在NFS 4.2/SMB上
+    由服务器端完成复制；不支持时依次降级为 sendfile 和 shutil.copyfile
+
+    Returns:
+        int: 复制的字节数
+    """
+    global _use_copy_file_range, _use_sendfile
+    if not (_use_copy_file_range or _use_sendfile):
+        shutil.copyfile(source_path, dest_path)
+        return os.path.getsize(dest_path)
+
+    with open(source_path, 'rb') as fsrc, open(dest_path, 'wb') as fdst:
+        src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+        size = os.fstat(src_fd).st_size
+        # 大小为0时可能是procfs/sysfs等不报告大小的文件，直接在用户态复制
+        copied = None
+        if size and _use_copy_file_range:
+            copied = _kernel_copy(os.copy_file_range, src_fd, dst_fd, size)
+            if copied is None:
+                _use_copy_file_range = False
+        if size and copied is None and _use_sendfile:
+            copied = _kernel_copy(lambda i, o, n: os.sendfile(o, i, None, n), src_fd, dst_fd, size)
+            if copied is None:
+                _use_sendfile = False
+        if copied == size:
+            return size
+        # 内核内复制不可用或没有复制完整：从头在用户态重新复制，不能把不完整的文件当作成功
+        if copied:
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+        shutil.copyfileobj(fsrc, fdst)
+        return fdst.tell()
+
+
+def copy_file_with_metadata(source_path, dest_path):
+    """复制文件内容和元数据（权限、时间戳、扩展属性），效果与 shutil.copy2 相同"""
+    size = copy_file_data(source_path, dest_path)
+    shutil.copystat(source_path, dest_path)
+    return size
+
+
+def reflink_file(source_path, dest_path):
+    """
+    使用 FICLONE 克隆文件（共享数据块，写时复制），并复制元数据
+
+    Returns:
+        bool: False 表示当前系统或文件系统不支持，调用方应回退为复制
+    """
+    if fcntl is None:
+        return False
+    with open(source_path, 'rb') as fsrc, open(dest_path, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError as e:
+            if e.errno in _LINK_FALLBACK_ERRORS:
+                return False
+            raise
+    shutil.copystat(source_path, dest_path)
+    return True
+
+
+def place_file(source_path, dest_path, mode=LINK_MODE):
+    """
+    按 mode 在目标位置建立文件，无法建立链接时回退为复制
+
+    已存在的目标先删除：目标可能是上次运行留下的指向源文件的链接，
+    直接以写方式打开会截断源文件
+
+    Returns:
+        tuple: (实际复制的字节数, 是否回退为复制)
+    """
+    try:
+        os.unlink(dest_path)
+    except FileNotFoundError:
+        pass
+
+    if mode == 'copy':
+        return copy_file_with_metadata(source_path, dest_path), False
+    try:
+        if mode == 'hardlink':
+            os.link(source_path, dest_path)
+            return 0, False
+        if mode == 'symlink':
+            os.symlink(os.path.abspath(source_path), dest_path)
+            return 0, False
+        if reflink_file(source_path, dest_path):
+            return 0, False
+    except OSError as e:
+        if e.errno not in _LINK_FALLBACK_ERRORS:
+            raise
+    return copy_file_with_metadata(source_path, dest_path), True
+
+
+def _hash_file(path, block_size=1 << 20):
+    """计算文件内容的SHA1哈希"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_up_to_date(source_path, dest_path, mode=LINK_MODE, checksum=False):
+    """
+    判断目标文件是否已是最新，无需重新建立
+
+    - symlink 模式：目标是指向该源文件的符号链接
+    - hardlink 模式：目标与源是同一文件；跨设备时（已回退为复制）按下面的规则比较
+    - copy/reflink 模式：目标是独立的普通文件（不是链接），大小一致，且修改时间
+      （精确到秒，兼容时间精度较低的文件系统）或内容哈希（checksum=True）一致
+
+    切换建立方式后，不符合新方式的目标文件会被重新建立
+    """
+    try:
+        dest_stat = os.lstat(dest_path)
+    except FileNotFoundError:
+        return False
+    if stat.S_ISLNK(dest_stat.st_mode) or mode == 'symlink':
+        return (mode == 'symlink' and stat.S_ISLNK(dest_stat.st_mode)
+                and os.readlink(dest_path) == os.path.abspath(source_path))
+    source_stat = os.stat(source_path)
+    if (source_stat.st_dev, source_stat.st_ino) == (dest_stat.st_dev, dest_stat.st_ino):
+        return mode == 'hardlink'
+    if mode == 'hardlink' and source_stat.st_dev == dest_stat.st_dev:
+        return False
+    if source_stat.st_size != dest_stat.st_size:
+        return False
+    if checksum:
+        return _hash_file(source_path) == _hash_file(dest_path)
+    return int(source_stat.st_mtime) == int(dest_stat.st_mtime)
+
+
+def copy_pair(source_image_path, dest_image_path, source_label_path, dest_label_path, mode=LINK_MODE,
+              incremental=INCREMENTAL, checksum=VERIFY_CHECKSUM):
+    """
+    建立一对图片和标签（在线程池中执行），增量模式下只处理不是最新的文件
+
+    Returns:
+        tuple: (实际复制的字节数, 回退为复制的文件数, 是否有文件被重新建立)
+    """
+    total_bytes = 0
+    fallbacks = 0
+    placed = False
+    for source_path, dest_path in ((source_image_path, dest_image_path), (source_label_path, dest_label_path)):
+        if incremental and is_up_to_date(source_path, dest_path, mode, checksum):
+            continue
+        size, fallback = place_file(source_path, dest_path, mode)
+        total_bytes += size
+        fallbacks += fallback
+        placed = True
+    return total_bytes, fallbacks, placed
+
+
+def remove_extraneous_pairs(dest_image_dir, dest_label_dir, keep_basenames):
+    """
+    删除目标目录中源已不存在（或已不再匹配）的图片/标签对
+
+    只删除图片目录中的 .png 和标签目录中的 .xml，其他文件不受影响
 
-def process_and_copy_files_for_xml():
+    Returns:
+        tuple: (删除的文件对数, 删除失败的文件数)
+    """
+    removed_basenames = set()
+    error_count = 0
+    for dest_dir, extension in ((dest_image_dir, '.png'), (dest_label_dir, '.xml')):
+        for filename in os.listdir(dest_dir):
+            basename, ext = os.path.splitext(filename)
+            if ext != extension or basename in keep_basenames:
+                continue
+            try:
+                os.unlink(os.path.join(dest_dir, filename))
+                removed_basenames.add(basename)
+            except OSError as e:
+                print(f"  [错误] 删除 '{os.path.join(dest_dir, filename)}' 时发生错误: {e}")
+                error_count += 1
+    return len(removed_basenames), error_count
+
+
+def _format_bytes(size_bytes):
+    """格式化字节数"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size_bytes < 1024:
+            return f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024
+    return f"{size_bytes:.1f} TB"
+
+
+class CopyProgress:
+    """统计复制进度，每隔 PROGRESS_INTERVAL 秒输出一行（只在主线程中更新）"""
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.copied = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes = 0
+        self.fallbacks = 0
+        self.start_time = time.perf_counter()
+        self._last_report = self.start_time
+
+    def add(self, size=0, fallbacks=0, placed=True, failed=False):
+        if failed:
+            self.failed += 1
+        else:
+            self.done += 1
+            self.bytes += size
+            self.fallbacks += fallbacks
+            if placed:
+                self.copied += 1
+            else:
+                self.skipped += 1
+        now = time.perf_counter()
+        if now - self._last_report >= PROGRESS_INTERVAL:
+            self._last_report = now
+            print(f"  [进度] {self.text()}")
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def text(self):
+        elapsed = self.elapsed
+        rate = self.bytes / elapsed if elapsed > 0 else 0.0
+        pairs_rate = self.done / elapsed if elapsed > 0 else 0.0
+        text = (f"{self.done + self.failed}/{self.total} 对 | {_format_bytes(self.bytes)} | "
+                f"{_format_bytes(rate)}/s | {pairs_rate:.0f} 对/s")
+        if self.skipped:
+            text += f" | 跳过 {self.skipped}"
+        if self.fallbacks:
+            text += f" | 回退复制 {self.fallbacks} 个文件"
+        if self.failed:
+            text += f" | 失败 {self.failed}"
+        return text
+
+
+def copy_pairs(pairs, workers=COPY_WORKERS, mode=LINK_MODE, incremental=INCREMENTAL, checksum=VERIFY_CHECKSUM):
+    """
+    并发复制（或链接）图片/标签对
+
+    在途任务数有上限，内存占用与文件对数无关；单对失败只记录错误，不影响其他文件对
+
+    Args:
+        pairs (list): [(源图片, 目标图片, 源标签, 目标标签), ...]
+        workers (int): 线程数
+        mode (str): 目标文件的建立方式，见 LINK_MODES
+        incremental (bool): 跳过目标已是最新的文件
+        checksum (bool): 增量判断时比较内容哈希而不是修改时间
+
+    Returns:
+        tuple: (CopyProgress, 失败列表 [(源图片路径, 错误信息), ...])
+    """
+    progress = CopyProgress(len(pairs))
+    failures = []
+
+    def record(pair, future):
+        try:
+            progress.add(*future.result())
+        except OSError as e:
+            failures.append((pair[0], str(e)))
+            print(f"  [错误] 复制 '{pair[0]}' 时发生错误: {e}")
+            progress.add(failed=True)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        in_flight = {}
+        for pair in pairs:
+            if len(in_flight) >= max(1, workers) * 4:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record(in_flight.pop(future), future)
+            in_flight[executor.submit(copy_pair, *pair, mode, incremental, checksum)] = pair
+        for future in list(in_flight):
+            record(in_flight.pop(future), future)
+    return progress, failures
+
+
+def process_and_copy_files_for_xml(workers=None, mode=None, incremental=None, checksum=None, delete=None):
     """
     根据配置，查找匹配的图片和XML标签文件，并复制它们到一个新的目录中。
     同时，也会复制在配置中指定的任何特殊文件。
+
+    Args:
+        workers (int, optional): 复制线程数，默认使用 COPY_WORKERS
+        mode (str, optional): 目标文件的建立方式，默认使用 LINK_MODE
+        incremental (bool, optional): 跳过已是最新的目标文件，默认使用 INCREMENTAL
+        checksum (bool, optional): 比较内容哈希，默认使用 VERIFY_CHECKSUM
+        delete (bool, optional): 删除源中已不存在的目标文件对，默认使用 DELETE_EXTRANEOUS
     """
+    if workers is None:
+        workers = COPY_WORKERS
+    if mode is None:
+        mode = LINK_MODE
+    if incremental is None:
+        incremental = INCREMENTAL
+    if checksum is None:
+        checksum = VERIFY_CHECKSUM
+    if delete is None:
+        delete = DELETE_EXTRANEOUS
     # 1. 根据配置构建完整的路径
     source_image_dir = os.path.join(SOURCE_BASE_DIR, IMAGE_SUBDIR)
     source_label_dir = os.path.join(SOURCE_BASE_DIR, LABEL_SUBDIR)
@@ -91,47 +464,98 @@ def process_and_copy_files_for_xml():
         print(f"错误: 找不到源标签文件夹 {source_label_dir}")
         return
         
-    # 5. 遍历图片，进行匹配和复制
-    copied_count = 0
+    # 5. 遍历图片，进行匹配
     try:
         image_files = os.listdir(source_image_dir)
-        # 注意：这里仍然查找 .png 图片，如果您的图片格式不是 .png (例如 .jpg)，也需要相应修改
-        png_image_files = [f for f in image_files if f.endswith('.png')]
-        print(f"在 {source_image_dir} 中找到 {len(png_image_files)} 个 .png 图片文件。开始匹配...")
-        
-        if not png_image_files:
-            print(f"警告: 在 {source_image_dir} 中未找到任何 .png 图片文件。")
-        
-        for image_file in png_image_files:
-            image_basename = os.path.splitext(image_file)[0]
-            if image_basename in label_basenames:
-                source_image_path = os.path.join(source_image_dir, image_file)
-                # ---【修改点 2】--- 将 .txt 修改为 .xml
-                source_label_path = os.path.join(source_label_dir, image_basename + '.xml')
-                
-                if not os.path.exists(source_label_path):
-                    print(f"  [警告] 图片 '{image_file}' 的同名标签文件不存在，已跳过。")
-                    continue
-
-                dest_image_path = os.path.join(dest_image_dir, image_file)
-                # ---【修改点 3】--- 将 .txt 修改为 .xml
-                dest_label_path = os.path.join(dest_label_dir, image_basename + '.xml')
-                
-                shutil.copy2(source_image_path, dest_image_path)
-                shutil.copy2(source_label_path, dest_label_path)
-                copied_count += 1
     except FileNotFoundError:
         print(f"错误: 找不到源图片文件夹 {source_image_dir}")
         return
+    # 注意：这里仍然查找 .png 图片，如果您的图片格式不是 .png (例如 .jpg)，也需要相应修改
+    png_image_files = [f for f in image_files if f.endswith('.png')]
+    print(f"在 {source_image_dir} 中找到 {len(png_image_files)} 个 .png 图片文件。开始匹配...")
+
+    if not png_image_files:
+        print(f"警告: 在 {source_image_dir} 中未找到任何 .png 图片文件。")
 
-    # 6. 输出最终结果
+    # 标签基名取自目录列表，匹配成功即说明标签存在，无需再逐个检查
+    pairs = []
+    for image_file in png_image_files:
+        image_basename = os.path.splitext(image_file)[0]
+        if image_basename in label_basenames:
+            # ---【修改点 2】--- 将 .txt 修改为 .xml
+            pairs.append((os.path.join(source_image_dir, image_file),
+                          os.path.join(dest_image_dir, image_file),
+                          os.path.join(source_label_dir, image_basename + '.xml'),
+                          os.path.join(dest_label_dir, image_basename + '.xml')))
+
+    # 6. 并发复制匹配的文件对（增量模式下跳过已是最新的文件）
+    sync_desc = ('增量，比较内容哈希' if checksum else '增量，比较大小和修改时间') if incremental else '全量'
+    print(f"匹配到 {len(pairs)} 对文件，使用 {workers} 个线程处理（方式: {mode}，{sync_desc}）...")
+    progress, failures = copy_pairs(pairs, workers, mode, incremental, checksum)
+    copied_count = progress.copied
+
+    # 7. 删除源中已不存在的目标文件对
+    removed_count = 0
+    if delete:
+        if pairs:
+            keep_basenames = {os.path.splitext(os.path.basename(pair[0]))[0] for pair in pairs}
+            removed_count, remove_errors = remove_extraneous_pairs(dest_image_dir, dest_label_dir, keep_basenames)
+            if remove_errors:
+                print(f"  [警告] {remove_errors} 个多余文件删除失败")
+        else:
+            print("  [警告] 本次没有匹配到任何文件对，为防止误删，跳过删除多余文件。")
+
+    # 8. 输出最终结果
     print("\n--------------------")
     print("处理完成！")
     print(f"总共成功匹配并复制了 {copied_count} 对文件。")
+    if incremental:
+        print(f"已是最新而跳过: {progress.skipped} 对")
+    if delete:
+        print(f"源中已不存在而删除: {removed_count} 对")
+    print(f"复制数据量: {_format_bytes(progress.bytes)}，耗时 {progress.elapsed:.1f} 秒，"
+          f"平均 {_format_bytes(progress.bytes / progress.elapsed if progress.elapsed > 0 else 0)}/s")
+    if mode != 'copy':
+        print(f"建立方式: {mode}，其中 {progress.fallbacks} 个文件无法链接，已回退为复制")
+    if failures:
+        print(f"复制失败: {len(failures)} 对（详见上方 [错误] 信息）")
     print(f"图片已存入: {os.path.abspath(dest_image_dir)}")
     print(f"标签已存入: {os.path.abspath(dest_label_dir)}")
     print("--------------------")
 
+def main():
+    """解析命令行参数（未指定的参数使用配置区的值）并执行复制"""
+    global SOURCE_BASE_DIR, DEST_BASE_DIR, IMAGE_SUBDIR, LABEL_SUBDIR
+    parser = argparse.ArgumentParser(description='按同名基名匹配图片与XML标签，并发复制到目标目录')
+    parser.add_argument('--source', type=str, default=SOURCE_BASE_DIR,
+                        help='源基础目录（图片和标签子文件夹的上级目录）')
+    parser.add_argument('--dest', type=str, default=DEST_BASE_DIR,
+                        help='目标基础目录')
+    parser.add_argument('--image-subdir', type=str, default=IMAGE_SUBDIR,
+                        help='图片子文件夹名称')
+    parser.add_argument('--label-subdir', type=str, default=LABEL_SUBDIR,
+                        help='标签子文件夹名称')
+    parser.add_argument('--workers', type=int, default=COPY_WORKERS,
+                        help=f'复制线程数（默认 {COPY_WORKERS}，1 表示串行）')
+    parser.add_argument('--mode', choices=LINK_MODES, default=LINK_MODE,
+                        help=f'目标文件的建立方式：复制、硬链接、符号链接或reflink克隆，'
+                             f'无法链接时回退为复制（默认 {LINK_MODE}）')
+    parser.add_argument('--force', action='store_true',
+                        help='忽略增量判断，全部重新复制')
+    parser.add_argument('--checksum', action='store_true', default=VERIFY_CHECKSUM,
+                        help='增量判断时比较内容哈希而不是修改时间')
+    parser.add_argument('--delete', action='store_true', default=DELETE_EXTRANEOUS,
+                        help='删除目标中源已不存在的图片/标签对')
+    args = parser.parse_args()
+
+    SOURCE_BASE_DIR = args.source
+    DEST_BASE_DIR = args.dest
+    IMAGE_SUBDIR = args.image_subdir
+    LABEL_SUBDIR = args.label_subdir
+    process_and_copy_files_for_xml(workers=args.workers, mode=args.mode,
+                                   incremental=INCREMENTAL and not args.force,
+                                   checksum=args.checksum, delete=args.delete)
+
 if __name__ == "__main__":
     # 调用修改后的新函数
-    process_and_copy_files_for_xml()
+    main()
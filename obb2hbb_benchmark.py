@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+obb2hbb_converter.py 性能基准测试
+生成可配置规模的合成旋转框数据集（VOC风格XML + 图像），
+分别测量解析、几何计算、XML写出和可视化各阶段的耗时，用于跟踪性能回归
+
+使用方法：
+    python obb2hbb_benchmark.py                                  # 默认规模 100,1000
+    python obb2hbb_benchmark.py --scales 10000,100000 --no-vis   # 大规模，仅XML阶段
+    python obb2hbb_benchmark.py --json bench.json                # 输出JSON报告便于对比
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import contextlib
+
+import numpy as np
+
+import obb2hbb_converter as converter
+
+# ==================== 默认配置 ====================
+BENCH_ROOT = r'obb2hbb_bench_data'      # 合成数据集的存放目录（按参数分子目录，可重复使用）
+DEFAULT_SCALES = '100,1000'             # 测试的图像数量，逗号分隔
+DEFAULT_OBJECTS = 100                   # 每张图像的旋转框数量
+DEFAULT_IMAGE_SIZE = '1024x768'         # 图像分辨率 宽x高
+DEFAULT_VIS_LIMIT = 1000                # 可视化阶段最多测试的文件数（可视化远慢于XML阶段）
+DEFAULT_SEED = 0
+CLASS_NAMES = ('car', 'truck', 'bus', 'van', 'tricycle')
+
+_DATASET_MARKER = '.complete'
+
+# ==================== 合成数据集 ====================
+
+def _make_image_bytes(width, height, seed):
+    """生成一张合成图像并编码为PNG字节（低频随机纹理，所有图像共用以加快生成）"""
+    cv2 = converter._get_cv2()
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, size=(max(1, height // 32), max(1, width // 32), 3), dtype=np.uint8)
+    image = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    success, encoded = cv2.imencode('.png', image)
+    if not success:
+        raise RuntimeError("无法编码合成图像")
+    return encoded.tobytes()
+
+def _make_annotation_xml(name, width, height, objects_per_image, rng):
+    """生成单个VOC风格的旋转框XML文本"""
+    max_side = max(8.0, min(width, height) / 4)
+    objects = []
+    for _ in range(objects_per_image):
+        objects.append(f"""	<object>
+		<type>robndbox</type>
+		<name>{rng.choice(CLASS_NAMES)}</name>
+		<pose>Unspecified</pose>
+		<truncated>0</truncated>
+		<difficult>{int(rng.random() < 0.1)}</difficult>
+		<robndbox>
+			<cx>{rng.uniform(0, width):.4f}</cx>
+			<cy>{rng.uniform(0, height):.4f}</cy>
+			<w>{rng.uniform(8, max_side):.4f}</w>
+			<h>{rng.uniform(8, max_side):.4f}</h>
+			<angle>{rng.uniform(0, math.pi):.6f}</angle>
+		</robndbox>
+	</object>
+""")
+    return f"""<annotation verified="no">
+	<folder>images</folder>
+	<filename>{name}</filename>
+	<path>images/{name}.png</path>
+	<source>
+		<database>Synthetic</database>
+	</source>
+	<size>
+		<width>{width}</width>
+		<height>{height}</height>
+		<depth>3</depth>
+	</size>
+	<segmented>0</segmented>
+{''.join(objects)}</annotation>
+"""
+
+def generate_synthetic_dataset(root, num_images, objects_per_image, width, height,
+                               seed=DEFAULT_SEED, with_images=True):
+    """
+    生成合成数据集，已存在且完整时直接复用
+
+    Returns:
+        tuple: (图像目录, XML目录, 生成耗时秒数)
+    """
+    image_dir = os.path.join(root, 'images')
+    xml_dir = os.path.join(root, 'obb_xml')
+    marker_path = os.path.join(root, _DATASET_MARKER)
+    marker = {'images': with_images}
+
+    if os.path.exists(marker_path):
+        with open(marker_path, 'r', encoding='utf-8') as f:
+            existing = json.load(f)
+        if existing.get('images') or not with_images:
+            return image_dir, xml_dir, 0.0
+
+    start_time = time.perf_counter()
+    os.makedirs(xml_dir, exist_ok=True)
+    if with_images:
+        os.makedirs(image_dir, exist_ok=True)
+        image_bytes = _make_image_bytes(width, height, seed)
+
+    rng = random.Random(seed)
+    for i in range(num_images):
+        name = f'synthetic_{i:07d}'
+        with open(os.path.join(xml_dir, f'{name}.xml'), 'w', encoding='utf-8') as f:
+            f.write(_make_annotation_xml(name, width, height, objects_per_image, rng))
+        if with_images:
+            with open(os.path.join(image_dir, f'{name}.png'), 'wb') as f:
+                f.write(image_bytes)
+
+    with open(marker_path, 'w', encoding='utf-8') as f:
+        json.dump(marker, f)
+    return image_dir, xml_dir, time.perf_counter() - start_time
+
+# ==================== 基准测试 ====================
+
+def configure_converter(image_dir, xml_dir, output_dir, with_vis):
+    """将转换器的全局配置指向基准数据集"""
+    converter.IMAGE_DIR = image_dir
+    converter.XML_DIR = xml_dir
+    converter.OUTPUT_XML_DIR = os.path.join(output_dir, 'hbb_xml')
+    converter.OUTPUT_VIS_DIR = os.path.join(output_dir, 'vis')
+    converter.ENABLE_VISUALIZATION = with_vis
+    converter.PROFILE_ENABLED = True
+    os.makedirs(converter.OUTPUT_XML_DIR, exist_ok=True)
+    if with_vis:
+        os.makedirs(converter.OUTPUT_VIS_DIR, exist_ok=True)
+
+def benchmark_stages(xml_files, vis_limit):
+    """
+    串行逐文件执行转换与可视化，按阶段计时
+
+    Returns:
+        PipelineProfile: 各阶段耗时汇总
+    """
+    profile = converter.PipelineProfile(top_n=5)
+    vis_remaining = vis_limit if converter.ENABLE_VISUALIZATION else 0
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for xml_file in xml_files:
+            (image_basename, conversion_info), convert_timings = converter._run_with_timings(
+                converter.process_single_xml_file, xml_file)
+            vis_timings = None
+            if vis_remaining > 0 and conversion_info:
+                _, vis_timings = converter._run_with_timings(
+                    converter.render_visualization, image_basename, conversion_info)
+                vis_remaining -= 1
+            profile.add_file(xml_file, len(conversion_info or ()), convert_timings, vis_timings)
+
+    profile.finish()
+    return profile
+
+def benchmark_end_to_end(workers):
+    """使用 run_conversion 测量端到端耗时（不含增量跳过）"""
+    start_time = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        converter.run_conversion(workers=workers, incremental=False)
+    return time.perf_counter() - start_time
+
+def print_scale_report(result):
+    """打印单个规模的测试结果"""
+    report = result['stages']
+    print(f"\n规模: {result['images']} 张图像 × {result['objects_per_image']} 个对象 "
+          f"({result['image_size']})")
+    if result['generate_s']:
+        print(f"  数据集生成: {result['generate_s']:.2f}s")
+    print(f"  {'阶段':<12}{'累计(s)':>10}{'平均(ms)':>10}{'文件/s':>12}{'次数':>8}")
+    for stage, item in report['stages'].items():
+        per_second = item['count'] / item['total_s'] if item['total_s'] > 0 else float('inf')
+        print(f"  {stage:<12}{item['total_s']:>10.3f}{item['mean_ms']:>10.3f}"
+              f"{per_second:>12.1f}{item['count']:>8}")
+    print(f"  逐阶段串行总耗时: {report['wall_time_s']:.2f}s，"
+          f"{report['objects_per_s'] or 0:.0f} 对象/s")
+    if result.get('end_to_end_s') is not None:
+        print(f"  端到端 run_conversion（{result['workers']} 进程）: {result['end_to_end_s']:.2f}s，"
+              f"{result['images'] / result['end_to_end_s']:.1f} 文件/s")
+
+def run_benchmark(scales, objects_per_image, width, height, with_vis, vis_limit,
+                  end_to_end, workers, seed, bench_root):
+    """执行所有规模的基准测试，返回结果列表"""
+    results = []
+    for num_images in scales:
+        dataset_root = os.path.join(bench_root, f'n{num_images}_m{objects_per_image}_{width}x{height}_s{seed}')
+        image_dir, xml_dir, generate_time = generate_synthetic_dataset(
+            dataset_root, num_images, objects_per_image, width, height, seed, with_vis)
+        configure_converter(image_dir, xml_dir, os.path.join(dataset_root, 'output'), with_vis)
+
+        xml_files = sorted(f for f in os.listdir(xml_dir) if f.endswith('.xml'))
+        profile = benchmark_stages(xml_files, vis_limit)
+        result = {
+            'images': num_images,
+            'objects_per_image': objects_per_image,
+            'image_size': f'{width}x{height}',
+            'generate_s': generate_time,
+            'stages': profile.to_dict(),
+            'workers': workers,
+            'end_to_end_s': benchmark_end_to_end(workers) if end_to_end else None,
+        }
+        print_scale_report(result)
+        results.append(result)
+    return results
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='obb2hbb_converter.py 性能基准测试')
+    parser.add_argument('--scales', type=str, default=DEFAULT_SCALES,
+                        help=f'测试的图像数量，逗号分隔（默认 {DEFAULT_SCALES}）')
+    parser.add_argument('--objects', type=int, default=DEFAULT_OBJECTS,
+                        help=f'每张图像的旋转框数量（默认 {DEFAULT_OBJECTS}）')
+    parser.add_argument('--image-size', type=str, default=DEFAULT_IMAGE_SIZE,
+                        help=f'图像分辨率 宽x高（默认 {DEFAULT_IMAGE_SIZE}）')
+    parser.add_argument('--no-vis', action='store_true',
+                        help='不生成图像，只测试XML相关阶段')
+    parser.add_argument('--vis-limit', type=int, default=DEFAULT_VIS_LIMIT,
+                        help=f'可视化阶段最多测试的文件数（默认 {DEFAULT_VIS_LIMIT}）')
+    parser.add_argument('--end-to-end', action='store_true',
+                        help='额外测量 run_conversion 的端到端耗时')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='端到端测试使用的进程数（默认1）')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED,
+                        help=f'随机种子（默认 {DEFAULT_SEED}）')
+    parser.add_argument('--root', type=str, default=BENCH_ROOT,
+                        help=f'合成数据集目录（默认 {BENCH_ROOT}）')
+    parser.add_argument('--json', type=str, metavar='PATH',
+                        help='将结果写入JSON文件')
+    args = parser.parse_args()
+
+    scales = [int(value) for value in args.scales.split(',') if value.strip()]
+    width, height = (int(value) for value in args.image_size.lower().split('x'))
+
+    print("=" * 60)
+    print("OBB→HBB 转换性能基准测试")
+    print("=" * 60)
+    print(f"规模: {scales}，每图 {args.objects} 个对象，分辨率 {width}x{height}，"
+          f"可视化: {'关闭' if args.no_vis else f'开启（最多 {args.vis_limit} 个文件）'}")
+
+    results = run_benchmark(scales, args.objects, width, height, not args.no_vis, args.vis_limit,
+                            args.end_to_end, args.workers, args.seed, args.root)
+
+    if args.json:
+        report = {
+            'environment': results[0]['stages']['environment'] if results else {},
+            'results': results,
+        }
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入: {args.json}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
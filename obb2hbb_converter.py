@@ -6,10 +6,28 @@
 """
 
 import os
+import io
+import sys
+import zlib
+import json
+import shutil
+import hashlib
+import time
+import heapq
+import platform
+import argparse
+import functools
+import itertools
+import threading
+import contextlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import xml.etree.ElementTree as ET
 import xml.dom.minidom
 import numpy as np
-import cv2
+
+# OpenCV 仅在生成可视化时按需导入（见 _get_cv2），纯XML转换不承担其导入开销
+cv2 = None
 
 # ==================== 配置区域 ====================
 # 输入路径配置
@@ -20,18 +38,357 @@ XML_DIR = r'7_Road_Obb_label'               # 原始旋转框XML文件夹
 OUTPUT_XML_DIR = r'7_Road_Hbb_label'    # 转换后的水平框XML文件夹
 OUTPUT_VIS_DIR = r'Visualization'       # 可视化结果文件夹
 
+# 导出格式配置（一次解析同时输出多种格式）
+EXPORT_FORMATS = ('voc',)               # 可选 'voc'（水平框XML）、'yolo'、'coco'、'dota'（旋转框多边形）
+EXPORT_CLASSES = None                   # 类别列表文件（每行一个类别名，决定YOLO/COCO类别id），None为按首次出现顺序分配
+OUTPUT_YOLO_DIR = r'7_Road_yolo_label'  # YOLO格式txt文件夹（同时写出 classes.txt）
+OUTPUT_DOTA_DIR = r'7_Road_dota_label'  # DOTA格式txt文件夹
+OUTPUT_COCO_PATH = r'7_Road_coco.json'  # COCO格式JSON文件（流式写出，内存占用与标注数量无关）
+
 # ==================== 参数配置 ====================
 # 【重要】调整这个值，使得绿色框尽可能接近目标前景，但不过度裁掉前景
+# 有人工标注的水平框时，可使用 --sweep 模式自动评估候选值
 MAX_SHRINK_RATIO = 0.17
 
+# 按类别(name)单独设置的收缩比例，如 {'car': 0.15, 'truck': 0.2}，未列出的类别使用 MAX_SHRINK_RATIO
+CLASS_SHRINK_RATIOS = {}
+
 # 可视化配置 (BGR格式)
 COLOR_ORIGINAL_BOX = (255, 100, 0)      # 蓝色 - 原始旋转框
 COLOR_CONVERTED_BOX = (0, 255, 0)       # 绿色 - 转换后水平框
 BOX_THICKNESS = 2
 
+# 可视化输出配置（用于快速目视检查，无需全分辨率无损副本）
+VIS_SCALE = 1.0                         # 绘制前的缩放比例，取值(0, 1]，如0.5表示长宽各缩小一半
+VIS_FORMAT = 'png'                      # 输出格式：'png'（保持原文件名）、'jpg' 或 'webp'
+VIS_QUALITY = 90                        # jpg/webp 编码质量（1-100）
+VIS_SAMPLE_RATE = 1.0                   # 可视化抽样比例，取值(0, 1]，按文件名确定性抽样
+VIS_FILE_LIST = None                    # 仅可视化列表中的文件（每行一个图像或XML文件名），None为不限制
+VIS_THREADS = 4                         # 可视化线程数（OpenCV编解码时会释放GIL）
+VIS_QUEUE_SIZE = 64                     # 可视化队列上限，超出时转换阶段等待
+
+# 运行模式配置
+ENABLE_VISUALIZATION = True             # False时只转换XML，且完全不导入OpenCV
+INTERACTIVE = True                      # False时不询问确认、不等待回车（供批处理调度使用）
+
+# 性能分析配置（关闭时几乎没有额外开销）
+PROFILE_ENABLED = False                 # 记录各阶段耗时并在结束时输出汇总
+PROFILE_JSON_PATH = None                # 同时写出JSON报告的路径，便于跨版本/机器比较
+PROFILE_TOP_N = 10                      # 汇总中列出最慢的文件数
+
+# 并行配置
+NUM_WORKERS = 1                         # 并行进程数，1为串行，0为使用全部CPU核心
+RESULT_BATCH_SIZE = 8                   # 每个子进程任务处理的文件数上限
+RESULT_WINDOW_PER_WORKER = 2            # 每个进程的在途任务数，限制主进程中积压的结果数量
+
+# 输出写入配置：输出文件由后台I/O线程写入，计算无需等待（适合NFS等高延迟存储）
+OUTPUT_WRITE_THREADS = 4                # 后台写入线程数，0为在计算线程中同步写入
+OUTPUT_WRITE_QUEUE_SIZE = 256           # 等待写入的文件数上限，超出时计算阶段等待
+
+# 收缩比例扫描配置（--sweep 模式）
+SWEEP_RATIOS = '0:0.5:0.01'             # 候选比例，格式 起始:结束:步长（含结束值）
+SWEEP_MATCH_IOU = 0.3                   # 旋转框外接矩形与参考框的最小匹配IoU
+SWEEP_CROP_TOLERANCE = 1                # 判定"过度裁剪"时允许的像素误差
+SWEEP_MAX_OVERCROP = 0.05               # 选择最佳比例时允许的最大过度裁剪比例
+
+# 标注缓存配置：将解析后的旋转框保存为列式 .npy 文件，之后的扫描/统计直接内存映射读取
+ANNOTATION_CACHE_DIR = None             # 缓存目录，None为不使用缓存
+CACHE_VERIFY = True                     # 逐个比较XML文件的大小和修改时间（就地编辑不会改变目录的修改时间）；
+                                        # False时只检查目录本身，更快但会漏掉就地修改的文件
+
+# 内存转换API配置
+API_PARSE_CACHE_SIZE = 100000           # parse_obb_xml_cached 缓存的文件数（每个数据加载进程独立）
+
+# 增量转换配置
+INCREMENTAL = True                      # 启用增量模式：仅重新处理输入或参数发生变化的文件
+MANIFEST_FILENAME = '.obb2hbb_manifest.json'  # 清单文件名（保存在OUTPUT_XML_DIR中）
+MANIFEST_USE_HASH = False               # True时在大小相同但修改时间变化时比较内容哈希
+MANIFEST_SAVE_INTERVAL = 200            # 每处理多少个文件保存一次清单，便于中断后继续
+
 
 # ====================================================
 
+def _get_cv2():
+    """按需导入OpenCV"""
+    global cv2
+    if cv2 is None:
+        import cv2 as cv2_module
+        cv2 = cv2_module
+    return cv2
+
+# ==================== 阶段计时 ====================
+
+_profile_state = threading.local()
+_NULL_STAGE = contextlib.nullcontext()
+
+class _StageTimer:
+    """阶段计时器：将耗时累加到当前线程的计时字典中"""
+    __slots__ = ('name', 'start')
+    
+    def __init__(self, name):
+        self.name = name
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+    
+    def __exit__(self, *exc_info):
+        timings = getattr(_profile_state, 'timings', None)
+        if timings is None:
+            # 不在_run_with_timings中调用时（如直接调用处理函数），不记录耗时
+            return
+        timings[self.name] = timings.get(self.name, 0.0) + time.perf_counter() - self.start
+
+def _stage(name):
+    """返回阶段计时上下文，未开启性能分析时返回空上下文"""
+    if not PROFILE_ENABLED:
+        return _NULL_STAGE
+    return _StageTimer(name)
+
+def _run_with_timings(func, *args):
+    """执行函数并收集其中各阶段的耗时，返回 (结果, 阶段耗时dict或None)"""
+    if not PROFILE_ENABLED:
+        return func(*args), None
+    _profile_state.timings = {}
+    result = func(*args)
+    return result, _profile_state.timings
+
+def get_peak_rss_mb():
+    """获取本进程及子进程的峰值内存（MB），不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Linux下单位为KB，macOS下为字节
+    unit = 1 if sys.platform == 'darwin' else 1024
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+    return {'self': self_rss / 2 ** 20, 'children_max': children_rss / 2 ** 20}
+
+class PipelineProfile:
+    """汇总转换流程的各阶段耗时、吞吐量、最慢文件和峰值内存"""
+    
+    STAGES = ('parse', 'geometry', 'xml_write', 'decode', 'draw', 'encode', 'vis_write')
+    
+    def __init__(self, top_n=10):
+        self.top_n = top_n
+        self.start_time = time.perf_counter()
+        self.wall_time = None
+        self.stage_totals = {}
+        self.stage_counts = {}
+        self.file_count = 0
+        self.object_count = 0
+        self._slowest = []
+    
+    def add_file(self, xml_file, object_count, *timing_dicts):
+        """记录一个文件的所有阶段耗时（转换与可视化的计时字典）"""
+        file_total = 0.0
+        for timings in timing_dicts:
+            if not timings:
+                continue
+            for stage, elapsed in timings.items():
+                self.stage_totals[stage] = self.stage_totals.get(stage, 0.0) + elapsed
+                self.stage_counts[stage] = self.stage_counts.get(stage, 0) + 1
+                file_total += elapsed
+        self.file_count += 1
+        self.object_count += object_count
+        
+        entry = (file_total, xml_file, object_count)
+        if len(self._slowest) < self.top_n:
+            heapq.heappush(self._slowest, entry)
+        elif self.top_n:
+            heapq.heappushpop(self._slowest, entry)
+    
+    def finish(self):
+        """结束计时"""
+        self.wall_time = time.perf_counter() - self.start_time
+    
+    def to_dict(self):
+        """生成JSON报告内容"""
+        wall_time = self.wall_time or (time.perf_counter() - self.start_time)
+        stages = {}
+        for stage in self.STAGES + tuple(sorted(set(self.stage_totals) - set(self.STAGES))):
+            if stage not in self.stage_totals:
+                continue
+            total = self.stage_totals[stage]
+            count = self.stage_counts[stage]
+            stages[stage] = {'total_s': total, 'count': count, 'mean_ms': total / count * 1000}
+        return {
+            'wall_time_s': wall_time,
+            'files': self.file_count,
+            'objects': self.object_count,
+            'files_per_s': self.file_count / wall_time if wall_time > 0 else None,
+            'objects_per_s': self.object_count / wall_time if wall_time > 0 else None,
+            'stages': stages,
+            'slowest_files': [{'file': name, 'time_s': total, 'objects': objects}
+                              for total, name, objects in sorted(self._slowest, reverse=True)],
+            'peak_rss_mb': get_peak_rss_mb(),
+            'config': {
+                'workers': resolve_worker_count(),
+                'vis_threads': VIS_THREADS,
+                'enable_visualization': ENABLE_VISUALIZATION,
+                'vis_format': VIS_FORMAT,
+                'vis_scale': VIS_SCALE,
+            },
+            'environment': {
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+            },
+        }
+    
+    def print_summary(self):
+        """打印性能汇总"""
+        report = self.to_dict()
+        stage_sum = sum(item['total_s'] for item in report['stages'].values()) or 1.0
+        
+        print("\n" + "-" * 60)
+        print("性能分析")
+        print("-" * 60)
+        print(f"总耗时: {report['wall_time_s']:.2f}s，"
+              f"{report['files_per_s'] or 0:.1f} 文件/s，{report['objects_per_s'] or 0:.1f} 对象/s")
+        print(f"{'阶段':<12}{'累计(s)':>10}{'占比':>8}{'平均(ms)':>10}{'次数':>8}")
+        for stage, item in report['stages'].items():
+            print(f"{stage:<12}{item['total_s']:>10.3f}{item['total_s'] / stage_sum:>8.1%}"
+                  f"{item['mean_ms']:>10.2f}{item['count']:>8}")
+        print("（并行时各阶段为所有进程/线程的累计耗时，可能超过总耗时）")
+        
+        if report['slowest_files']:
+            print(f"最慢的 {len(report['slowest_files'])} 个文件:")
+            for item in report['slowest_files']:
+                print(f"  - {item['file']}: {item['time_s'] * 1000:.1f} ms（{item['objects']} 个对象）")
+        
+        peak_rss = report['peak_rss_mb']
+        if peak_rss:
+            print(f"峰值内存: 主进程 {peak_rss['self']:.1f} MB，子进程最大 {peak_rss['children_max']:.1f} MB")
+    
+    def write_json(self, path):
+        """写出JSON报告"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+# ==================== 输出写入 ====================
+
+_output_state = threading.local()
+_output_writer = None
+
+def encode_text_output(text):
+    """将文本编码为字节，换行符与以文本模式 open(path, 'w') 写出时一致"""
+    if os.linesep != '\n':
+        text = text.replace('\n', os.linesep)
+    return text.encode('utf-8')
+
+def atomic_write_bytes(path, data):
+    """先写入同目录下的临时文件再重命名，中断时不会留下不完整的输出文件"""
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+class WriteBehindQueue:
+    """
+    后台写入队列
+    
+    计算线程提交 (路径, 字节) 后立即返回，由少量I/O线程原子地写入；
+    等待写入的文件数达到上限时提交会阻塞，内存占用有界
+    """
+    
+    def __init__(self, threads=4, queue_size=256):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, threads))
+        self._slots = threading.BoundedSemaphore(max(1, queue_size))
+        self._idle = threading.Condition()
+        self._pending_count = 0
+        self.failed = {}
+        self.file_count = 0
+        self.byte_count = 0
+        self.write_time = 0.0
+        self.wait_time = 0.0
+    
+    def submit(self, path, data):
+        """提交一个待写入的文件，队列已满时等待"""
+        start_time = time.perf_counter()
+        self._slots.acquire()
+        with self._idle:
+            self.wait_time += time.perf_counter() - start_time
+            self._pending_count += 1
+        self._executor.submit(self._write, path, data)
+    
+    def _write(self, path, data):
+        start_time = time.perf_counter()
+        error = None
+        try:
+            atomic_write_bytes(path, data)
+        except Exception as e:
+            error = str(e)
+        finally:
+            self._slots.release()
+            with self._idle:
+                if error is None:
+                    self.file_count += 1
+                    self.byte_count += len(data)
+                else:
+                    self.failed[path] = error
+                self.write_time += time.perf_counter() - start_time
+                self._pending_count -= 1
+                if self._pending_count == 0:
+                    self._idle.notify_all()
+    
+    def flush(self):
+        """等待所有已提交的文件写入完成"""
+        with self._idle:
+            self._idle.wait_for(lambda: self._pending_count == 0)
+    
+    def close(self):
+        """写完剩余文件并关闭I/O线程"""
+        self.flush()
+        self._executor.shutdown(wait=True)
+    
+    def print_summary(self):
+        """打印写入统计"""
+        print(f"后台写入: {self.file_count} 个文件，{self.byte_count / 2 ** 20:.1f} MB，"
+              f"I/O线程累计 {self.write_time:.2f}s，计算阶段等待 {self.wait_time:.2f}s")
+        if self.failed:
+            print(f"[错误] {len(self.failed)} 个文件写入失败:")
+            for path, error in list(self.failed.items())[:10]:
+                print(f"  - {path}: {error}")
+
+def write_output_file(path, data):
+    """
+    写出一个输出文件
+    
+    在 collect_output_files 中调用时只收集不写入（由主进程统一提交），
+    存在后台写入队列时异步写入，否则同步原子写入
+    """
+    collector = getattr(_output_state, 'collector', None)
+    if collector is not None:
+        collector.append((path, data))
+    elif _output_writer is not None:
+        _output_writer.submit(path, data)
+    else:
+        atomic_write_bytes(path, data)
+
+@contextlib.contextmanager
+def collect_output_files():
+    """收集当前线程写出的文件，子进程借此把输出交回主进程的写入队列"""
+    outputs = []
+    _output_state.collector = outputs
+    try:
+        yield outputs
+    finally:
+        _output_state.collector = None
+
+# ====================================================
+
+def _pause(message="按回车键退出..."):
+    """交互模式下等待用户按回车"""
+    if INTERACTIVE:
+        input(message)
+
 def print_banner():
     """打印横幅"""
     print("=" * 60)
@@ -41,16 +398,19 @@ def print_banner():
 def ensure_directories():
     """确保输出目录存在"""
     os.makedirs(OUTPUT_XML_DIR, exist_ok=True)
-    os.makedirs(OUTPUT_VIS_DIR, exist_ok=True)
     print(f"输出目录已准备：")
     print(f"  - XML输出: {OUTPUT_XML_DIR}")
-    print(f"  - 可视化输出: {OUTPUT_VIS_DIR}")
+    if ENABLE_VISUALIZATION:
+        os.makedirs(OUTPUT_VIS_DIR, exist_ok=True)
+        print(f"  - 可视化输出: {OUTPUT_VIS_DIR}")
 
 def check_paths():
-    """检查必要的路径是否存在"""
+    """检查必要的路径是否存在（关闭可视化时不要求图像目录）"""
     print("检查输入路径...")
     
-    if not os.path.exists(IMAGE_DIR):
+    if not ENABLE_VISUALIZATION:
+        print("ℹ️  已关闭可视化，跳过图像目录检查")
+    elif not os.path.exists(IMAGE_DIR):
         print(f"❌ 图像目录不存在: {IMAGE_DIR}")
         return False
     else:
@@ -104,6 +464,95 @@ def calculate_heuristic_shrink_bbox(corners, angle_rad):
     
     return int(x_min_tight), int(y_min_tight), int(x_max_tight), int(y_max_tight)
 
+def convert_robndbox_batch_to_corners(params):
+    """
+    批量将旋转框参数转换为角点坐标
+
+    Args:
+        params: 形状为 (N, 5) 的数组，每行为 cx, cy, w, h, angle
+
+    Returns:
+        np.ndarray: 形状为 (N, 4, 2) 的角点数组，结果与 convert_robndbox_to_corners 逐位一致
+    """
+    params = np.asarray(params, dtype=np.float64).reshape(-1, 5)
+    cx, cy, w_rot, h_rot, angle_rad = params.T
+
+    half_w = w_rot / 2
+    half_h = h_rot / 2
+    corners = np.empty((len(params), 4, 2), dtype=np.float64)
+    corners[:, 0, 0] = -half_w
+    corners[:, 0, 1] = -half_h
+    corners[:, 1, 0] = half_w
+    corners[:, 1, 1] = -half_h
+    corners[:, 2, 0] = half_w
+    corners[:, 2, 1] = half_h
+    corners[:, 3, 0] = -half_w
+    corners[:, 3, 1] = half_h
+
+    cos_a = np.cos(angle_rad)
+    sin_a = np.sin(angle_rad)
+    rotation_matrices = np.empty((len(params), 2, 2), dtype=np.float64)
+    rotation_matrices[:, 0, 0] = cos_a
+    rotation_matrices[:, 0, 1] = -sin_a
+    rotation_matrices[:, 1, 0] = sin_a
+    rotation_matrices[:, 1, 1] = cos_a
+
+    # 与单对象版本的 corners.dot(R.T) 使用相同的矩阵乘法路径，保证逐位一致
+    rotated_corners = np.matmul(corners, rotation_matrices.transpose(0, 2, 1))
+    rotated_corners += np.stack([cx, cy], axis=1)[:, np.newaxis, :]
+    return rotated_corners
+
+def calculate_heuristic_shrink_bbox_batch(corners, angles, shrink_ratio=None):
+    """
+    批量计算启发式收缩的水平边界框
+
+    Args:
+        corners: 形状为 (N, 4, 2) 的角点数组
+        angles: 形状为 (N,) 的旋转角度（弧度）
+        shrink_ratio: 最大收缩比例，默认使用 MAX_SHRINK_RATIO；
+            也可以是形状为 (N,) 的逐对象比例，或形状为 (R, 1) 的多个候选比例
+
+    Returns:
+        np.ndarray: 形状为 (N, 4) 的整数数组，每行为 xmin, ymin, xmax, ymax；
+            shrink_ratio 为 (R, 1) 时形状为 (R, N, 4)
+    """
+    if shrink_ratio is None:
+        shrink_ratio = MAX_SHRINK_RATIO
+
+    corners = np.asarray(corners, dtype=np.float64).reshape(-1, 4, 2)
+    angles = np.asarray(angles, dtype=np.float64).reshape(-1)
+
+    mins = np.min(corners, axis=1)
+    maxs = np.max(corners, axis=1)
+    size_enclosing = maxs - mins
+
+    # 根据旋转角度计算收缩因子
+    shrink_factor = np.asarray(shrink_ratio, dtype=np.float64) * np.abs(np.sin(2 * angles))
+    total_shrink = size_enclosing * shrink_factor[..., np.newaxis]
+
+    tight_mins = mins + total_shrink / 2
+    tight_maxs = maxs - total_shrink / 2
+
+    # int() 向零截断，这里用 trunc 保持一致
+    boxes = np.concatenate([tight_mins, tight_maxs], axis=-1)
+    return np.trunc(boxes).astype(np.int64)
+
+def convert_obb_batch(params, shrink_ratio=None):
+    """
+    批量几何引擎：一次性计算整个文件或整个数据集的角点与收缩后的水平框
+
+    Args:
+        params: 形状为 (N, 5) 的数组，每行为 cx, cy, w, h, angle
+        shrink_ratio: 最大收缩比例，默认使用 MAX_SHRINK_RATIO
+
+    Returns:
+        tuple: (corners (N, 4, 2), boxes (N, 4))
+    """
+    params = np.asarray(params, dtype=np.float64).reshape(-1, 5)
+    corners = convert_robndbox_batch_to_corners(params)
+    boxes = calculate_heuristic_shrink_bbox_batch(corners, params[:, 4], shrink_ratio)
+    return corners, boxes
+
 def parse_robndbox(robndbox_element):
     """解析robndbox元素，返回参数"""
     try:
@@ -125,25 +574,142 @@ def create_bndbox_element(parent, xmin, ymin, xmax, ymax):
     ET.SubElement(bndbox, 'ymax').text = str(ymax)
     return bndbox
 
+def _escape_xml(data):
+    """转义XML特殊字符（与minidom的输出保持一致）"""
+    return (data.replace('&', '&amp;').replace('<', '&lt;')
+            .replace('"', '&quot;').replace('>', '&gt;'))
+
+def _iter_pretty_xml_chunks(element, indent='', add_indent='  '):
+    """
+    递归遍历元素树，产出格式化后的XML片段
+    
+    片段中可能包含换行符，由调用方负责拆行并去除空行。
+    布局与 ET.tostring -> minidom.toprettyxml(indent='  ') 完全相同：
+    - 无子元素且有文本：<tag>文本</tag> 写在同一行
+    - 无子元素且无文本：<tag/>
+    - 有子元素：开始标签、子元素（缩进两格）、结束标签各占一行
+    """
+    tag = element.tag
+    attrs = ''.join(f' {name}="{_escape_xml(value)}"' for name, value in element.items())
+    children = list(element)
+    
+    if not children:
+        if element.text:
+            yield f'{indent}<{tag}{attrs}>{_escape_xml(element.text)}</{tag}>'
+        else:
+            yield f'{indent}<{tag}{attrs}/>'
+        return
+    
+    child_indent = indent + add_indent
+    yield f'{indent}<{tag}{attrs}>'
+    if element.text:
+        yield child_indent + _escape_xml(element.text)
+    for child in children:
+        yield from _iter_pretty_xml_chunks(child, child_indent, add_indent)
+        if child.tail:
+            yield child_indent + _escape_xml(child.tail)
+    yield f'{indent}</{tag}>'
+
+def _needs_minidom_serializer(root):
+    """
+    元素树中是否含有单次遍历写出器无法按原样输出的内容：
+    命名空间（{uri}tag 需生成 ns0: 前缀）、注释/处理指令、
+    文本中的回车符和属性值中的换行/制表符（需按XML规范化规则处理）
+    """
+    for element in root.iter():
+        tag = element.tag
+        if not isinstance(tag, str) or tag.startswith('{'):
+            return True
+        for text in (element.text, element.tail):
+            if text and '\r' in text:
+                return True
+        for name, value in element.items():
+            if name.startswith('{') or any(char in value for char in '\r\n\t'):
+                return True
+    return False
 
+def _serialize_pretty_xml_minidom(root):
+    """原有的 ET.tostring -> minidom.toprettyxml 格式化方式"""
+    dom = xml.dom.minidom.parseString(ET.tostring(root, encoding='unicode'))
+    lines = [line for line in dom.toprettyxml(indent='  ', encoding=None).split('\n') if line.strip()]
+    # 替换minidom的XML声明
+    return encode_text_output('<?xml version="1.0" encoding="utf-8"?>\n' + '\n'.join(lines[1:]))
+
+def serialize_pretty_xml(root):
+    """
+    将元素树格式化为XML文件内容
+    
+    单次遍历元素树，不再经过 ET.tostring -> minidom 解析 -> toprettyxml 的往返，
+    输出为PASCAL VOC布局（两格缩进、无空行），首行为 utf-8 的XML声明。
+    含命名空间等少见内容时改用原有的 minidom 方式，输出保持一致。
+    
+    Args:
+        root (Element): 根元素
+    
+    Returns:
+        bytes: 文件内容
+    """
+    if _needs_minidom_serializer(root):
+        return _serialize_pretty_xml_minidom(root)
+    
+    parts = ['<?xml version="1.0" encoding="utf-8"?>']
+    for chunk in _iter_pretty_xml_chunks(root):
+        for line in chunk.split('\n'):
+            # 移除空行（原始缩进产生的空白文本）
+            if line.strip():
+                parts.append(line)
+    return encode_text_output('\n'.join(parts))
+
+def write_pretty_xml(root, output_path):
+    """将元素树格式化后写出（见 write_output_file）"""
+    write_output_file(output_path, serialize_pretty_xml(root))
+
+def _read_image_size(root):
+    """读取 <size> 中的图像宽高，缺失或无效时返回None"""
+    try:
+        width = int(float(root.findtext('size/width')))
+        height = int(float(root.findtext('size/height')))
+    except (TypeError, ValueError):
+        return None
+    if width <= 0 or height <= 0:
+        return None
+    return width, height
 
 def process_single_xml_file(xml_filename):
     """处理单个XML文件"""
+    image_basename, conversion_info, _ = convert_xml_file(xml_filename)
+    return image_basename, conversion_info
+
+def convert_xml_file(xml_filename, write_xml=None):
+    """
+    转换单个XML文件
+    
+    Args:
+        xml_filename (str): XML_DIR 中的文件名
+        write_xml (bool, optional): 是否写出VOC格式XML，默认取决于 EXPORT_FORMATS 是否包含 'voc'
+    
+    Returns:
+        tuple: (image_basename, conversion_info, image_size)，失败时均为None
+    """
+    if write_xml is None:
+        write_xml = 'voc' in EXPORT_FORMATS
     input_xml_path = os.path.join(XML_DIR, xml_filename)
     output_xml_path = os.path.join(OUTPUT_XML_DIR, xml_filename)
     
     try:
         # 解析XML文件
-        tree = ET.parse(input_xml_path)
-        root = tree.getroot()
+        with _stage('parse'):
+            tree = ET.parse(input_xml_path)
+            root = tree.getroot()
         
         # 获取图片路径
         path_element = root.find('path')
         if path_element is None or path_element.text is None:
             print(f"[错误] XML文件 {xml_filename} 中缺少 <path> 标签，已跳过")
-            return None, None
+            return None, None, None
         
         image_basename = os.path.basename(path_element.text)
+        image_size = _read_image_size(root)
         
         # 存储转换信息用于可视化
         conversion_info = []
@@ -163,119 +729,1148 @@ def process_single_xml_file(xml_filename):
                 new_path = f"C:\\Users\\18755\\Desktop\\test\\{filename}"
                 path_element.text = new_path
         
-        # 处理每个object
-        for obj in root.findall('object'):
-            robndbox = obj.find('robndbox')
-            type_element = obj.find('type')
-            
-            if robndbox is not None:
-                # 解析旋转框参数
-                params = parse_robndbox(robndbox)
-                if params is None:
-                    print(f"  [警告] 在 {xml_filename} 中发现无效的 robndbox，已跳过")
-                    continue
-                
-                cx, cy, w_rot, h_rot, angle_rad = params
-                
-                # 计算旋转框的四个角点
-                corners = convert_robndbox_to_corners(cx, cy, w_rot, h_rot, angle_rad)
-                
-                # 计算水平框
-                xmin, ymin, xmax, ymax = calculate_heuristic_shrink_bbox(corners, angle_rad)
+        with _stage('geometry'):
+            # 处理每个object：先收集所有有效的旋转框，再批量计算
+            pending_objects = []
+            for obj in root.findall('object'):
+                robndbox = obj.find('robndbox')
                 
-                # 存储转换信息
-                conversion_info.append({
-                    'original_corners': corners,
-                    'horizontal_box': (xmin, ymin, xmax, ymax),
-                    'center': (cx, cy),
-                    'size': (w_rot, h_rot),
-                    'angle': angle_rad
-                })
+                if robndbox is not None:
+                    # 解析旋转框参数
+                    params = parse_robndbox(robndbox)
+                    if params is None:
+                        print(f"  [警告] 在 {xml_filename} 中发现无效的 robndbox，已跳过")
+                        continue
+                    pending_objects.append((obj, robndbox, params))
+            
+            if pending_objects:
+                params_array = np.array([params for _, _, params in pending_objects], dtype=np.float64)
+                shrink_ratio = None
+                if CLASS_SHRINK_RATIOS:
+                    shrink_ratio = np.array([CLASS_SHRINK_RATIOS.get(obj.findtext('name'), MAX_SHRINK_RATIO)
+                                             for obj, _, _ in pending_objects], dtype=np.float64)
                 
-                # 更新type元素
-                if type_element is not None:
-                    type_element.text = 'bndbox'
+                # 批量计算旋转框的四个角点及水平框
+                all_corners, all_boxes = convert_obb_batch(params_array, shrink_ratio)
+                all_boxes = all_boxes.tolist()
                 
-                # 移除原始的robndbox，添加新的bndbox
-                obj.remove(robndbox)
-                create_bndbox_element(obj, xmin, ymin, xmax, ymax)
-                converted_objects += 1
+                for (obj, robndbox, params), corners, box in zip(pending_objects, all_corners, all_boxes):
+                    cx, cy, w_rot, h_rot, angle_rad = params
+                    xmin, ymin, xmax, ymax = box
+                    
+                    # 存储转换信息
+                    conversion_info.append({
+                        'original_corners': corners,
+                        'horizontal_box': (xmin, ymin, xmax, ymax),
+                        'center': (cx, cy),
+                        'size': (w_rot, h_rot),
+                        'angle': angle_rad,
+                        'name': obj.findtext('name') or '',
+                        'difficult': (obj.findtext('difficult') or '0').strip() == '1'
+                    })
+                    
+                    # 更新type元素
+                    type_element = obj.find('type')
+                    if type_element is not None:
+                        type_element.text = 'bndbox'
+                    
+                    # 移除原始的robndbox，添加新的bndbox
+                    obj.remove(robndbox)
+                    create_bndbox_element(obj, xmin, ymin, xmax, ymax)
+                    converted_objects += 1
+        
+        # 保存转换后的XML（带格式化，单次遍历直接写入文件）
+        if write_xml:
+            with _stage('xml_write'):
+                write_pretty_xml(root, output_xml_path)
         
-        # 保存转换后的XML（带格式化）
-        # 先转换为字符串
-        xml_string = ET.tostring(root, encoding='unicode')
+        return image_basename, conversion_info, image_size
         
-        # 使用minidom美化格式
-        dom = xml.dom.minidom.parseString(xml_string)
-        pretty_xml = dom.toprettyxml(indent='  ', encoding=None)
+    except Exception as e:
+        print(f"[错误] 处理 {xml_filename} 失败: {e}")
+        return None, None, None
+
+_VIS_EXTENSIONS = {'png': '.png', 'jpg': '.jpg', 'webp': '.webp'}
+
+def _get_vis_encode_params():
+    """获取可视化图像的编码参数"""
+    cv2 = _get_cv2()
+    if VIS_FORMAT == 'jpg':
+        return [cv2.IMWRITE_JPEG_QUALITY, int(VIS_QUALITY)]
+    if VIS_FORMAT == 'webp':
+        return [cv2.IMWRITE_WEBP_QUALITY, int(VIS_QUALITY)]
+    return []
+
+def _load_vis_image(image_path, scale):
+    """
+    加载用于可视化的图像
+    
+    缩放比例不超过1/2时优先使用OpenCV的降采样解码（IMREAD_REDUCED_*），避免全分辨率解码
+    """
+    cv2 = _get_cv2()
+    
+    # 使用cv2.imdecode处理中文路径
+    image_data = np.fromfile(image_path, dtype=np.uint8)
+    
+    decode_flag, reduce_factor = cv2.IMREAD_COLOR, 1
+    if scale < 1.0:
+        for factor, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8),
+                             (4, cv2.IMREAD_REDUCED_COLOR_4),
+                             (2, cv2.IMREAD_REDUCED_COLOR_2)):
+            if scale * factor <= 1.0:
+                decode_flag, reduce_factor = flag, factor
+                break
+    
+    image = cv2.imdecode(image_data, decode_flag)
+    if image is None or scale >= 1.0:
+        return image
+    
+    height, width = image.shape[:2]
+    target_size = (max(1, round(width * reduce_factor * scale)),
+                   max(1, round(height * reduce_factor * scale)))
+    if target_size != (width, height):
+        image = cv2.resize(image, target_size, interpolation=cv2.INTER_AREA)
+    return image
+
+def render_visualization(image_basename, conversion_info):
+    """
+    绘制并保存可视化图像，不直接打印，便于在线程池中运行
+    
+    Returns:
+        tuple: (是否成功, 警告信息或None)
+    """
+    try:
+        cv2 = _get_cv2()
         
-        # 移除空行
-        lines = [line for line in pretty_xml.split('\n') if line.strip()]
-        formatted_xml = '\n'.join(lines)
+        # 加载图像
+        image_path = os.path.join(IMAGE_DIR, image_basename)
+        scale = VIS_SCALE
+        with _stage('decode'):
+            image = _load_vis_image(image_path, scale)
         
-        # 写入文件
-        with open(output_xml_path, 'w', encoding='utf-8') as f:
-            f.write('<?xml version="1.0" encoding="utf-8"?>\n')
-            # 跳过第一行（XML声明）
-            content_lines = formatted_xml.split('\n')[1:]
-            f.write('\n'.join(content_lines))
+        if image is None:
+            return False, f"  [警告] 无法加载图像: {image_basename}"
         
-        return image_basename, conversion_info
+        with _stage('draw'):
+            # 绘制转换结果
+            for info in conversion_info:
+                # 绘制原始旋转框（蓝色）
+                original_corners = info['original_corners']
+                if scale != 1.0:
+                    original_corners = original_corners * scale
+                cv2.polylines(image, [original_corners.astype(np.int32)], True,
+                              COLOR_ORIGINAL_BOX, BOX_THICKNESS, cv2.LINE_AA)
+                
+                # 绘制转换后的水平框（绿色）
+                xmin, ymin, xmax, ymax = info['horizontal_box']
+                if scale != 1.0:
+                    xmin, ymin, xmax, ymax = (int(v * scale) for v in (xmin, ymin, xmax, ymax))
+                cv2.rectangle(image, (xmin, ymin), (xmax, ymax), COLOR_CONVERTED_BOX, BOX_THICKNESS)
+        
+        # 保存可视化结果
+        output_vis_path = os.path.join(OUTPUT_VIS_DIR, get_vis_output_name(image_basename))
+        
+        # 使用cv2.imencode处理中文路径
+        with _stage('encode'):
+            success, encoded_img = cv2.imencode(_VIS_EXTENSIONS[VIS_FORMAT], image, _get_vis_encode_params())
+        if not success:
+            return False, None
+        with _stage('vis_write'):
+            write_output_file(output_vis_path, encoded_img.tobytes())
+        return True, None
         
     except Exception as e:
-        print(f"[错误] 处理 {xml_filename} 失败: {e}")
-        return None, None
+        return False, f"  [警告] 创建可视化失败 {image_basename}: {e}"
 
 def create_visualization(image_basename, conversion_info, enable_vis=True):
     """创建可视化图像"""
     if not enable_vis or not conversion_info:
         return False
     
-    try:
-        # 加载图像
-        image_path = os.path.join(IMAGE_DIR, image_basename)
+    success, warning = render_visualization(image_basename, conversion_info)
+    if warning:
+        print(warning)
+    return success
+
+def load_vis_file_list(list_path):
+    """读取可视化文件列表，返回文件名（不含扩展名）集合"""
+    with open(list_path, 'r', encoding='utf-8') as f:
+        return {os.path.splitext(os.path.basename(line.strip()))[0] for line in f if line.strip()}
+
+def should_visualize(xml_file, image_basename, vis_file_set=None):
+    """
+    判断文件是否需要生成可视化
+    
+    指定文件列表时仅渲染列表中的文件；否则按 VIS_SAMPLE_RATE 根据文件名哈希抽样，
+    抽样结果与处理顺序和进程数无关，多次运行保持一致
+    """
+    if not ENABLE_VISUALIZATION:
+        return False
+    if vis_file_set is not None:
+        return (os.path.splitext(xml_file)[0] in vis_file_set
+                or os.path.splitext(image_basename)[0] in vis_file_set)
+    if VIS_SAMPLE_RATE >= 1.0:
+        return True
+    return zlib.crc32(xml_file.encode('utf-8')) < VIS_SAMPLE_RATE * 2 ** 32
+
+# 需要同步到子进程的配置项（Windows下子进程会重新导入模块，命令行覆盖的值需要显式传递）
+_WORKER_CONFIG_KEYS = (
+    'IMAGE_DIR', 'XML_DIR', 'OUTPUT_XML_DIR', 'OUTPUT_VIS_DIR', 'ENABLE_VISUALIZATION', 'EXPORT_FORMATS',
+    'PROFILE_ENABLED', 'MAX_SHRINK_RATIO', 'CLASS_SHRINK_RATIOS', 'COLOR_ORIGINAL_BOX', 'COLOR_CONVERTED_BOX', 'BOX_THICKNESS',
+)
+
+def _get_worker_config():
+    """收集需要传递给子进程的配置"""
+    return {key: globals()[key] for key in _WORKER_CONFIG_KEYS}
+
+def _init_worker(config):
+    """子进程初始化：应用主进程的配置"""
+    globals().update(config)
+
+def _capture_output(func, *args):
+    """执行函数并捕获其输出，返回 (结果, 输出文本)"""
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        result = func(*args)
+    return result, buffer.getvalue()
+
+def get_vis_output_name(image_basename):
+    """获取可视化结果的文件名（png格式保持原文件名，其他格式替换扩展名）"""
+    if VIS_FORMAT == 'png':
+        return f"vis_{image_basename}"
+    return f"vis_{os.path.splitext(image_basename)[0]}{_VIS_EXTENSIONS[VIS_FORMAT]}"
+
+# ==================== 多格式导出 ====================
+
+EXPORT_FORMAT_CHOICES = ('voc', 'yolo', 'coco', 'dota')
+
+def format_yolo_lines(boxes, class_ids, image_size):
+    """
+    生成YOLO格式标注行：class cx cy w h（相对图像宽高归一化）
+    
+    Args:
+        boxes: 水平框序列，每个为 (xmin, ymin, xmax, ymax)
+        class_ids: 类别id序列
+        image_size: (宽, 高)
+    """
+    width, height = image_size
+    lines = []
+    for (xmin, ymin, xmax, ymax), class_id in zip(boxes, class_ids):
+        lines.append(f"{class_id} {(xmin + xmax) / 2 / width:.6f} {(ymin + ymax) / 2 / height:.6f} "
+                     f"{(xmax - xmin) / width:.6f} {(ymax - ymin) / height:.6f}")
+    return lines
+
+def format_dota_lines(conversion_info):
+    """生成DOTA格式标注行：x1 y1 x2 y2 x3 y3 x4 y4 类别名 difficult（原始旋转框的四个角点）"""
+    lines = []
+    for info in conversion_info:
+        points = ' '.join(f"{value:.1f}" for value in info['original_corners'].reshape(-1))
+        lines.append(f"{points} {info['name']} {int(info['difficult'])}")
+    return lines
+
+def _write_text_lines(path, lines):
+    """写出文本行（空列表写出空文件，表示该图像没有目标）"""
+    write_output_file(path, encode_text_output(''.join(f"{line}\n" for line in lines)))
+
+def load_class_names(path):
+    """读取类别列表文件（每行一个类别名）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+class CocoStreamWriter:
+    """
+    流式写出COCO格式JSON
+    
+    标注逐条写入主文件，图像记录先写入旁路临时文件，结束时拼接并写入类别，
+    因此内存占用与标注数量无关；写完后原子地重命名为目标文件
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._temp_path = path + '.tmp'
+        self._images_temp_path = path + '.images.tmp'
+        self._file = open(self._temp_path, 'w', encoding='utf-8')
+        self._images_file = open(self._images_temp_path, 'w+', encoding='utf-8')
+        self._file.write('{"annotations":[')
+        self.image_count = 0
+        self.annotation_count = 0
+    
+    def add_image(self, file_name, image_size, boxes, category_ids, polygons):
+        """添加一张图像及其所有标注（boxes 为 (xmin, ymin, xmax, ymax)，polygons 为角点数组）"""
+        self.image_count += 1
+        image_id = self.image_count
+        width, height = image_size or (0, 0)
+        if image_id > 1:
+            self._images_file.write(',')
+        self._images_file.write(json.dumps(
+            {'id': image_id, 'file_name': file_name, 'width': width, 'height': height},
+            ensure_ascii=False, separators=(',', ':')))
+        
+        for (xmin, ymin, xmax, ymax), category_id, polygon in zip(boxes, category_ids, polygons):
+            self.annotation_count += 1
+            box_width, box_height = xmax - xmin, ymax - ymin
+            annotation = {
+                'id': self.annotation_count,
+                'image_id': image_id,
+                'category_id': category_id,
+                'bbox': [xmin, ymin, box_width, box_height],
+                'area': box_width * box_height,
+                'iscrowd': 0,
+                'segmentation': [[round(float(value), 2) for value in polygon.reshape(-1)]],
+            }
+            if self.annotation_count > 1:
+                self._file.write(',')
+            self._file.write(json.dumps(annotation, separators=(',', ':')))
+    
+    def close(self, categories):
+        """写入图像列表和类别，完成JSON文件"""
+        self._file.write('],"images":[')
+        self._images_file.seek(0)
+        shutil.copyfileobj(self._images_file, self._file)
+        self._file.write('],"categories":')
+        self._file.write(json.dumps(categories, ensure_ascii=False, separators=(',', ':')))
+        self._file.write('}')
+        self._file.close()
+        self._images_file.close()
+        os.remove(self._images_temp_path)
+        os.replace(self._temp_path, self.path)
+    
+    def abort(self):
+        """放弃未完成的导出：删除临时文件，保留上次运行生成的完整文件"""
+        self._file.close()
+        self._images_file.close()
+        for path in (self._temp_path, self._images_temp_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+class DatasetExporter:
+    """
+    在转换主流程中逐个文件输出YOLO、COCO、DOTA格式（VOC XML由 convert_xml_file 直接写出）
+    
+    类别id来自 EXPORT_CLASSES 文件；未指定时沿用YOLO目录中已有的 classes.txt，
+    新类别按首次出现顺序追加，保证增量运行时id稳定
+    """
+    
+    def __init__(self, formats, class_names=None):
+        self.formats = set(formats) - {'voc'}
+        self.fixed_classes = class_names is not None
+        self.class_names = []
+        self.class_lookup = {}
+        self.unknown_class_count = 0
+        self.coco_writer = None
+        self.initial_class_count = 0
         
-        # 使用cv2.imdecode处理中文路径
-        image_data = np.fromfile(image_path, dtype=np.uint8)
-        image = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
+        if 'yolo' in self.formats:
+            os.makedirs(OUTPUT_YOLO_DIR, exist_ok=True)
+            classes_path = os.path.join(OUTPUT_YOLO_DIR, 'classes.txt')
+            if class_names is None and os.path.exists(classes_path):
+                class_names = load_class_names(classes_path)
+        for name in class_names or ():
+            if name not in self.class_lookup:
+                self.class_lookup[name] = len(self.class_names)
+                self.class_names.append(name)
+        self.initial_class_count = len(self.class_names)
+        if 'dota' in self.formats:
+            os.makedirs(OUTPUT_DOTA_DIR, exist_ok=True)
+        if 'coco' in self.formats:
+            coco_dir = os.path.dirname(OUTPUT_COCO_PATH)
+            if coco_dir:
+                os.makedirs(coco_dir, exist_ok=True)
+            self.coco_writer = CocoStreamWriter(OUTPUT_COCO_PATH)
+    
+    def get_class_id(self, name):
+        """获取类别id，固定类别列表中不存在的类别返回None"""
+        class_id = self.class_lookup.get(name)
+        if class_id is None and not self.fixed_classes:
+            class_id = len(self.class_names)
+            self.class_lookup[name] = class_id
+            self.class_names.append(name)
+        return class_id
+    
+    def add(self, xml_file, image_basename, image_size, conversion_info):
+        """
+        导出单个文件的转换结果
         
-        if image is None:
-            print(f"  [警告] 无法加载图像: {image_basename}")
-            return False
+        Returns:
+            str or None: 警告信息
+        """
+        stem = os.path.splitext(xml_file)[0]
+        warning = None
         
-        # 绘制转换结果
+        boxes, class_ids, polygons = [], [], []
         for info in conversion_info:
-            # 绘制原始旋转框（蓝色）
-            original_corners = info['original_corners'].astype(np.int32)
-            cv2.polylines(image, [original_corners], True, COLOR_ORIGINAL_BOX, BOX_THICKNESS, cv2.LINE_AA)
+            class_id = self.get_class_id(info['name'])
+            if class_id is None:
+                self.unknown_class_count += 1
+                continue
+            boxes.append(info['horizontal_box'])
+            class_ids.append(class_id)
+            polygons.append(info['original_corners'])
+        
+        if 'yolo' in self.formats:
+            if image_size is None:
+                warning = f"  [警告] {xml_file} 缺少有效的 <size>，无法生成YOLO标注"
+            else:
+                _write_text_lines(os.path.join(OUTPUT_YOLO_DIR, f"{stem}.txt"),
+                                  format_yolo_lines(boxes, class_ids, image_size))
+        if 'dota' in self.formats:
+            _write_text_lines(os.path.join(OUTPUT_DOTA_DIR, f"{stem}.txt"), format_dota_lines(conversion_info))
+        if self.coco_writer is not None:
+            self.coco_writer.add_image(image_basename, image_size, boxes,
+                                       [class_id + 1 for class_id in class_ids], polygons)
+        return warning
+    
+    @property
+    def classes_changed(self):
+        """本次运行是否新增了类别（YOLO标注中的类别id依赖尚未写出的 classes.txt）"""
+        return 'yolo' in self.formats and len(self.class_names) > self.initial_class_count
+    
+    def close(self):
+        """完成导出：写出YOLO的 classes.txt 和COCO文件尾部（仅在正常结束时调用）"""
+        if 'yolo' in self.formats:
+            _write_text_lines(os.path.join(OUTPUT_YOLO_DIR, 'classes.txt'), self.class_names)
+        if self.coco_writer is not None:
+            self.coco_writer.close([{'id': i + 1, 'name': name, 'supercategory': ''}
+                                    for i, name in enumerate(self.class_names)])
+    
+    def abort(self):
+        """运行被中断时调用：不更新 classes.txt，删除COCO临时文件，已有的完整导出保持不变"""
+        if self.coco_writer is not None:
+            self.coco_writer.abort()
+    
+    def print_summary(self):
+        """打印导出结果"""
+        if 'yolo' in self.formats:
+            print(f"  - YOLO标注: {OUTPUT_YOLO_DIR}（{len(self.class_names)} 个类别）")
+        if 'dota' in self.formats:
+            print(f"  - DOTA标注: {OUTPUT_DOTA_DIR}")
+        if self.coco_writer is not None:
+            print(f"  - COCO标注: {OUTPUT_COCO_PATH}（{self.coco_writer.image_count} 张图像，"
+                  f"{self.coco_writer.annotation_count} 个标注）")
+        if self.unknown_class_count:
+            print(f"  [警告] {self.unknown_class_count} 个对象的类别不在类别列表中，未导出到YOLO/COCO")
+
+def get_export_output_paths(xml_file, has_size=True):
+    """
+    获取单个文件在各导出格式下的输出路径（COCO为整体文件，不在此列出）
+    
+    缺少有效 <size> 的文件不生成YOLO标注（has_size=False 时不列出）
+    """
+    stem = os.path.splitext(xml_file)[0]
+    paths = []
+    if 'voc' in EXPORT_FORMATS:
+        paths.append(os.path.join(OUTPUT_XML_DIR, xml_file))
+    if 'yolo' in EXPORT_FORMATS and has_size:
+        paths.append(os.path.join(OUTPUT_YOLO_DIR, f"{stem}.txt"))
+    if 'dota' in EXPORT_FORMATS:
+        paths.append(os.path.join(OUTPUT_DOTA_DIR, f"{stem}.txt"))
+    return paths
+
+# ==================== 增量转换清单 ====================
+
+MANIFEST_VERSION = 1
+
+def get_manifest_params():
+    """获取影响输出结果的参数，任一参数变化都会使清单中的所有记录失效"""
+    return {
+        'max_shrink_ratio': MAX_SHRINK_RATIO,
+        'class_shrink_ratios': CLASS_SHRINK_RATIOS,
+        'color_original_box': list(COLOR_ORIGINAL_BOX),
+        'color_converted_box': list(COLOR_CONVERTED_BOX),
+        'box_thickness': BOX_THICKNESS,
+        'enable_visualization': ENABLE_VISUALIZATION,
+        'export_formats': sorted(EXPORT_FORMATS),
+        'export_classes': _hash_file(EXPORT_CLASSES) if EXPORT_CLASSES else None,
+        'vis_scale': VIS_SCALE,
+        'vis_format': VIS_FORMAT,
+        'vis_quality': VIS_QUALITY,
+        'vis_sample_rate': VIS_SAMPLE_RATE,
+        'vis_file_list': _hash_file(VIS_FILE_LIST) if VIS_FILE_LIST else None,
+    }
+
+def _hash_file(path, block_size=1 << 20):
+    """计算文件内容的SHA1哈希"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_signature(path, use_hash=False):
+    """
+    获取文件签名（大小 + 修改时间，可选内容哈希）
+    
+    Returns:
+        dict or None: 文件不存在时返回None
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    signature = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if use_hash:
+        signature['sha1'] = _hash_file(path)
+    return signature
+
+def is_signature_current(path, recorded, use_hash=False):
+    """判断文件是否与记录的签名一致（大小和修改时间相同即视为未变化）"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return recorded is None
+    if recorded is None or stat.st_size != recorded['size']:
+        return False
+    if stat.st_mtime_ns == recorded['mtime_ns']:
+        return True
+    # 修改时间变化但大小相同：哈希模式下比较内容
+    return use_hash and 'sha1' in recorded and _hash_file(path) == recorded['sha1']
+
+def load_manifest(manifest_path, params):
+    """
+    加载清单文件
+    
+    清单不存在、损坏或参数不一致时返回空清单
+    """
+    empty_manifest = {'version': MANIFEST_VERSION, 'params': params, 'files': {}}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return empty_manifest
+    except (OSError, ValueError) as e:
+        print(f"[警告] 清单文件无法读取，将全量处理: {e}")
+        return empty_manifest
+    
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('params') != params:
+        print("参数已变化，清单记录全部失效")
+        return empty_manifest
+    return manifest
+
+def save_manifest(manifest, manifest_path):
+    """原子地保存清单文件（先写临时文件再重命名），中断时不会留下损坏的清单"""
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temp_path, manifest_path)
+
+def is_entry_current(xml_file, entry, use_hash=False):
+    """判断清单记录是否仍然有效：输入未变化且输出仍然存在"""
+    if not entry:
+        return False
+    if not is_signature_current(os.path.join(XML_DIR, xml_file), entry['xml'], use_hash):
+        return False
+    if not is_signature_current(os.path.join(IMAGE_DIR, entry['image_basename']), entry['image'], use_hash):
+        return False
+    if not all(os.path.exists(path) for path in get_export_output_paths(xml_file, entry.get('has_size', True))):
+        return False
+    vis_output = entry.get('vis_output')
+    return vis_output is None or os.path.exists(os.path.join(OUTPUT_VIS_DIR, vis_output))
+
+def drop_failed_manifest_entries(manifest, failed_paths):
+    """移除输出写入失败的清单记录，下次运行时重新处理这些文件"""
+    failed_paths = {os.path.normpath(path) for path in failed_paths}
+    for xml_file, entry in list(manifest['files'].items()):
+        output_paths = get_export_output_paths(xml_file, entry.get('has_size', True))
+        if entry.get('vis_output'):
+            output_paths.append(os.path.join(OUTPUT_VIS_DIR, entry['vis_output']))
+        if any(os.path.normpath(path) in failed_paths for path in output_paths):
+            del manifest['files'][xml_file]
+
+def make_manifest_entry(xml_file, image_basename, object_count, vis_ok, use_hash=False, has_size=True):
+    """为已处理的文件创建清单记录（has_size=False 表示未生成YOLO标注）"""
+    return {
+        'xml': file_signature(os.path.join(XML_DIR, xml_file), use_hash),
+        'image_basename': image_basename,
+        'image': file_signature(os.path.join(IMAGE_DIR, image_basename), use_hash),
+        'objects': object_count,
+        'vis_output': get_vis_output_name(image_basename) if vis_ok else None,
+        'has_size': has_size,
+    }
+
+# ====================================================
+
+# ==================== 内存转换API ====================
+# 供训练数据加载器等场景直接调用：不依赖路径配置、不写任何文件、不打印输出。
+#
+# 示例（PyTorch Dataset）:
+#     class RoadDataset(Dataset):
+#         def __getitem__(self, index):
+#             boxes, labels = convert_obb_annotation(self.xml_paths[index], CLASSES, use_cache=True)
+#             ...
+
+def _is_xml_text(source):
+    """判断输入是XML文本还是文件路径"""
+    if isinstance(source, bytes):
+        return source.lstrip()[:1] == b'<'
+    return isinstance(source, str) and source.lstrip()[:1] == '<'
+
+def parse_obb_xml(source):
+    """
+    解析单个标注中的旋转框
+    
+    Args:
+        source: XML文本（str/bytes）或XML文件路径
+    
+    Returns:
+        tuple: (params (N, 5) float64, 类别名列表)，无效的 robndbox 会被跳过
+    """
+    if _is_xml_text(source):
+        root = ET.fromstring(source)
+    else:
+        root = ET.parse(source).getroot()
+    
+    params, names = [], []
+    for obj in root.iter('object'):
+        robndbox = obj.find('robndbox')
+        if robndbox is None:
+            continue
+        obj_params = parse_robndbox(robndbox)
+        if obj_params is None:
+            continue
+        params.append(obj_params)
+        names.append(obj.findtext('name') or '')
+    return np.array(params, dtype=np.float64).reshape(-1, 5), names
+
+@functools.lru_cache(maxsize=API_PARSE_CACHE_SIZE)
+def parse_obb_xml_cached(xml_path):
+    """
+    带缓存的 parse_obb_xml（仅用于文件路径），多个epoch重复读取同一文件时只解析一次
+    
+    返回的数组为只读，避免调用方修改缓存内容
+    """
+    params, names = parse_obb_xml(xml_path)
+    params.setflags(write=False)
+    return params, tuple(names)
+
+def convert_obb_params(params, shrink_ratio=None):
+    """
+    将旋转框参数直接转换为水平框
+    
+    Args:
+        params: 形状为 (N, 5) 的数组，每行为 cx, cy, w, h, angle
+        shrink_ratio: 最大收缩比例（标量或 (N,) 数组），默认使用 MAX_SHRINK_RATIO
+    
+    Returns:
+        np.ndarray: 形状为 (N, 4) 的 int64 数组，每行为 xmin, ymin, xmax, ymax
+    """
+    params = np.asarray(params, dtype=np.float64).reshape(-1, 5)
+    if len(params) == 0:
+        return np.empty((0, 4), dtype=np.int64)
+    return convert_obb_batch(params, shrink_ratio)[1]
+
+def convert_obb_annotation(source, class_to_id, shrink_ratio=None, use_cache=False):
+    """
+    将单个旋转框标注转换为水平框数组，结果与写出的XML一致
+    
+    Args:
+        source: XML文本（str/bytes）或XML文件路径
+        class_to_id: 类别名到类别id的映射（dict），或按id排列的类别名序列；未知类别的id为 -1
+        shrink_ratio: 最大收缩比例，默认使用 MAX_SHRINK_RATIO
+        use_cache: 为True且source为路径时使用 parse_obb_xml_cached
+    
+    Returns:
+        tuple: (boxes (N, 4) int64, class_ids (N,) int64)
+    """
+    if use_cache and not _is_xml_text(source):
+        params, names = parse_obb_xml_cached(os.fspath(source))
+    else:
+        params, names = parse_obb_xml(source)
+    
+    if not isinstance(class_to_id, dict):
+        class_to_id = {name: index for index, name in enumerate(class_to_id)}
+    class_ids = np.fromiter((class_to_id.get(name, -1) for name in names),
+                            dtype=np.int64, count=len(names))
+    return convert_obb_params(params, shrink_ratio), class_ids
+
+# ==================== 数据集解析 ====================
+
+def load_obb_annotations(xml_dir=None):
+    """
+    一次性解析目录下所有XML中的旋转框，返回列式数据
+    
+    Args:
+        xml_dir (str, optional): XML目录，默认使用 XML_DIR
+    
+    Returns:
+        dict: files (文件名列表), image_basenames (对应图像文件名列表), file_index (N,),
+              class_names (类别名列表), class_id (N,), params (N, 5), difficult (N,)
+    """
+    if xml_dir is None:
+        xml_dir = XML_DIR
+    
+    files = sorted(f for f in os.listdir(xml_dir) if f.endswith('.xml'))
+    image_basenames = []
+    class_lookup = {}
+    file_index, class_id, params, difficult = [], [], [], []
+    
+    for index, xml_file in enumerate(files):
+        try:
+            root = ET.parse(os.path.join(xml_dir, xml_file)).getroot()
+        except (ET.ParseError, OSError) as e:
+            print(f"[警告] 无法解析 {xml_file}，已跳过: {e}")
+            image_basenames.append('')
+            continue
+        
+        image_basenames.append(os.path.basename(root.findtext('path') or ''))
+        for obj in root.iter('object'):
+            robndbox = obj.find('robndbox')
+            if robndbox is None:
+                continue
+            obj_params = parse_robndbox(robndbox)
+            if obj_params is None:
+                continue
             
-            # 绘制转换后的水平框（绿色）
-            xmin, ymin, xmax, ymax = info['horizontal_box']
-            cv2.rectangle(image, (xmin, ymin), (xmax, ymax), COLOR_CONVERTED_BOX, BOX_THICKNESS)
+            name = obj.findtext('name') or ''
+            file_index.append(index)
+            class_id.append(class_lookup.setdefault(name, len(class_lookup)))
+            params.append(obj_params)
+            difficult.append((obj.findtext('difficult') or '0').strip() == '1')
+    
+    return {
+        'files': files,
+        'image_basenames': image_basenames,
+        'file_index': np.array(file_index, dtype=np.int32),
+        'class_names': list(class_lookup),
+        'class_id': np.array(class_id, dtype=np.int32),
+        'params': np.array(params, dtype=np.float64).reshape(-1, 5),
+        'difficult': np.array(difficult, dtype=np.uint8),
+    }
+
+# ==================== 标注缓存 ====================
+
+ANNOTATION_CACHE_VERSION = 1
+_CACHE_COLUMNS = ('file_index', 'class_id', 'params', 'difficult')
+_CACHE_META_FILENAME = 'meta.json'
+
+def _get_xml_file_stats(xml_dir, files):
+    """获取XML文件的大小和修改时间数组"""
+    sizes = np.empty(len(files), dtype=np.int64)
+    mtimes = np.empty(len(files), dtype=np.int64)
+    for i, xml_file in enumerate(files):
+        stat = os.stat(os.path.join(xml_dir, xml_file))
+        sizes[i] = stat.st_size
+        mtimes[i] = stat.st_mtime_ns
+    return sizes, mtimes
+
+def build_annotation_cache(cache_dir, xml_dir=None):
+    """
+    解析XML目录并写入列式缓存
+    
+    每列保存为独立的 .npy 文件，便于加载时内存映射；meta.json 最后写入，
+    只有它存在时缓存才被视为完整
+    
+    Returns:
+        dict: 与 load_obb_annotations 相同结构的数据
+    """
+    if xml_dir is None:
+        xml_dir = XML_DIR
+    
+    annotations = load_obb_annotations(xml_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path = os.path.join(cache_dir, _CACHE_META_FILENAME)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    
+    for column in _CACHE_COLUMNS:
+        np.save(os.path.join(cache_dir, f'{column}.npy'), annotations[column])
+    sizes, mtimes = _get_xml_file_stats(xml_dir, annotations['files'])
+    np.save(os.path.join(cache_dir, 'file_sizes.npy'), sizes)
+    np.save(os.path.join(cache_dir, 'file_mtimes.npy'), mtimes)
+    
+    meta = {
+        'version': ANNOTATION_CACHE_VERSION,
+        'xml_dir': os.path.abspath(xml_dir),
+        'xml_dir_mtime_ns': os.stat(xml_dir).st_mtime_ns,
+        'files': annotations['files'],
+        'image_basenames': annotations['image_basenames'],
+        'class_names': annotations['class_names'],
+    }
+    temp_path = meta_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temp_path, meta_path)
+    return annotations
+
+def load_annotation_cache(cache_dir, xml_dir=None, verify=None):
+    """
+    加载列式缓存（内存映射），缓存不存在或已过期时返回None
+    
+    XML目录的修改时间只反映文件增删，因此默认（verify=True）还会逐个比较文件的大小和修改时间；
+    verify=False 时只比较目录修改时间
+    """
+    if xml_dir is None:
+        xml_dir = XML_DIR
+    if verify is None:
+        verify = CACHE_VERIFY
+    
+    try:
+        with open(os.path.join(cache_dir, _CACHE_META_FILENAME), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    
+    if (meta.get('version') != ANNOTATION_CACHE_VERSION
+            or meta.get('xml_dir') != os.path.abspath(xml_dir)
+            or meta.get('xml_dir_mtime_ns') != os.stat(xml_dir).st_mtime_ns):
+        return None
+    
+    try:
+        annotations = {column: np.load(os.path.join(cache_dir, f'{column}.npy'), mmap_mode='r')
+                       for column in _CACHE_COLUMNS}
+        if verify:
+            sizes, mtimes = _get_xml_file_stats(xml_dir, meta['files'])
+            if (not np.array_equal(sizes, np.load(os.path.join(cache_dir, 'file_sizes.npy')))
+                    or not np.array_equal(mtimes, np.load(os.path.join(cache_dir, 'file_mtimes.npy')))):
+                return None
+    except (OSError, ValueError):
+        return None
+    
+    annotations['files'] = meta['files']
+    annotations['image_basenames'] = meta['image_basenames']
+    annotations['class_names'] = meta['class_names']
+    return annotations
+
+def get_obb_annotations(cache_dir=None, rebuild=False):
+    """
+    获取列式旋转框数据：配置了缓存目录时优先读取缓存，缓存无效则重新解析并写入
+    
+    Args:
+        cache_dir (str, optional): 缓存目录，默认使用 ANNOTATION_CACHE_DIR
+        rebuild (bool): 是否强制重建缓存
+    """
+    if cache_dir is None:
+        cache_dir = ANNOTATION_CACHE_DIR
+    if not cache_dir:
+        return load_obb_annotations()
+    
+    if not rebuild:
+        annotations = load_annotation_cache(cache_dir)
+        if annotations is not None:
+            print(f"已加载标注缓存: {cache_dir}（{len(annotations['params'])} 个对象）")
+            return annotations
+    
+    print(f"正在构建标注缓存: {cache_dir}")
+    return build_annotation_cache(cache_dir)
+
+def print_dataset_statistics(annotations):
+    """打印数据集统计信息（直接基于列式数据计算）"""
+    params = np.asarray(annotations['params'])
+    class_id = np.asarray(annotations['class_id'])
+    file_count = len(annotations['files'])
+    object_count = len(params)
+    
+    print("\n" + "-" * 40)
+    print("数据集统计")
+    print("-" * 40)
+    print(f"XML文件数: {file_count}")
+    print(f"旋转框总数: {object_count}")
+    if object_count == 0:
+        return
+    
+    objects_per_file = np.bincount(annotations['file_index'], minlength=file_count)
+    print(f"每个文件对象数: 平均 {objects_per_file.mean():.1f}，最多 {objects_per_file.max()}")
+    print(f"困难样本: {int(np.count_nonzero(annotations['difficult']))} 个")
+    
+    print("按类别统计:")
+    class_counts = np.bincount(class_id, minlength=len(annotations['class_names']))
+    for index in np.argsort(-class_counts, kind='stable'):
+        print(f"  - {annotations['class_names'][index]}: {class_counts[index]} 个")
+    
+    widths, heights, angles = params[:, 2], params[:, 3], params[:, 4]
+    print(f"宽度: 中位数 {np.median(widths):.1f}，范围 {widths.min():.1f} - {widths.max():.1f}")
+    print(f"高度: 中位数 {np.median(heights):.1f}，范围 {heights.min():.1f} - {heights.max():.1f}")
+    print(f"角度(弧度): 中位数 {np.median(angles):.3f}，范围 {angles.min():.3f} - {angles.max():.3f}")
+
+# ==================== 收缩比例扫描 ====================
+
+def parse_ratio_range(spec):
+    """
+    解析 起始:结束:步长 格式的比例范围（含结束值），也支持逗号分隔的比例列表
+    
+    Raises:
+        ValueError: 格式错误、步长不为正或比例为负
+    """
+    if ':' not in spec:
+        values = np.array([float(value) for value in spec.split(',')], dtype=np.float64)
+        if not np.all(values >= 0):
+            raise ValueError(f"比例不能为负: {spec}")
+        return values
+    fields = spec.split(':')
+    if len(fields) != 3:
+        raise ValueError(f"需要 起始:结束:步长 三个字段: {spec}")
+    start, stop, step = (float(value) for value in fields)
+    if not step > 0:
+        raise ValueError(f"步长必须大于0: {spec}")
+    if not 0 <= start <= stop:
+        raise ValueError(f"需要 0 <= 起始 <= 结束: {spec}")
+    return np.round(np.arange(start, stop + step / 2, step), 6)
+
+def box_iou(boxes_a, boxes_b):
+    """计算两组水平框的IoU，形状可广播，最后一维为 xmin, ymin, xmax, ymax"""
+    boxes_a = np.asarray(boxes_a, dtype=np.float64)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64)
+    inter_w = np.clip(np.minimum(boxes_a[..., 2], boxes_b[..., 2]) - np.maximum(boxes_a[..., 0], boxes_b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(boxes_a[..., 3], boxes_b[..., 3]) - np.maximum(boxes_a[..., 1], boxes_b[..., 1]), 0, None)
+    intersection = inter_w * inter_h
+    area_a = (boxes_a[..., 2] - boxes_a[..., 0]) * (boxes_a[..., 3] - boxes_a[..., 1])
+    area_b = (boxes_b[..., 2] - boxes_b[..., 0]) * (boxes_b[..., 3] - boxes_b[..., 1])
+    union = area_a + area_b - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+def load_reference_boxes(xml_path):
+    """读取人工标注的参考水平框，返回 [(类别名, (xmin, ymin, xmax, ymax)), ...]"""
+    references = []
+    root = ET.parse(xml_path).getroot()
+    for obj in root.iter('object'):
+        bndbox = obj.find('bndbox')
+        if bndbox is None:
+            continue
+        try:
+            box = tuple(float(bndbox.find(tag).text) for tag in ('xmin', 'ymin', 'xmax', 'ymax'))
+        except (AttributeError, TypeError, ValueError):
+            continue
+        references.append((obj.findtext('name') or '', box))
+    return references
+
+def match_reference_boxes(annotations, reference_dir, match_iou=None):
+    """
+    将旋转框与参考水平框按文件名和类别进行贪心匹配
+    
+    匹配依据为旋转框外接矩形与参考框的IoU，与收缩比例无关，只需计算一次
+    
+    Returns:
+        tuple: (匹配到的对象索引 (M,), 对应的参考框 (M, 4))
+    """
+    if match_iou is None:
+        match_iou = SWEEP_MATCH_IOU
+    
+    corners = convert_robndbox_batch_to_corners(annotations['params'])
+    enclosing = np.concatenate([corners.min(axis=1), corners.max(axis=1)], axis=1)
+    class_lookup = {name: i for i, name in enumerate(annotations['class_names'])}
+    
+    # 按文件分组对象索引
+    order = np.argsort(annotations['file_index'], kind='stable')
+    boundaries = np.flatnonzero(np.diff(annotations['file_index'][order])) + 1
+    
+    matched_indices, matched_boxes = [], []
+    for group in np.split(order, boundaries):
+        if len(group) == 0:
+            continue
+        xml_file = annotations['files'][annotations['file_index'][group[0]]]
+        reference_path = os.path.join(reference_dir, xml_file)
+        if not os.path.exists(reference_path):
+            continue
+        try:
+            references = load_reference_boxes(reference_path)
+        except (ET.ParseError, OSError):
+            continue
+        if not references:
+            continue
         
-        # 保存可视化结果
-        output_vis_path = os.path.join(OUTPUT_VIS_DIR, f"vis_{image_basename}")
+        ref_class = np.array([class_lookup.get(name, -1) for name, _ in references])
+        ref_boxes = np.array([box for _, box in references], dtype=np.float64)
         
-        # 使用cv2.imencode处理中文路径
-        success, encoded_img = cv2.imencode('.png', image)
-        if success:
-            with open(output_vis_path, 'wb') as f:
-                f.write(encoded_img.tobytes())
-            return True
-        else:
-            return False
+        iou = box_iou(enclosing[group][:, np.newaxis, :], ref_boxes[np.newaxis, :, :])
+        iou[annotations['class_id'][group][:, np.newaxis] != ref_class[np.newaxis, :]] = 0
         
-    except Exception as e:
-        print(f"  [警告] 创建可视化失败 {image_basename}: {e}")
-        return False
+        # 贪心匹配：每次取IoU最大的一对
+        while True:
+            obj_pos, ref_pos = np.unravel_index(np.argmax(iou), iou.shape)
+            if iou[obj_pos, ref_pos] < match_iou:
+                break
+            matched_indices.append(group[obj_pos])
+            matched_boxes.append(ref_boxes[ref_pos])
+            iou[obj_pos, :] = 0
+            iou[:, ref_pos] = 0
+    
+    return (np.array(matched_indices, dtype=np.int64),
+            np.array(matched_boxes, dtype=np.float64).reshape(-1, 4))
+
+def sweep_shrink_ratios(params, reference_boxes, ratios, crop_tolerance=None, chunk_size=None):
+    """
+    一次向量化计算所有候选比例下的转换结果并与参考框比较
+    
+    Args:
+        params: 已匹配对象的旋转框参数 (M, 5)
+        reference_boxes: 对应的参考框 (M, 4)
+        ratios: 候选比例 (R,)
+        crop_tolerance: 判定过度裁剪时的像素误差，默认使用 SWEEP_CROP_TOLERANCE
+        chunk_size: 分块处理的对象数，限制内存占用
+    
+    Returns:
+        tuple: (平均IoU (R,), 过度裁剪比例 (R,))
+    """
+    if crop_tolerance is None:
+        crop_tolerance = SWEEP_CROP_TOLERANCE
+    ratios = np.asarray(ratios, dtype=np.float64).reshape(-1, 1)
+    if chunk_size is None:
+        chunk_size = max(1, 4_000_000 // len(ratios))
+    
+    iou_sum = np.zeros(len(ratios))
+    overcrop_count = np.zeros(len(ratios))
+    corners = convert_robndbox_batch_to_corners(params)
+    
+    for start in range(0, len(params), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        # (R, n, 4)：所有候选比例一次计算
+        boxes = calculate_heuristic_shrink_bbox_batch(corners[chunk], params[chunk, 4], ratios)
+        references = reference_boxes[np.newaxis, chunk]
+        iou_sum += box_iou(boxes, references).sum(axis=1)
+        
+        # 过度裁剪：转换后的框未完全包含参考框（即裁掉了前景）
+        overcrop = ((boxes[..., 0] > references[..., 0] + crop_tolerance)
+                    | (boxes[..., 1] > references[..., 1] + crop_tolerance)
+                    | (boxes[..., 2] < references[..., 2] - crop_tolerance)
+                    | (boxes[..., 3] < references[..., 3] - crop_tolerance))
+        overcrop_count += overcrop.sum(axis=1)
+    
+    count = max(1, len(params))
+    return iou_sum / count, overcrop_count / count
+
+def choose_best_ratio(ratios, mean_iou, overcrop, max_overcrop=None):
+    """在过度裁剪比例不超过上限的候选中选择平均IoU最高的比例，若都超限则直接取IoU最高者"""
+    if max_overcrop is None:
+        max_overcrop = SWEEP_MAX_OVERCROP
+    allowed = overcrop <= max_overcrop
+    candidates = np.flatnonzero(allowed) if allowed.any() else np.arange(len(ratios))
+    return int(candidates[np.argmax(mean_iou[candidates])])
 
-def run_conversion():
-    """运行主转换程序"""
+def run_sweep(reference_dir, ratios=None, per_class=False):
+    """
+    收缩比例扫描：解析一次旋转框，评估所有候选比例并报告最佳值
+    
+    Args:
+        reference_dir (str): 人工标注的参考水平框XML目录（文件名与XML_DIR一致）
+        ratios (str, optional): 候选比例范围，默认使用 SWEEP_RATIOS
+        per_class (bool): 是否为每个类别单独选择比例
+    
+    Returns:
+        tuple: (最佳比例, {类别名: 最佳比例})，无可用匹配时返回 (None, {})
+    """
+    print("\n" + "-" * 40)
+    print("收缩比例扫描")
+    print("-" * 40)
+    
+    start_time = time.perf_counter()
+    ratio_values = parse_ratio_range(ratios or SWEEP_RATIOS)
+    annotations = get_obb_annotations()
+    matched_indices, reference_boxes = match_reference_boxes(annotations, reference_dir)
+    parse_time = time.perf_counter() - start_time
+    
+    print(f"解析旋转框: {len(annotations['params'])} 个，与参考框匹配: {len(matched_indices)} 个 "
+          f"（耗时 {parse_time:.2f}s）")
+    if len(matched_indices) == 0:
+        print(f"[错误] 在 {reference_dir} 中没有找到可匹配的参考框")
+        return None, {}
+    
+    params = annotations['params'][matched_indices]
+    mean_iou, overcrop = sweep_shrink_ratios(params, reference_boxes, ratio_values)
+    best = choose_best_ratio(ratio_values, mean_iou, overcrop)
+    
+    print(f"\n{'比例':>8} {'平均IoU':>10} {'过度裁剪':>10}")
+    for i, ratio in enumerate(ratio_values):
+        marker = '  <- 最佳' if i == best else ''
+        print(f"{ratio:>8.3f} {mean_iou[i]:>10.4f} {overcrop[i]:>9.1%}{marker}")
+    
+    class_ratios = {}
+    if per_class:
+        print("\n按类别的最佳比例:")
+        matched_class = annotations['class_id'][matched_indices]
+        for class_index, name in enumerate(annotations['class_names']):
+            mask = matched_class == class_index
+            if not mask.any():
+                continue
+            class_iou, class_overcrop = sweep_shrink_ratios(params[mask], reference_boxes[mask], ratio_values)
+            class_best = choose_best_ratio(ratio_values, class_iou, class_overcrop)
+            class_ratios[name] = float(ratio_values[class_best])
+            print(f"  - {name}: {ratio_values[class_best]:.3f} "
+                  f"(平均IoU {class_iou[class_best]:.4f}, 过度裁剪 {class_overcrop[class_best]:.1%}, "
+                  f"{int(mask.sum())} 个对象)")
+    
+    print(f"\n最佳比例: {ratio_values[best]:.3f} "
+          f"(平均IoU {mean_iou[best]:.4f}, 过度裁剪 {overcrop[best]:.1%})")
+    print(f"扫描耗时: {time.perf_counter() - start_time:.2f}s")
+    return float(ratio_values[best]), class_ratios
+
+# ====================================================
+
+def convert_file_task(xml_file):
+    """
+    单个文件的转换任务，可在子进程中执行
+    
+    输出文件不在任务中写入，而是随结果返回，由主进程交给写入队列
+    
+    Returns:
+        tuple: (xml_file, image_basename, conversion_info, image_size, output_files, convert_log, timings)
+    """
+    with collect_output_files() as output_files:
+        ((image_basename, conversion_info, image_size), timings), convert_log = _capture_output(
+            _run_with_timings, convert_xml_file, xml_file)
+    return xml_file, image_basename, conversion_info, image_size, output_files, convert_log, timings
+
+def convert_file_batch(xml_files):
+    """在子进程中依次处理一小批文件，减少进程间通信次数"""
+    return [convert_file_task(xml_file) for xml_file in xml_files]
+
+def resolve_worker_count(workers=None):
+    """解析并行进程数：None使用NUM_WORKERS，0或负数使用全部CPU核心"""
+    if workers is None:
+        workers = NUM_WORKERS
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+def iter_file_results(xml_files, workers=1):
+    """
+    按输入顺序逐个产出每个文件的处理结果
+    
+    workers > 1 时使用进程池并行处理，结果仍按原顺序返回，保证输出与进程数无关。
+    在途批次数不超过 workers * RESULT_WINDOW_PER_WORKER，上一批结果被消费后才提交新批次，
+    因此主进程中积压的结果数量有上限（可视化和写入队列的内存上限依赖于此）
+    """
+    if workers <= 1 or len(xml_files) <= 1:
+        for xml_file in xml_files:
+            yield convert_file_task(xml_file)
+        return
+    
+    chunksize = max(1, min(RESULT_BATCH_SIZE, len(xml_files) // (workers * 4)))
+    batches = (xml_files[i:i + chunksize] for i in range(0, len(xml_files), chunksize))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(_get_worker_config(),)) as executor:
+        pending = deque(executor.submit(convert_file_batch, batch)
+                        for batch in itertools.islice(batches, workers * RESULT_WINDOW_PER_WORKER))
+        try:
+            while pending:
+                yield from pending.popleft().result()
+                batch = next(batches, None)
+                if batch is not None:
+                    pending.append(executor.submit(convert_file_batch, batch))
+        finally:
+            for future in pending:
+                future.cancel()
+
+def run_conversion(workers=None, incremental=None):
+    """
+    运行主转换程序
+    
+    Args:
+        workers (int, optional): 并行进程数，默认使用 NUM_WORKERS
+        incremental (bool, optional): 是否启用增量模式，默认使用 INCREMENTAL
+    """
+    global _output_writer
+    if incremental is None:
+        incremental = INCREMENTAL
+    
     print("\n" + "-" * 40)
     print("执行转换")
     print("-" * 40)
     
-    print("开始全量转换处理，将为所有文件生成可视化图像...")
+    if ENABLE_VISUALIZATION:
+        print("开始全量转换处理，将为所有文件生成可视化图像...")
+    else:
+        print("开始全量转换处理（仅转换XML，不生成可视化）...")
     print("- 蓝色框：原始旋转框标注")
     print("- 绿色框：转换后的水平框")
     print("-" * 40)
@@ -294,52 +1889,333 @@ def run_conversion():
     print(f"找到 {len(xml_files)} 个XML文件")
     print("-" * 40)
     
+    # 增量模式：根据清单筛选需要重新处理的文件
+    skipped_count = 0
+    manifest = None
+    manifest_path = os.path.join(OUTPUT_XML_DIR, MANIFEST_FILENAME)
+    if incremental and 'coco' in EXPORT_FORMATS:
+        # COCO为整个数据集的单个文件，跳过部分文件会导致其不完整
+        print("ℹ️  导出COCO格式时需要处理全部文件，已关闭增量模式")
+        incremental = False
+    if incremental:
+        manifest = load_manifest(manifest_path, get_manifest_params())
+        current_files = set(xml_files)
+        manifest['files'] = {name: entry for name, entry in manifest['files'].items()
+                             if name in current_files}
+        pending_files = [f for f in xml_files
+                         if not is_entry_current(f, manifest['files'].get(f), MANIFEST_USE_HASH)]
+        skipped_count = len(xml_files) - len(pending_files)
+        print(f"增量模式：{skipped_count} 个文件未变化已跳过，{len(pending_files)} 个文件待处理")
+        print("-" * 40)
+        xml_files = pending_files
+    
+    workers = resolve_worker_count(workers)
+    if workers > 1:
+        print(f"并行模式：使用 {workers} 个进程")
+        print("-" * 40)
+    
+    vis_file_set = load_vis_file_list(VIS_FILE_LIST) if VIS_FILE_LIST else None
+    exporter = None
+    if set(EXPORT_FORMATS) - {'voc'}:
+        exporter = DatasetExporter(EXPORT_FORMATS, load_class_names(EXPORT_CLASSES) if EXPORT_CLASSES else None)
+    
     # 处理文件
     successful_conversions = 0
     total_objects_converted = 0
     visualization_count = 0
+    processed_count = 0
+    profile = PipelineProfile(PROFILE_TOP_N) if PROFILE_ENABLED else None
+    output_writer = None
+    if OUTPUT_WRITE_THREADS > 0:
+        output_writer = _output_writer = WriteBehindQueue(OUTPUT_WRITE_THREADS, OUTPUT_WRITE_QUEUE_SIZE)
     
-    for i, xml_file in enumerate(xml_files, 1):
-        print(f"[{i}/{len(xml_files)}] 处理: {xml_file}")
-        
-        image_basename, conversion_info = process_single_xml_file(xml_file)
-        
-        if image_basename and conversion_info:
-            successful_conversions += 1
-            total_objects_converted += len(conversion_info)
-            print(f"  -> 已转换: {len(conversion_info)} 个对象")
+    recorded_files = []
+    no_size_files = set()
+    
+    def record_result(xml_file, image_basename, object_count, vis_ok, *timings):
+        """记录已写出XML的文件，失败的文件不记录以便下次重试"""
+        nonlocal processed_count
+        processed_count += 1
+        recorded_files.append(xml_file)
+        if profile is not None:
+            profile.add_file(xml_file, object_count, *timings)
+        if manifest is not None and image_basename:
+            manifest['files'][xml_file] = make_manifest_entry(
+                xml_file, image_basename, object_count, vis_ok, MANIFEST_USE_HASH,
+                has_size=xml_file not in no_size_files)
+            no_size_files.discard(xml_file)
+            if processed_count % MANIFEST_SAVE_INTERVAL == 0:
+                # 清单只记录已落盘的输出
+                if output_writer is not None:
+                    output_writer.flush()
+                save_manifest(manifest, manifest_path)
+    
+    def finish_visualization(pending_item):
+        """等待一个可视化任务完成并输出结果"""
+        nonlocal visualization_count
+        xml_file, image_basename, object_count, convert_timings, future = pending_item
+        (vis_ok, warning), vis_timings = future.result()
+        if warning:
+            print(warning)
+        if vis_ok:
+            visualization_count += 1
+            print(f"  -> 可视化已生成: {get_vis_output_name(image_basename)}")
+        record_result(xml_file, image_basename, object_count, vis_ok, convert_timings, vis_timings)
+    
+    # 可视化阶段：独立的线程池，通过有界队列与转换阶段衔接
+    vis_pending = deque()
+    completed = False
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, VIS_THREADS)) as vis_executor:
+            for i, result in enumerate(iter_file_results(xml_files, workers), 1):
+                (xml_file, image_basename, conversion_info, image_size,
+                 output_files, convert_log, convert_timings) = result
+                for output_path, data in output_files:
+                    write_output_file(output_path, data)
+                object_count = len(conversion_info) if conversion_info else 0
+                if image_size is None:
+                    no_size_files.add(xml_file)
+                print(f"[{i}/{len(xml_files)}] 处理: {xml_file}")
+                print(convert_log, end='')
+                
+                # 其他格式与VOC共用同一次解析结果
+                if exporter is not None and image_basename:
+                    export_warning = exporter.add(xml_file, image_basename, image_size, conversion_info)
+                    if export_warning:
+                        print(export_warning)
+                
+                if image_basename and object_count:
+                    successful_conversions += 1
+                    total_objects_converted += object_count
+                    print(f"  -> 已转换: {object_count} 个对象")
+                
+                if object_count and should_visualize(xml_file, image_basename, vis_file_set):
+                    # 队列已满时等待最早的可视化任务完成
+                    if len(vis_pending) >= VIS_QUEUE_SIZE:
+                        finish_visualization(vis_pending.popleft())
+                    future = vis_executor.submit(_run_with_timings, render_visualization,
+                                                 image_basename, conversion_info)
+                    vis_pending.append((xml_file, image_basename, object_count, convert_timings, future))
+                else:
+                    record_result(xml_file, image_basename, object_count, False, convert_timings)
+                
+                # 按提交顺序输出已完成的可视化结果
+                while vis_pending and vis_pending[0][-1].done():
+                    finish_visualization(vis_pending.popleft())
             
-            # 创建可视化（总是启用）
-            if create_visualization(image_basename, conversion_info, True):
-                visualization_count += 1
-                print(f"  -> 可视化已生成: vis_{image_basename}")
+            while vis_pending:
+                finish_visualization(vis_pending.popleft())
+        completed = True
+    finally:
+        # 导出文件只在正常结束时完成；被中断时保留上次的完整导出，
+        # 但仍保存清单，下次运行从中断处继续
+        if exporter is not None:
+            if completed:
+                exporter.close()
+            else:
+                exporter.abort()
+                if manifest is not None and exporter.classes_changed:
+                    # 新类别的id未写入 classes.txt，本次处理的文件下次需要重新导出
+                    for xml_file in recorded_files:
+                        manifest['files'].pop(xml_file, None)
+        if output_writer is not None:
+            output_writer.close()
+            _output_writer = None
+            if manifest is not None and output_writer.failed:
+                drop_failed_manifest_entries(manifest, output_writer.failed)
+        if manifest is not None:
+            save_manifest(manifest, manifest_path)
     
     print("\n" + "=" * 60)
     print("转换完成！")
     print(f"成功转换: {successful_conversions}/{len(xml_files)} 个XML文件")
+    if incremental:
+        print(f"未变化跳过: {skipped_count} 个XML文件")
     print(f"转换对象总数: {total_objects_converted}")
-    print(f"生成可视化: {visualization_count} 个图像")
+    if ENABLE_VISUALIZATION:
+        print(f"生成可视化: {visualization_count} 个图像")
     print(f"输出位置:")
-    print(f"  - XML文件: {OUTPUT_XML_DIR}")
-    print(f"  - 可视化: {OUTPUT_VIS_DIR}")
+    if 'voc' in EXPORT_FORMATS:
+        print(f"  - XML文件: {OUTPUT_XML_DIR}")
+    if exporter is not None:
+        exporter.print_summary()
+    if ENABLE_VISUALIZATION:
+        print(f"  - 可视化: {OUTPUT_VIS_DIR}")
+    if output_writer is not None:
+        output_writer.print_summary()
     print("=" * 60)
     
-    return successful_conversions > 0
+    if profile is not None:
+        profile.finish()
+        profile.print_summary()
+        if PROFILE_JSON_PATH:
+            profile.write_json(PROFILE_JSON_PATH)
+            print(f"性能报告已写入: {PROFILE_JSON_PATH}")
+    
+    return successful_conversions > 0 or (incremental and skipped_count > 0)
 
 def get_user_confirmation():
     """获取用户确认是否继续"""
     print(f"\n当前参数设置:")
     print(f"  - MAX_SHRINK_RATIO: {MAX_SHRINK_RATIO}")
+    if CLASS_SHRINK_RATIOS:
+        print(f"  - 按类别收缩比例: {CLASS_SHRINK_RATIOS}")
     print(f"  - 图像目录: {IMAGE_DIR}")
     print(f"  - XML目录: {XML_DIR}")
     print(f"  - 输出XML目录: {OUTPUT_XML_DIR}")
+    print(f"  - 导出格式: {','.join(EXPORT_FORMATS)}")
     print(f"  - 输出可视化目录: {OUTPUT_VIS_DIR}")
+    print(f"  - 并行进程数: {resolve_worker_count()}")
+    print(f"  - 后台写入线程数: {OUTPUT_WRITE_THREADS}")
+    print(f"  - 增量模式: {'开启' if INCREMENTAL else '关闭'}")
+    if ENABLE_VISUALIZATION:
+        print(f"  - 可视化: 格式 {VIS_FORMAT}，缩放 {VIS_SCALE}，抽样 {VIS_SAMPLE_RATE}"
+              + (f"，列表 {VIS_FILE_LIST}" if VIS_FILE_LIST else ""))
+    else:
+        print("  - 可视化: 关闭")
+    
+    if not INTERACTIVE:
+        return True
     
     choice = input("\n是否继续执行转换? (y/n): ").lower().strip()
     return choice == 'y'
 
 def main():
-    """主程序"""
+    """
+    主程序
+    
+    Returns:
+        int: 进程退出码，0表示成功
+    """
+    global IMAGE_DIR, XML_DIR, OUTPUT_XML_DIR, OUTPUT_VIS_DIR, ENABLE_VISUALIZATION, INTERACTIVE
+    global EXPORT_FORMATS, EXPORT_CLASSES, OUTPUT_YOLO_DIR, OUTPUT_DOTA_DIR, OUTPUT_COCO_PATH
+    global NUM_WORKERS, OUTPUT_WRITE_THREADS, INCREMENTAL, MANIFEST_USE_HASH, MAX_SHRINK_RATIO, CLASS_SHRINK_RATIOS
+    global ANNOTATION_CACHE_DIR, CACHE_VERIFY, PROFILE_ENABLED, PROFILE_JSON_PATH, PROFILE_TOP_N
+    global VIS_SCALE, VIS_FORMAT, VIS_QUALITY, VIS_SAMPLE_RATE, VIS_FILE_LIST, VIS_THREADS
+    
+    parser = argparse.ArgumentParser(
+        description='旋转框(OBB)到水平框(HBB)转换工具',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例用法:
+    python obb2hbb_converter.py                              # 交互式转换（使用脚本中的配置）
+    python obb2hbb_converter.py --yes --no-vis \\
+        --xml-dir shard_01/obb --output-xml-dir shard_01/hbb  # 批处理：仅转换XML，无交互
+    python obb2hbb_converter.py --yes --export voc,yolo,coco  # 一次解析同时导出VOC、YOLO和COCO
+        """
+    )
+    parser.add_argument('--image-dir', type=str, default=IMAGE_DIR,
+                        help=f'原始图像文件夹（默认 {IMAGE_DIR}）')
+    parser.add_argument('--xml-dir', type=str, default=XML_DIR,
+                        help=f'原始旋转框XML文件夹（默认 {XML_DIR}）')
+    parser.add_argument('--output-xml-dir', type=str, default=OUTPUT_XML_DIR,
+                        help=f'转换后的水平框XML文件夹（默认 {OUTPUT_XML_DIR}）')
+    parser.add_argument('--output-vis-dir', type=str, default=OUTPUT_VIS_DIR,
+                        help=f'可视化结果文件夹（默认 {OUTPUT_VIS_DIR}）')
+    parser.add_argument('--export', type=str, default=','.join(EXPORT_FORMATS),
+                        help=f'导出格式，逗号分隔，可选 {",".join(EXPORT_FORMAT_CHOICES)}'
+                             f'（默认 {",".join(EXPORT_FORMATS)}）')
+    parser.add_argument('--classes', type=str, default=EXPORT_CLASSES,
+                        help='类别列表文件（每行一个类别名），决定YOLO/COCO的类别id')
+    parser.add_argument('--output-yolo-dir', type=str, default=OUTPUT_YOLO_DIR,
+                        help=f'YOLO标注输出文件夹（默认 {OUTPUT_YOLO_DIR}）')
+    parser.add_argument('--output-dota-dir', type=str, default=OUTPUT_DOTA_DIR,
+                        help=f'DOTA标注输出文件夹（默认 {OUTPUT_DOTA_DIR}）')
+    parser.add_argument('--output-coco', type=str, default=OUTPUT_COCO_PATH,
+                        help=f'COCO标注输出文件（默认 {OUTPUT_COCO_PATH}）')
+    parser.add_argument('--ratio', type=float, default=MAX_SHRINK_RATIO,
+                        help=f'最大收缩比例 MAX_SHRINK_RATIO（默认 {MAX_SHRINK_RATIO}）')
+    parser.add_argument('-y', '--yes', action='store_true',
+                        help='非交互模式：不询问确认，结束时不等待回车')
+    parser.add_argument('--no-vis', action='store_true',
+                        help='仅转换XML，不生成可视化（不会导入OpenCV）')
+    parser.add_argument('--workers', type=int, default=NUM_WORKERS,
+                        help='并行进程数（默认1为串行，0为使用全部CPU核心）')
+    parser.add_argument('--write-threads', type=int, default=OUTPUT_WRITE_THREADS,
+                        help=f'后台写入线程数，0为同步写入（默认 {OUTPUT_WRITE_THREADS}）')
+    parser.add_argument('--force', action='store_true',
+                        help='忽略增量清单，全量重新转换所有文件')
+    parser.add_argument('--hash', action='store_true',
+                        help='增量模式下使用内容哈希判断文件是否变化')
+    parser.add_argument('--vis-scale', type=float, default=VIS_SCALE,
+                        help='可视化前的缩放比例，取值(0, 1]（默认1.0，如0.25可大幅加快解码和编码）')
+    parser.add_argument('--vis-format', choices=sorted(_VIS_EXTENSIONS), default=VIS_FORMAT,
+                        help='可视化输出格式（默认png）')
+    parser.add_argument('--vis-quality', type=int, default=VIS_QUALITY,
+                        help='jpg/webp 编码质量，1-100（默认90）')
+    parser.add_argument('--vis-sample', type=float, default=VIS_SAMPLE_RATE,
+                        help='可视化抽样比例，取值(0, 1]（默认1.0即全部生成）')
+    parser.add_argument('--vis-list', type=str, default=VIS_FILE_LIST,
+                        help='仅为列表文件中的图像生成可视化（每行一个文件名）')
+    parser.add_argument('--vis-threads', type=int, default=VIS_THREADS,
+                        help='可视化线程数（默认4）')
+    parser.add_argument('--sweep', type=str, metavar='REF_XML_DIR',
+                        help='扫描模式：与该目录中人工标注的水平框比较，评估候选收缩比例')
+    parser.add_argument('--sweep-ratios', type=str, default=SWEEP_RATIOS,
+                        help=f'候选比例，格式 起始:结束:步长 或逗号分隔列表（默认 {SWEEP_RATIOS}）')
+    parser.add_argument('--sweep-per-class', action='store_true',
+                        help='为每个类别单独选择最佳比例')
+    parser.add_argument('--sweep-apply', action='store_true',
+                        help='扫描后使用最佳比例继续执行转换')
+    parser.add_argument('--cache', type=str, default=ANNOTATION_CACHE_DIR, metavar='CACHE_DIR',
+                        help='使用列式标注缓存目录（不存在或过期时自动构建）')
+    parser.add_argument('--rebuild-cache', action='store_true',
+                        help='强制重新解析XML并重建标注缓存')
+    parser.add_argument('--cache-verify', action='store_true',
+                        help='加载缓存时逐个检查XML文件的大小和修改时间（默认已开启）')
+    parser.add_argument('--cache-trust-dir-mtime', action='store_true',
+                        help='加载缓存时只检查XML目录的修改时间（更快，但会漏掉就地编辑的文件）')
+    parser.add_argument('--stats', action='store_true',
+                        help='仅输出数据集统计信息')
+    parser.add_argument('--profile', action='store_true',
+                        help='记录各阶段耗时、吞吐量、最慢文件和峰值内存，并在结束时输出汇总')
+    parser.add_argument('--profile-json', type=str, default=PROFILE_JSON_PATH, metavar='PATH',
+                        help='将性能报告写入JSON文件（隐含 --profile）')
+    parser.add_argument('--profile-top', type=int, default=PROFILE_TOP_N,
+                        help=f'汇总中列出最慢的文件数（默认 {PROFILE_TOP_N}）')
+    args = parser.parse_args()
+    export_formats = tuple(value.strip() for value in args.export.split(',') if value.strip())
+    unknown_formats = set(export_formats) - set(EXPORT_FORMAT_CHOICES)
+    if unknown_formats or not export_formats:
+        parser.error(f"不支持的导出格式: {','.join(sorted(unknown_formats)) or args.export}")
+    try:
+        parse_ratio_range(args.sweep_ratios)
+    except ValueError as e:
+        parser.error(f"--sweep-ratios 无效: {e}")
+    if not 0 < args.vis_scale <= 1:
+        parser.error(f"--vis-scale 必须在 (0, 1] 范围内: {args.vis_scale}")
+    if not 1 <= args.vis_quality <= 100:
+        parser.error(f"--vis-quality 必须在 1-100 之间: {args.vis_quality}")
+    if not 0 < args.vis_sample <= 1:
+        parser.error(f"--vis-sample 必须在 (0, 1] 范围内: {args.vis_sample}")
+    EXPORT_FORMATS = export_formats
+    EXPORT_CLASSES = args.classes
+    OUTPUT_YOLO_DIR = args.output_yolo_dir
+    OUTPUT_DOTA_DIR = args.output_dota_dir
+    OUTPUT_COCO_PATH = args.output_coco
+    IMAGE_DIR = args.image_dir
+    XML_DIR = args.xml_dir
+    OUTPUT_XML_DIR = args.output_xml_dir
+    OUTPUT_VIS_DIR = args.output_vis_dir
+    MAX_SHRINK_RATIO = args.ratio
+    ENABLE_VISUALIZATION = ENABLE_VISUALIZATION and not args.no_vis
+    INTERACTIVE = INTERACTIVE and not args.yes
+    NUM_WORKERS = args.workers
+    OUTPUT_WRITE_THREADS = args.write_threads
+    INCREMENTAL = INCREMENTAL and not args.force
+    MANIFEST_USE_HASH = MANIFEST_USE_HASH or args.hash
+    VIS_SCALE = args.vis_scale
+    VIS_FORMAT = args.vis_format
+    VIS_QUALITY = args.vis_quality
+    VIS_SAMPLE_RATE = args.vis_sample
+    VIS_FILE_LIST = args.vis_list
+    VIS_THREADS = args.vis_threads
+    ANNOTATION_CACHE_DIR = args.cache
+    CACHE_VERIFY = (CACHE_VERIFY or args.cache_verify) and not args.cache_trust_dir_mtime
+    PROFILE_JSON_PATH = args.profile_json
+    PROFILE_ENABLED = PROFILE_ENABLED or args.profile or bool(PROFILE_JSON_PATH)
+    PROFILE_TOP_N = args.profile_top
+    
     print_banner()
     print("工作目录:", os.getcwd())
     print("输出目录: 7_Road_organized 文件夹")
@@ -348,8 +2224,25 @@ def main():
     # 检查路径
     if not check_paths():
         print("\n❌ 路径检查失败，请确认文件路径配置正确")
-        input("按回车键退出...")
-        return
+        _pause()
+        return 1
+    
+    # 构建缓存 / 统计模式
+    if ANNOTATION_CACHE_DIR and args.rebuild_cache:
+        get_obb_annotations(rebuild=True)
+    if args.stats:
+        print_dataset_statistics(get_obb_annotations())
+        _pause("\n按回车键退出...")
+        return 0
+    
+    # 扫描模式
+    if args.sweep:
+        best_ratio, class_ratios = run_sweep(args.sweep, args.sweep_ratios, args.sweep_per_class)
+        if best_ratio is None or not args.sweep_apply:
+            _pause("\n按回车键退出...")
+            return 0 if best_ratio is not None else 1
+        MAX_SHRINK_RATIO = best_ratio
+        CLASS_SHRINK_RATIOS = class_ratios
     
     # 确保输出目录存在
     ensure_directories()
@@ -357,23 +2250,25 @@ def main():
     # 获取用户确认
     if not get_user_confirmation():
         print("已取消操作")
-        input("按回车键退出...")
-        return
-    
+        _pause()
+        return 1
     
     # 执行转换
-    if run_conversion():
+    success = run_conversion()
+    if success:
         print("\n" + "=" * 60)
         print("🎉 任务完成！")
         print("\n转换结果:")
         print("- 已生成所有文件的XML转换结果")
-        print("- 已生成所有文件的可视化图像")
+        if ENABLE_VISUALIZATION:
+            print("- 已生成所有文件的可视化图像")
         print("- 蓝色框：原始旋转框标注")
         print("- 绿色框：转换后的水平框")
         print("\n下一步建议:")
         print("1. 检查 Visualization 文件夹中的可视化结果")
         print("2. 验证绿色框位置是否合适")
         print("3. 如需调整效果，可修改 MAX_SHRINK_RATIO 参数重新运行")
+        print("   或使用 --sweep <参考标注目录> 自动评估并选择最佳比例")
         print("\n输出文件结构:")
         print("7_Road_organized/")
         print("├── 7_Road_Obb_label/        # 转换后的XML文件")
@@ -383,7 +2278,8 @@ def main():
     else:
         print("\n❌ 转换失败")
     
-    input("\n按回车键退出...")
+    _pause("\n按回车键退出...")
+    return 0 if success else 1
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,53 @@
+"""obb2hbb_converter 的回归测试（python3 -m unittest test_obb2hbb_converter）"""
+
+import unittest
+import xml.etree.ElementTree as ET
+
+import obb2hbb_converter
+
+
+NAMESPACED_ANNOTATION = """<annotation xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+    xsi:noNamespaceSchemaLocation="voc.xsd">
+  <filename>img_0001.png</filename>
+  <ext:source xmlns:ext="http://example.com/ext">satellite</ext:source>
+  <object>
+    <name>car</name>
+    <bndbox><xmin>1</xmin><ymin>2</ymin><xmax>3</xmax><ymax>4</ymax></bndbox>
+  </object>
+</annotation>"""
+
+
+class SerializePrettyXmlTest(unittest.TestCase):
+    """serialize_pretty_xml 的输出需与原有的 ET.tostring -> minidom 方式一致"""
+
+    def assert_same_as_minidom(self, root):
+        output = obb2hbb_converter.serialize_pretty_xml(root)
+        self.assertEqual(output, obb2hbb_converter._serialize_pretty_xml_minidom(root))
+        return output
+
+    def test_plain_annotation(self):
+        root = ET.fromstring('<annotation><filename>a &amp; b.png</filename>'
+                             '<object><name>car</name><difficult/></object></annotation>')
+        self.assertFalse(obb2hbb_converter._needs_minidom_serializer(root))
+        self.assert_same_as_minidom(root)
+
+    def test_namespaced_annotation(self):
+        root = ET.fromstring(NAMESPACED_ANNOTATION)
+        output = self.assert_same_as_minidom(root)
+        text = output.decode('utf-8')
+        self.assertNotIn('<{', text)
+        self.assertNotIn(' {', text)
+        # 输出必须是合法的XML，且保留命名空间
+        reparsed = ET.fromstring(output)
+        self.assertEqual(reparsed.find('{http://example.com/ext}source').text, 'satellite')
+        self.assertEqual(reparsed.get('{http://www.w3.org/2001/XMLSchema-instance}noNamespaceSchemaLocation'),
+                         'voc.xsd')
+
+    def test_carriage_return_in_text(self):
+        root = ET.fromstring('<annotation><name>x</name></annotation>')
+        root.find('name').text = 'line1\r\nline2'
+        self.assert_same_as_minidom(root)
+
+
+if __name__ == '__main__':
+    unittest.main()